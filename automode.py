@@ -3,62 +3,509 @@
 # -------------------------------------------------------------------
 # Implementa la funcionalidad de cambio de fondo de pantalla
 # automático en intervalos de tiempo definidos.
+#
+# Cada salida configurada tiene su propia rotación (carpeta, orden,
+# intervalo e historial), pero un único planificador las mueve todas:
+# cuando vencen varias a la vez se aplican juntas en una sola llamada.
 # -------------------------------------------------------------------
 
 import time
 import random
+import signal
 import logging
+import threading
+from collections import deque
 from pathlib import Path
+from functools import partial
 from typing import Callable
-from utils import send_notification
+from utils import send_notification, get_output_configs, get_thumbnail_workers, get_thumbnail_cache_bytes, IMAGE_SUFFIXES
+from watcher import FolderWatcher
+import profiling
+import similarity
+import colorindex
+
+# Cantidad de fondos anteriores que se recuerdan para 'prev'.
+HISTORY_SIZE = 100
+# En orden aleatorio se evita elegir una imagen casi idéntica a alguno de
+# los últimos DUPLICATE_WINDOW fondos (incluidos los ya preelegidos),
+# probando como mucho DUPLICATE_ATTEMPTS candidatas.
+DUPLICATE_WINDOW = 20
+DUPLICATE_ATTEMPTS = 8
+
+def get_interval_minutes(config: dict) -> int:
+    """Lee y valida el intervalo de rotación de la configuración."""
+    interval_minutes = int(config.get('rotation_interval_minutes', 30))
+    if interval_minutes < 1:
+        raise ValueError("El intervalo mínimo recomendado es de 1 minuto.")
+    return interval_minutes
+
+def get_prefetch_count(config: dict) -> int:
+    """Cuántos de los próximos fondos se preparan por adelantado."""
+    try:
+        return max(0, int(config.get('prefetch_count', 2)))
+    except ValueError:
+        logging.warning("Valor no válido para 'prefetch_count'. Se usarán 2.")
+        return 2
+
+class OutputRotation:
+    """
+    Rotación de una salida: la carpeta que vigila, su historial, los
+    próximos fondos ya elegidos y el momento de su siguiente cambio.
+    No tiene cerrojo propio; la protege el de AutoModeScheduler.
+    """
+
+    def __init__(self, config: dict, get_images_func: Callable[..., list[Path]]):
+        self.config = config
+        self.output = config.get('swaybg_output', '*')
+        self.interval_seconds = get_interval_minutes(config) * 60
+        self.rotation_order = config.get('rotation_order', 'random').lower()
+        recursive = config.getboolean('recursive', fallback=False)
+        # La lista de imágenes la mantiene el watcher con eventos del sistema
+        # de archivos, así que cada ciclo no toca el disco.
+        self.watcher = FolderWatcher(
+            config['wallpaper_folder'], partial(get_images_func, recursive=recursive), IMAGE_SUFFIXES, recursive
+        )
+        self.history: list[Path] = []
+        self._position = -1
+        self._current_index = 0
+        self.upcoming: deque[Path] = deque()
+        # Momento (time.monotonic) del próximo cambio; None si aún no se ha
+        # aplicado ningún fondo y el cambio debe ser inmediato.
+        self.deadline = None
+        # Hashes perceptuales de la carpeta para evitar casi duplicados. Se
+        # construye en segundo plano; mientras tanto no se filtra nada.
+        self.duplicate_distance = similarity.get_duplicate_distance(config)
+        self.similarity: similarity.SimilarityIndex | None = None
+        # Colores dominantes para recorrer la carpeta por tono o luminosidad
+        # en orden secuencial. También se construye en segundo plano.
+        self.sort_by = colorindex.get_sort_by(config)
+        self.colors: colorindex.ColorIndex | None = None
+
+    def start_similarity_index(self) -> None:
+        """Construye en segundo plano el índice de imágenes parecidas de la carpeta."""
+        if self.duplicate_distance == 0:
+            return
+
+        def build():
+            index = similarity.build_index(self.watcher.images())
+            self.similarity = index
+            logging.info(f"Índice de imágenes parecidas de '{self.output}' listo ({len(index)} imágenes).")
+
+        threading.Thread(target=build, name='similarity-index', daemon=True).start()
+
+    def start_color_index(self) -> None:
+        """Construye en segundo plano el índice de colores si 'sort_by' lo necesita."""
+        if self.sort_by == 'name':
+            return
+
+        def build():
+            self.colors = self.build_color_index()
+            logging.info(f"Índice de colores de '{self.output}' listo ({len(self.colors)} imágenes).")
+
+        threading.Thread(target=build, name='color-index', daemon=True).start()
+
+    def build_color_index(self) -> colorindex.ColorIndex:
+        """Índice de colores de la carpeta, generando las miniaturas y los colores que falten."""
+        return colorindex.build_index(
+            self.watcher.images(), get_thumbnail_workers(self.config),
+            get_thumbnail_cache_bytes(self.config), generate=True
+        )
+
+    def sorted_images(self, images: list[Path]) -> list[Path]:
+        """'images' en el orden de 'sort_by' (por nombre hasta que el índice de colores esté listo)."""
+        if self.colors is None:
+            return images
+        return colorindex.sort_images(images, self.sort_by, self.colors)
+
+    @property
+    def current(self) -> Path | None:
+        return self.history[self._position] if self._position >= 0 else None
+
+    def take_over(self, other: 'OutputRotation') -> None:
+        self.history = list(other.history)
+        self._position = other._position
+        self._current_index = other._current_index
+        if other.deadline is not None:
+            self.deadline = other.deadline
+        self.upcoming = deque(other.upcoming)
+        if self.similarity is None:
+            self.similarity = other.similarity
+        if self.colors is None:
+            self.colors = other.colors
+
+    def _last_repeat(self, image_path: Path, window: int) -> int | None:
+        """
+        Hace cuántos fondos (1 = el último, contando los preelegidos) se mostró
+        uno casi idéntico a 'image_path', mirando solo los últimos 'window'.
+        None si ninguno lo es o aún no hay índice.
+        """
+        if self.similarity is None or self.duplicate_distance == 0:
+            return None
+        recent = (self.history[:self._position + 1] + list(self.upcoming))[-window:]
+        for age, other in enumerate(reversed(recent), start=1):
+            distance = self.similarity.distance(image_path, other)
+            if distance is not None and distance <= self.duplicate_distance:
+                return age
+        return None
+
+    def choose(self, images: list[Path]) -> Path:
+        if self.rotation_order == 'sequential':
+            images = self.sorted_images(images)
+            # Se saltan las copias casi idénticas del fondo anterior.
+            for _ in range(len(images)):
+                if self._current_index >= len(images):
+                    self._current_index = 0  # Reinicia al llegar al final
+                selected_image = images[self._current_index]
+                self._current_index += 1
+                if self._last_repeat(selected_image, window=1) is None:
+                    break
+            return selected_image
+        # random: si todas las candidatas repiten alguno de los últimos fondos
+        # (carpetas pequeñas), se queda la que lo repite desde hace más tiempo.
+        best_image, best_age = None, 0
+        for _ in range(DUPLICATE_ATTEMPTS):
+            candidate = random.choice(images)
+            age = self._last_repeat(candidate, window=DUPLICATE_WINDOW)
+            if age is None:
+                return candidate
+            if age > best_age:
+                best_image, best_age = candidate, age
+        return best_image
+
+    def push_history(self, image_path: Path) -> None:
+        del self.history[self._position + 1:]
+        self.history.append(image_path)
+        if len(self.history) > HISTORY_SIZE:
+            del self.history[:len(self.history) - HISTORY_SIZE]
+        self._position = len(self.history) - 1
+
+    def _take_upcoming(self) -> Path | None:
+        """Saca el siguiente fondo preelegido que siga existiendo en la carpeta."""
+        while self.upcoming:
+            image_path = self.upcoming.popleft()
+            if self.watcher.contains(image_path):
+                return image_path
+        return None
+
+    def step_forward(self) -> Path | None:
+        """Avanza en el historial, usa uno ya preparado o elige uno nuevo."""
+        if self._position < len(self.history) - 1:
+            self._position += 1
+            return self.history[self._position]
+        image_path = self._take_upcoming()
+        if image_path is None:
+            images = self.watcher.images()
+            if not images:
+                return None
+            image_path = self.choose(images)
+        self.push_history(image_path)
+        return image_path
+
+    def step_back(self) -> Path | None:
+        if self._position <= 0:
+            return None
+        self._position -= 1
+        return self.history[self._position]
+
+    def reset_deadline(self, now: float) -> None:
+        self.deadline = now + self.interval_seconds
+
+    def advance_deadline(self, now: float) -> None:
+        """
+        Programa el siguiente cambio a partir del anterior y no de cuándo
+        terminó este, para que el tiempo que tarda en aplicarse no se acumule.
+        Si el equipo estuvo suspendido se saltan los cambios perdidos.
+        """
+        if self.deadline is None:
+            self.deadline = now
+        self.deadline += self.interval_seconds
+        if self.deadline <= now:
+            missed = (now - self.deadline) // self.interval_seconds + 1
+            self.deadline += missed * self.interval_seconds
+
+    def is_due(self, now: float) -> bool:
+        return self.deadline is None or self.deadline <= now
+
+def create_rotations(config: dict, get_images_func: Callable[..., list[Path]]) -> list[OutputRotation]:
+    """Crea la rotación de cada salida configurada (la principal primero) y arranca sus watchers."""
+    rotations = []
+    try:
+        for output_config in get_output_configs(config):
+            rotation = OutputRotation(output_config, get_images_func)
+            rotations.append(rotation)
+            rotation.watcher.start()
+            rotation.start_similarity_index()
+            rotation.start_color_index()
+    except Exception:
+        stop_rotations(rotations)
+        raise
+    return rotations
+
+def stop_rotations(rotations: list[OutputRotation]) -> None:
+    for rotation in rotations:
+        rotation.watcher.stop()
+
+class AutoModeScheduler:
+    """
+    Planificador de la rotación de fondos de todas las salidas. Lo usa
+    tanto el modo automático en primer plano como el daemon, que además
+    lo controla con next/prev/pause/resume desde otros hilos.
+
+    set_wallpapers_func recibe una lista de (imagen, config de la salida)
+    con la salida principal primero, si está incluida.
+
+    Si se le pasa prepare_func, un hilo en segundo plano elige los próximos
+    fondos con antelación y los prepara (paleta, caché de página...) para
+    que el cambio en sí sea casi inmediato.
+
+    'latency' guarda lo que tardan los últimos cambios aplicados.
+    """
+
+    def __init__(
+        self,
+        rotations: list[OutputRotation],
+        set_wallpapers_func: Callable[[list[tuple[Path, dict]]], None],
+        paused: bool = False,
+        prepare_func: Callable[[Path, dict], bool] | None = None,
+    ):
+        self.rotations = rotations
+        self.primary = rotations[0]
+        self.set_wallpapers_func = set_wallpapers_func
+        self.prepare_func = prepare_func
+        self.prefetch_count = get_prefetch_count(self.primary.config) if prepare_func else 0
+        self._prefetch_wake = threading.Event()
+        self._paused = paused
+        self._paused_at = time.monotonic() if paused else None
+        self._lock = threading.RLock()
+        self._apply_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self.latency = profiling.LatencyTracker()
+
+    @property
+    def current(self) -> Path | None:
+        """Fondo actual de la salida principal."""
+        with self._lock:
+            return self.primary.current
+
+    @property
+    def paused(self) -> bool:
+        return self._paused
+
+    def rotation(self, output: str) -> OutputRotation:
+        """Devuelve la rotación de una salida por su nombre."""
+        for rotation in self.rotations:
+            if rotation.output == output:
+                return rotation
+        raise ValueError(f"Salida no configurada: '{output}'")
+
+    def _targets(self, output: str | None) -> list[OutputRotation]:
+        return self.rotations if output is None else [self.rotation(output)]
+
+    def seconds_until_next(self, rotation: OutputRotation | None = None) -> float | None:
+        """
+        Segundos hasta el próximo cambio automático de 'rotation' o, si se
+        omite, de cualquier salida (None si está en pausa).
+        """
+        with self._lock:
+            if self._paused:
+                return None
+            now = time.monotonic()
+            deadlines = [r.deadline for r in ([rotation] if rotation else self.rotations)]
+            if any(d is None for d in deadlines):
+                return 0.0
+            return max(0.0, min(deadlines) - now)
+
+    def take_over(self, other: 'AutoModeScheduler') -> None:
+        """Hereda historial y temporizadores de otro planificador (recarga de config)."""
+        with self._lock, other._lock:
+            previous = {r.output: r for r in other.rotations}
+            for rotation in self.rotations:
+                if rotation.output in previous:
+                    rotation.take_over(previous[rotation.output])
+            if self._paused and other._paused_at is not None:
+                self._paused_at = other._paused_at
+            self.latency = other.latency
+        self._wake.set()
+
+    def _apply(self, assignments: list[tuple[Path, dict]], quiet: bool = True) -> None:
+        """Aplica los fondos fuera de self._lock para no bloquear 'status' mientras corre wal."""
+        if not assignments:
+            return
+        with self._apply_lock:
+            for image_path, config in assignments:
+                logging.info(f"Estableciendo nuevo fondo en '{config.get('swaybg_output', '*')}': {image_path.name}")
+            start = time.perf_counter()
+            self.set_wallpapers_func(assignments, quiet=quiet)
+            self.latency.add(time.perf_counter() - start)
+
+    def record(self, image_path: Path, output: str | None = None) -> None:
+        """Registra un fondo aplicado desde fuera (p. ej. --set) en el historial."""
+        with self._lock:
+            now = time.monotonic()
+            for rotation in self._targets(output):
+                rotation.push_history(image_path)
+                rotation.reset_deadline(now)
+        self._wake.set()
+
+    def set(self, image_path: Path, quiet: bool = False, output: str | None = None) -> None:
+        """Aplica un fondo concreto a una salida (o a todas) y reinicia su temporizador."""
+        targets = self._targets(output)
+        self.record(image_path, output)
+        self._apply([(image_path, r.config) for r in targets], quiet=quiet)
+
+    def next(self, scheduled: bool = False, output: str | None = None) -> Path | None:
+        """
+        Aplica el siguiente fondo en las salidas indicadas. 'scheduled'
+        indica que lo pide el temporizador y no el usuario: entonces solo
+        avanzan las salidas cuyo cambio ha vencido. Devuelve el primer
+        fondo aplicado, o None si no había imágenes.
+        """
+        assignments = []
+        with self._lock:
+            now = time.monotonic()
+            if scheduled:
+                targets = [r for r in self.rotations if r.is_due(now)]
+            else:
+                targets = self._targets(output)
+            for rotation in targets:
+                image_path = rotation.step_forward()
+                if image_path is None:
+                    continue
+                assignments.append((image_path, rotation.config))
+                if scheduled:
+                    rotation.advance_deadline(now)
+                else:
+                    rotation.reset_deadline(now)
+        self._wake.set()
+        self._apply(assignments)
+        self._prefetch_wake.set()
+        return assignments[0][0] if assignments else None
+
+    def prev(self, output: str | None = None) -> Path | None:
+        """Vuelve al fondo anterior del historial."""
+        assignments = []
+        with self._lock:
+            now = time.monotonic()
+            for rotation in self._targets(output):
+                image_path = rotation.step_back()
+                if image_path is not None:
+                    assignments.append((image_path, rotation.config))
+                    rotation.reset_deadline(now)
+        self._wake.set()
+        self._apply(assignments)
+        return assignments[0][0] if assignments else None
+
+    def pause(self) -> None:
+        with self._lock:
+            if not self._paused:
+                self._paused_at = time.monotonic()
+                self._paused = True
+                self._wake.set()
+
+    def resume(self) -> None:
+        with self._lock:
+            if self._paused:
+                # Los temporizadores se desplazan lo que duró la pausa.
+                elapsed = time.monotonic() - self._paused_at
+                for rotation in self.rotations:
+                    if rotation.deadline is not None:
+                        rotation.deadline += elapsed
+                self._paused_at = None
+                self._paused = False
+                self._wake.set()
+                self._prefetch_wake.set()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        self._prefetch_wake.set()
+
+    def _prefetch_loop(self) -> None:
+        """
+        Mantiene 'prefetch_count' fondos elegidos y preparados por adelantado
+        en cada salida. En pausa no se prepara nada hasta que se reanude.
+        """
+        while not self._stop.is_set():
+            candidate = None
+            with self._lock:
+                pending = [] if self._paused else [r for r in self.rotations if len(r.upcoming) < self.prefetch_count]
+                # Primero la salida con menos fondos preparados.
+                for rotation in sorted(pending, key=lambda r: len(r.upcoming)):
+                    images = rotation.watcher.images()
+                    if images:
+                        candidate = rotation.choose(images)
+                        rotation.upcoming.append(candidate)
+                        break
+            if candidate is None:
+                # Se despierta tras cada cambio o al reanudar y, como mucho,
+                # cada minuto por si aparecen imágenes en una carpeta vacía.
+                self._prefetch_wake.wait(60)
+                self._prefetch_wake.clear()
+                continue
+            try:
+                self.prepare_func(candidate, rotation.config)
+            except Exception as e:
+                logging.warning(f"No se pudo preparar '{candidate.name}': {e}")
+
+    def run(self) -> None:
+        """Bucle de rotación. Termina al llamar a stop()."""
+        if self.prefetch_count:
+            threading.Thread(target=self._prefetch_loop, name='prefetch', daemon=True).start()
+        warned = set()
+        while not self._stop.is_set():
+            if self._paused:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+
+            delay = self.seconds_until_next()
+            if delay is not None and delay > 0:
+                self._wake.wait(delay)
+                self._wake.clear()
+                continue
+
+            with profiling.span('auto.tick'):
+                self.next(scheduled=True)
+
+            with self._lock:
+                now = time.monotonic()
+                empty = [r for r in self.rotations if r.is_due(now) and not r.watcher.images()]
+            for rotation in empty:
+                if rotation.output not in warned:
+                    logging.warning(f"No se encontraron imágenes en '{rotation.watcher.folder}'. Esperando...")
+            warned = {r.output for r in empty}
+            if empty:
+                # Se despierta en cuanto aparece la primera imagen. El timeout
+                # corto mantiene Ctrl+C responsivo y atiende al resto de salidas.
+                empty[0].watcher.wait_for_images(timeout=1)
 
 def start_auto_mode(
-    config: dict, 
-    get_images_func: Callable[[str], list[Path]], 
-    set_wallpaper_func: Callable[[Path, dict], None]
+    config: dict,
+    get_images_func: Callable[..., list[Path]],
+    set_wallpapers_func: Callable[[list[tuple[Path, dict]]], None],
+    prepare_func: Callable[[Path, dict], bool] | None = None
 ):
-    """Inicia el ciclo de cambio de fondo de pantalla automático."""
+    """Inicia el ciclo de cambio de fondo de pantalla automático en todas las salidas."""
+    rotations = []
     try:
-        interval_minutes = int(config.get('rotation_interval_minutes', 30))
-        if interval_minutes < 1:
-            raise ValueError("El intervalo mínimo recomendado es de 1 minuto.")
-        
-        interval_seconds = interval_minutes * 60
-        wallpaper_folder = config['wallpaper_folder']
-        rotation_order = config.get('rotation_order', 'random').lower()
-
-        start_message = f"Cambiando fondo cada {interval_minutes} min (orden: {rotation_order})."
+        rotations = create_rotations(config, get_images_func)
+
+        if len(rotations) == 1:
+            start_message = (f"Cambiando fondo cada {rotations[0].interval_seconds // 60} min "
+                             f"(orden: {rotations[0].rotation_order}).")
+        else:
+            start_message = "Salidas: " + ", ".join(
+                f"{r.output} cada {r.interval_seconds // 60} min ({r.rotation_order})" for r in rotations
+            ) + "."
         logging.info(f"Modo automático iniciado. {start_message}")
         logging.info("Presiona Ctrl+C para detener.")
         send_notification("Modo Automático Activado", start_message, "preferences-desktop-wallpaper")
 
-        no_images_count = 0
-        current_index = 0
-
-        while True:
-            images = get_images_func(wallpaper_folder)
-            
-            if not images:
-                if no_images_count == 0:
-                    logging.warning(f"No se encontraron imágenes en '{wallpaper_folder}'. Esperando...")
-                no_images_count += 1
-                time.sleep(interval_seconds)
-                continue
-            else:
-                no_images_count = 0
-
-            if rotation_order == 'sequential':
-                if current_index >= len(images):
-                    current_index = 0  # Reinicia al llegar al final
-                selected_image = images[current_index]
-                current_index += 1
-            else:  # random
-                selected_image = random.choice(images)
-            
-            logging.info(f"Estableciendo nuevo fondo: {selected_image.name}")
-            set_wallpaper_func(selected_image, config, quiet=True)
-            
-            time.sleep(interval_seconds)
+        scheduler = AutoModeScheduler(rotations, set_wallpapers_func, prepare_func=prepare_func)
+        # 'kill -USR1 <pid>' muestra los percentiles de latencia de los cambios.
+        signal.signal(signal.SIGUSR1, lambda *_: logging.info(f"Latencia de los cambios: {scheduler.latency.describe()}"))
+        scheduler.run()
 
     except (ValueError, KeyError) as e:
         error_msg = f"Error de configuración: {e}"
@@ -69,4 +516,6 @@ def start_auto_mode(
         send_notification("Modo Automático Desactivado", "El cambio de fondos se ha detenido.", "process-stop")
     except Exception as e:
         logging.error(f"Ocurrió un error inesperado: {e}")
-        send_notification("Error en Modo Automático", str(e), "dialog-error")
\ No newline at end of file
+        send_notification("Error en Modo Automático", str(e), "dialog-error")
+    finally:
+        stop_rotations(rotations)
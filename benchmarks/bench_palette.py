@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -------------------------------------------------------------------
+# bench_palette.py - Comparativa del Backend de Paletas Nativo
+# -------------------------------------------------------------------
+# Mide el tiempo de 'wal' frente a native_palette sobre un conjunto de
+# imágenes y comprueba que las paletas se parecen: para cada color de
+# una paleta se busca el más cercano de la otra (ΔE CIE76 en Lab) y se
+# promedia en ambos sentidos. Sale con código 1 si alguna imagen
+# supera --max-distance.
+#
+#   python benchmarks/bench_palette.py --fixtures ~/wallpaper
+#   python benchmarks/bench_palette.py            # imágenes sintéticas
+# -------------------------------------------------------------------
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import native_palette  # noqa: E402
+
+FIXTURE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.bmp'}
+
+def make_fixtures(output_dir: Path, count: int = 8, size=(3840, 2160)) -> list[Path]:
+    """Genera imágenes sintéticas (degradados con manchas de color) reproducibles."""
+    rng = np.random.default_rng(1234)
+    height, width = size[1], size[0]
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    paths = []
+    for i in range(count):
+        start, end = rng.integers(0, 256, size=(2, 3))
+        t = (x / width)[..., None]
+        img = start * (1 - t) + end * t
+        for _ in range(6):
+            cx, cy = rng.integers(0, width), rng.integers(0, height)
+            radius = rng.integers(height // 10, height // 3)
+            mask = ((x - cx) ** 2 + (y - cy) ** 2) < radius ** 2
+            img[mask] = rng.integers(0, 256, size=3)
+        path = output_dir / f"fixture_{i:02d}.jpg"
+        Image.fromarray(img.astype(np.uint8)).save(path, quality=90)
+        paths.append(path)
+    return paths
+
+def hex_to_lab(colors: list[str]) -> np.ndarray:
+    """Convierte colores '#rrggbb' (sRGB) a CIE Lab con iluminante D65."""
+    rgb = np.array([[int(c[i:i + 2], 16) for i in (1, 3, 5)] for c in colors], dtype=np.float64) / 255
+    linear = np.where(rgb > 0.04045, ((rgb + 0.055) / 1.055) ** 2.4, rgb / 12.92)
+    xyz = linear @ np.array([
+        [0.4124, 0.3576, 0.1805],
+        [0.2126, 0.7152, 0.0722],
+        [0.0193, 0.1192, 0.9505],
+    ]).T
+    xyz /= np.array([0.95047, 1.0, 1.08883])
+    f = np.where(xyz > 0.008856, np.cbrt(xyz), 7.787 * xyz + 16 / 116)
+    return np.stack([116 * f[:, 1] - 16, 500 * (f[:, 0] - f[:, 1]), 200 * (f[:, 1] - f[:, 2])], axis=1)
+
+def palette_distance(a: list[str], b: list[str]) -> float:
+    """Distancia media simétrica al color más cercano (ΔE CIE76)."""
+    lab_a, lab_b = hex_to_lab(a), hex_to_lab(b)
+    distances = np.linalg.norm(lab_a[:, None, :] - lab_b[None, :, :], axis=2)
+    return float((distances.min(axis=1).mean() + distances.min(axis=0).mean()) / 2)
+
+def run_wal(image_path: Path) -> tuple[list[str], float]:
+    with tempfile.TemporaryDirectory() as cache_dir:
+        env = dict(os.environ, PYWAL_CACHE_DIR=cache_dir)
+        start = time.perf_counter()
+        subprocess.run(
+            ['wal', '-i', str(image_path), '-n', '-s', '-t', '-e', '-q'],
+            env=env, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        elapsed = time.perf_counter() - start
+        scheme = json.loads((Path(cache_dir) / 'colors.json').read_text())
+    return [scheme['colors'][f"color{i}"] for i in range(16)], elapsed
+
+def run_native(image_path: Path) -> tuple[list[str], float]:
+    start = time.perf_counter()
+    colors = native_palette.extract_colors(image_path)
+    return colors, time.perf_counter() - start
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compara el backend de paletas nativo con wal.")
+    parser.add_argument('--fixtures', type=Path, help="Carpeta con imágenes; si se omite se generan sintéticas.")
+    parser.add_argument('--max-distance', type=float, default=15.0, help="ΔE medio máximo permitido por imagen.")
+    parser.add_argument('--output', type=Path, help="Guarda los resultados en JSON.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.fixtures:
+            images = sorted(p for p in args.fixtures.expanduser().iterdir() if p.suffix.lower() in FIXTURE_EXTENSIONS)
+        else:
+            images = make_fixtures(Path(tmp))
+
+        results = []
+        for image_path in images:
+            wal_colors, wal_time = run_wal(image_path)
+            native_colors, native_time = run_native(image_path)
+            distance = palette_distance(wal_colors, native_colors)
+            results.append({
+                'image': image_path.name,
+                'wal_seconds': round(wal_time, 4),
+                'native_seconds': round(native_time, 4),
+                'delta_e': round(distance, 2),
+            })
+            print(f"{image_path.name:32} wal {wal_time * 1000:8.1f} ms  "
+                  f"native {native_time * 1000:7.1f} ms  ΔE {distance:5.2f}")
+
+    if not results:
+        print("No se encontraron imágenes.")
+        return 1
+
+    wal_total = sum(r['wal_seconds'] for r in results)
+    native_total = sum(r['native_seconds'] for r in results)
+    print(f"\nTotal: wal {wal_total:.2f} s, native {native_total:.2f} s "
+          f"(x{wal_total / max(native_total, 1e-9):.1f})")
+    if args.output:
+        args.output.write_text(json.dumps({'results': results}, indent=2) + '\n')
+
+    failures = [r for r in results if r['delta_e'] > args.max_distance]
+    for r in failures:
+        print(f"ΔE por encima del límite ({args.max_distance}): {r['image']} = {r['delta_e']}")
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
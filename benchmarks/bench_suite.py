@@ -0,0 +1,549 @@
+#!/usr/bin/env python3
+# -------------------------------------------------------------------
+# bench_suite.py - Benchmarks de las Rutas Críticas
+# -------------------------------------------------------------------
+# Genera bibliotecas sintéticas (por defecto de 1k, 10k y 50k imágenes
+# de varios formatos y tamaños), pone en el PATH versiones falsas de
+# swaybg, wal, rofi, notify-send, convert y pkill, y mide:
+#
+#   - get_image_files con el índice vacío y ya actualizado
+#   - get_thumbnail en frío y en caliente (sobre una muestra)
+#   - la preparación del modo interactivo hasta la primera entrada de rofi
+#   - set_wallpapers de principio a fin (paleta nueva y en caché)
+#   - un ciclo del modo automático
+#   - el hash perceptual (por imagen, sobre la muestra) y la construcción
+#     y la consulta del índice de imágenes parecidas
+#   - los colores dominantes (por imagen, desde las miniaturas de la
+#     muestra) y la construcción y la consulta del índice de colores
+#   - el arranque de 'main.py --set' en un proceso nuevo, hasta que
+#     empieza a cambiar el fondo (con --startup-budget-ms como límite)
+#   - las notificaciones por D-Bus (conexión nueva, conexión abierta y
+#     una ráfaga agrupada) frente a lanzar notify-send
+#
+# Todo se ejecuta con HOME y XDG_RUNTIME_DIR apuntando a una carpeta
+# temporal, así que no toca las cachés reales. Si está dbus-daemon, se
+# arranca un bus de sesión propio con un servidor de notificaciones
+# falso, así que tampoco llega ninguna al escritorio. Los resultados se
+# guardan en JSON; con --compare se comparan con una ejecución
+# anterior y se sale con código 1 si algo empeora más de lo permitido.
+#
+#   python benchmarks/bench_suite.py --sizes 1000 --output bench.json
+#   python benchmarks/bench_suite.py --compare bench.json
+# -------------------------------------------------------------------
+
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import signal
+import random
+import logging
+import argparse
+import platform
+import tempfile
+import threading
+import statistics
+import subprocess
+import configparser
+from pathlib import Path
+
+from PIL import Image
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# (formato, tamaño, peso relativo). Los formatos sin compresión o
+# lentos de decodificar solo aparecen en tamaños pequeños para que la
+# biblioteca de 50k no ocupe decenas de GB.
+TEMPLATES = [
+    ('jpg', (640, 360), 30),
+    ('jpg', (1920, 1080), 25),
+    ('jpg', (3840, 2160), 5),
+    ('png', (640, 360), 10),
+    ('png', (1920, 1080), 10),
+    ('webp', (1280, 720), 10),
+    ('gif', (640, 360), 5),
+    ('bmp', (640, 360), 5),
+]
+# Presupuesto de arranque de 'main.py --set': desde que se lanza el
+# proceso hasta que empieza a cambiar el fondo, con las cachés llenas.
+STARTUP_BUDGET_MS = 150
+
+PIL_FORMATS = {'jpg': 'JPEG', 'png': 'PNG', 'webp': 'WEBP', 'gif': 'GIF', 'bmp': 'BMP'}
+
+# Binarios falsos. swaybg hace lo mismo que el real con el buffer de su
+# superficie: crea un archivo en /dev/shm, lo borra, lo mapea y cierra
+# el descriptor; swaybg.py busca ese mapa para dar por dibujado el
+# fondo. Se ejecuta con este mismo intérprete (y no con 'env') para
+# que el proceso siga llamándose 'swaybg'.
+STUBS = {
+    'swaybg': f"#!{sys.executable}\n" + """import os, mmap, ctypes, signal
+path = f"/dev/shm/bench-swaybg-{os.getpid()}"
+fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o600)
+os.unlink(path)
+os.ftruncate(fd, 4096)
+# mmap.mmap() se queda con una copia del descriptor; libc no.
+libc = ctypes.CDLL(None)
+libc.mmap.restype = ctypes.c_void_p
+libc.mmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_long]
+libc.mmap(None, 4096, mmap.PROT_READ | mmap.PROT_WRITE, mmap.MAP_SHARED, fd, 0)
+os.close(fd)
+while True:
+    signal.pause()
+""",
+    'wal': """#!/usr/bin/env python3
+import os, sys, json
+from pathlib import Path
+image = sys.argv[sys.argv.index('-i') + 1]
+cache = Path(os.environ.get('PYWAL_CACHE_DIR') or Path.home() / '.cache/wal')
+cache.mkdir(parents=True, exist_ok=True)
+colors = {f"color{i}": f"#{i:02x}{i:02x}{i:02x}" for i in range(16)}
+scheme = {'wallpaper': image, 'alpha': '100',
+          'special': {'background': colors['color0'], 'foreground': colors['color15'], 'cursor': colors['color15']},
+          'colors': colors}
+(cache / 'colors.json').write_text(json.dumps(scheme))
+(cache / 'colors').write_text('\\n'.join(colors.values()) + '\\n')
+(cache / 'sequences').write_text('')
+(cache / 'wal').write_text(image)
+""",
+    # Anota cuándo recibe la primera entrada y cancela (código 1).
+    'rofi': """#!/usr/bin/env python3
+import os, sys, time
+line = sys.stdin.readline()
+mark = os.environ.get('BENCH_ROFI_MARK')
+if mark and line:
+    with open(mark, 'w') as f:
+        f.write(repr(time.time()))
+sys.exit(1)
+""",
+    'notify-send': "#!/bin/sh\nexit 0\n",
+    'convert': """#!/bin/sh
+for last; do :; done
+cp "$2" "$last" 2>/dev/null || : > "$last"
+""",
+    'pkill': "#!/bin/sh\nexit 0\n",
+}
+
+def template_bytes(fmt: str, size: tuple[int, int]) -> bytes:
+    """Imagen con degradados (comprime como una foto suave, no como ruido)."""
+    red = Image.linear_gradient('L').resize(size)
+    green = Image.radial_gradient('L').resize(size)
+    blue = Image.linear_gradient('L').rotate(90).resize(size)
+    img = Image.merge('RGB', (red, green, blue))
+    buffer = io.BytesIO()
+    if fmt == 'gif':
+        img = img.convert('P', palette=Image.Palette.ADAPTIVE)
+    img.save(buffer, PIL_FORMATS[fmt], **({'quality': 85} if fmt in ('jpg', 'webp') else {}))
+    return buffer.getvalue()
+
+def make_library(folder: Path, count: int) -> list[Path]:
+    """
+    Crea 'count' imágenes en 'folder' (o reutiliza las que ya hay). Cada
+    archivo es una plantilla con unos bytes únicos al final, ignorados al
+    decodificar, para que todos tengan un hash de contenido distinto.
+    """
+    existing = sorted(folder.iterdir()) if folder.is_dir() else []
+    if len(existing) == count:
+        _age_directory(folder)
+        return existing
+    shutil.rmtree(folder, ignore_errors=True)
+    folder.mkdir(parents=True)
+    templates = [(fmt, template_bytes(fmt, size)) for fmt, size, _ in TEMPLATES]
+    weights = [weight for _, _, weight in TEMPLATES]
+    rng = random.Random(count)
+    paths = []
+    for i in range(count):
+        fmt, data = rng.choices(templates, weights)[0]
+        path = folder / f"wallpaper_{i:05d}.{fmt}"
+        path.write_bytes(data + b'\0bench-' + str(i).encode())
+        paths.append(path)
+    _age_directory(folder)
+    return paths
+
+def _age_directory(folder: Path) -> None:
+    """
+    Atrasa el mtime de la carpeta: library.py vuelve a listar siempre las
+    modificadas hace menos de 2 s, y eso falsearía la medida en caliente.
+    """
+    past = time.time() - 60
+    os.utime(folder, (past, past))
+
+def install_stubs(bin_dir: Path) -> None:
+    bin_dir.mkdir(parents=True, exist_ok=True)
+    for name, script in STUBS.items():
+        path = bin_dir / name
+        path.write_text(script)
+        path.chmod(0o755)
+
+def isolate_environment(workdir: Path) -> None:
+    """Prepara HOME, PATH y la geometría falsa antes de importar el proyecto."""
+    home = workdir / 'home'
+    home.mkdir(parents=True, exist_ok=True)
+    outputs_json = workdir / 'outputs.json'
+    outputs_json.write_text(json.dumps([
+        {'name': 'BENCH-1', 'active': True, 'current_mode': {'width': 1920, 'height': 1080}, 'transform': 'normal'}
+    ]))
+    install_stubs(workdir / 'bin')
+    os.environ.update({
+        'HOME': str(home),
+        'XDG_RUNTIME_DIR': str(home),
+        'PATH': f"{workdir / 'bin'}{os.pathsep}{os.environ.get('PATH', '')}",
+        'SWAY_WALLPAPER_OUTPUTS_JSON': str(outputs_json),
+    })
+    os.environ.pop('SWAYSOCK', None)
+    os.environ.pop('PYWAL_CACHE_DIR', None)
+
+def start_notification_bus(workdir: Path) -> subprocess.Popen | None:
+    """
+    Arranca un dbus-daemon propio y lo deja como bus de sesión, para que
+    las notificaciones no lleguen al escritorio real. Sin dbus-daemon se
+    quita el bus y se usa el notify-send falso.
+    """
+    os.environ.pop('DBUS_SESSION_BUS_ADDRESS', None)
+    dbus_daemon = shutil.which('dbus-daemon')
+    if dbus_daemon is None:
+        return None
+    socket_path = workdir / 'bus'
+    socket_path.unlink(missing_ok=True)
+    address = f"unix:path={socket_path}"
+    process = subprocess.Popen(
+        [dbus_daemon, '--session', '--nofork', f'--address={address}'],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + 5
+    while not socket_path.exists():
+        if process.poll() is not None or time.monotonic() > deadline:
+            process.terminate()
+            return None
+        time.sleep(0.01)
+    os.environ['DBUS_SESSION_BUS_ADDRESS'] = address
+    return process
+
+class NotificationServer(threading.Thread):
+    """Servidor de notificaciones falso: responde a Notify y anota lo recibido."""
+
+    def __init__(self):
+        super().__init__(name='notification-server', daemon=True)
+        import notify
+        self.notify = notify
+        # Sin timeout: el hilo termina cuando se cierra el bus.
+        self.bus = notify.SessionBus(timeout=None)
+        body = notify.Writer()
+        body.string(notify.NOTIFICATIONS_NAME)
+        body.uint32(4)  # DBUS_NAME_FLAG_DO_NOT_QUEUE
+        self.bus.call('org.freedesktop.DBus', '/org/freedesktop/DBus', 'org.freedesktop.DBus',
+                      'RequestName', 'su', bytes(body.data))
+        self.received: list[tuple[int, str]] = []
+        self._last_id = 0
+
+    def run(self) -> None:
+        notify = self.notify
+        while True:
+            try:
+                message = self.bus.read_message()
+            except (OSError, notify.DBusError):
+                return
+            if message.type != notify.METHOD_CALL or message.fields.get(notify.FIELD_MEMBER) != 'Notify':
+                continue
+            _, notification_id, _, _, text = notify.read_body(message, 5)
+            if not notification_id:
+                self._last_id += 1
+                notification_id = self._last_id
+            self.received.append((notification_id, text))
+            body = notify.Writer()
+            body.uint32(notification_id)
+            self.bus.reply(message, 'u', bytes(body.data))
+
+def make_config(folder: Path) -> configparser.SectionProxy:
+    config = configparser.ConfigParser()
+    config['Settings'] = {
+        'wallpaper_folder': str(folder),
+        'rotation_interval_minutes': '30',
+        'rotation_order': 'random',
+        'swaybg_output': '*',
+        'swaybg_mode': 'fill',
+        'thumbnail_workers': '0',
+        'recursive': 'false',
+        'palette_backend': 'wal',
+        'prefetch_count': '0',
+        'prescale': 'true',
+        'thumbnail_cache_mb': '0',
+        'prescale_cache_mb': '0',
+        # El índice de parecidas se mide aparte; construirlo en segundo
+        # plano falsearía el resto de medidas.
+        'duplicate_distance': '0',
+    }
+    return config['Settings']
+
+def timed(func, *args, **kwargs) -> float:
+    start = time.perf_counter()
+    func(*args, **kwargs)
+    return time.perf_counter() - start
+
+def stop_swaybg_stubs() -> None:
+    import swaybg
+    for pid in swaybg._read_state().values():
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except OSError:
+            pass
+
+def bench_library(folder: Path, count: int, sample_size: int, repeat: int) -> list[dict]:
+    """Mide todas las rutas críticas sobre una biblioteca de 'count' imágenes."""
+    import utils
+    import library
+    import main
+    import automode
+    import similarity
+    import colorindex
+
+    results = []
+
+    def record(metric: str, seconds: float, **extra) -> None:
+        results.append({'library_size': count, 'metric': metric, 'seconds': round(seconds, 6), **extra})
+        print(f"{count:>6}  {metric:32} {seconds * 1000:10.2f} ms")
+
+    config = make_config(folder)
+    library.INDEX_FILE.unlink(missing_ok=True)
+    for suffix in ('-wal', '-shm'):
+        Path(str(library.INDEX_FILE) + suffix).unlink(missing_ok=True)
+    shutil.rmtree(utils.THUMBNAIL_CACHE_DIR, ignore_errors=True)
+
+    record('get_image_files_cold', timed(utils.get_image_files, str(folder)))
+    record('get_image_files_warm', statistics.median(
+        timed(utils.get_image_files, str(folder)) for _ in range(repeat)
+    ))
+
+    images = utils.get_image_files(str(folder))
+    sample = images[::max(1, len(images) // sample_size)][:sample_size]
+    cold = timed(lambda: [utils.get_thumbnail(img) for img in sample])
+    record('get_thumbnail_cold', cold / len(sample), sample=len(sample), per='image')
+    warm = statistics.median(timed(lambda: [utils.get_thumbnail(img) for img in sample]) for _ in range(repeat))
+    record('get_thumbnail_warm', warm / len(sample), sample=len(sample), per='image')
+
+    # Tiempo hasta que rofi recibe la primera entrada. Solo la muestra tiene
+    # miniatura en caché; el resto se generaría mientras rofi está abierto.
+    mark = folder.parent / 'rofi-mark'
+    os.environ['BENCH_ROFI_MARK'] = str(mark)
+    samples = []
+    for _ in range(repeat):
+        mark.unlink(missing_ok=True)
+        start = time.time()
+        main.main_interactive(config)
+        if mark.exists():
+            samples.append(float(mark.read_text()) - start)
+    if samples:
+        record('interactive_first_entry', statistics.median(samples))
+
+    image = sample[0]
+    record('set_wallpaper_cold', timed(main.set_wallpapers, [(image, config)], quiet=True))
+    record('set_wallpaper_warm', statistics.median(
+        timed(main.set_wallpapers, [(image, config)], quiet=True) for _ in range(repeat)
+    ))
+
+    rotations = automode.create_rotations(config, utils.get_image_files)
+    try:
+        scheduler = automode.AutoModeScheduler(rotations, main.set_wallpapers)
+        ticks = []
+        for _ in range(repeat):
+            # Se fuerza el vencimiento para que cada llamada sea un ciclo completo.
+            for rotation in rotations:
+                rotation.deadline = None
+            ticks.append(timed(scheduler.next, scheduled=True))
+        record('auto_mode_tick', statistics.median(ticks))
+    finally:
+        automode.stop_rotations(rotations)
+        stop_swaybg_stubs()
+
+    # Las imágenes sintéticas comparten píxeles, así que el índice se llena
+    # con hashes aleatorios (y algunos casi duplicados) para cada ruta.
+    cold = timed(similarity.build_index, sample)
+    record('phash_cold', cold / len(sample), sample=len(sample), per='image')
+    rng = random.Random(count)
+    phashes = {path: rng.getrandbits(64) for path in images}
+    for path in rng.sample(images, len(images) // 10):
+        phashes[path] = phashes[images[rng.randrange(len(images))]] ^ (1 << rng.randrange(64))
+    record('similarity_index_build', timed(similarity.SimilarityIndex, phashes))
+    index = similarity.SimilarityIndex(phashes)
+    queries = [phashes[path] for path in sample]
+    query = statistics.median(
+        timed(lambda: [index.similar(value, similarity.DUPLICATE_DISTANCE) for value in queries])
+        for _ in range(repeat)
+    )
+    record('similar_query', query / len(queries), sample=len(queries), per='query')
+
+    # Igual con los colores: se extraen de las miniaturas de la muestra y el
+    # índice se llena con colores aleatorios para cada ruta.
+    cold = timed(colorindex.update_colors, sample, os.cpu_count() or 1)
+    record('dominant_colors_cold', cold / len(sample), sample=len(sample), per='image')
+    colors = {
+        path: [(tuple(rng.randrange(256) for _ in range(3)), weight) for weight in (0.5, 0.3, 0.2)]
+        for path in images
+    }
+    record('color_index_build', timed(colorindex.ColorIndex, colors))
+    color_index = colorindex.ColorIndex(colors)
+    targets = [tuple(rng.randrange(256) for _ in range(3)) for _ in range(len(sample))]
+    query = statistics.median(
+        timed(lambda: [color_index.nearest(rgb) for rgb in targets]) for _ in range(repeat)
+    )
+    record('nearest_color_query', query / len(targets), sample=len(targets), per='query')
+    record('sort_by_hue', timed(colorindex.sort_images, images, 'hue', color_index))
+
+    try:
+        startup, total = bench_startup(image, repeat)
+        record('startup_set', startup)
+        record('set_cli', total)
+    finally:
+        stop_swaybg_stubs()
+    return results
+
+def bench_notifications(repeat: int) -> list[dict]:
+    """Notificaciones por D-Bus contra el servidor falso, y notify-send para comparar."""
+    import notify
+
+    results = []
+
+    def record(metric: str, seconds: float, **extra) -> None:
+        results.append({'library_size': 0, 'metric': metric, 'seconds': round(seconds, 6), **extra})
+        print(f"{0:>6}  {metric:32} {seconds * 1000:10.2f} ms")
+
+    server = NotificationServer()
+    server.start()
+    notifier = notify.Notifier()
+
+    def send(count: int = 1) -> None:
+        for i in range(count):
+            notifier.notify("Bench", f"Notificación {i}", "dialog-information")
+        notifier.flush()
+
+    record('notify_dbus_cold', timed(send))
+    record('notify_dbus_warm', statistics.median(timed(send) for _ in range(repeat)))
+    # De una ráfaga solo deberían llegar la primera y la última, y todas
+    # con el mismo id (cada una sustituye a la anterior).
+    before = len(server.received)
+    burst = timed(send, 20)
+    delivered = server.received[before:]
+    record('notify_burst', burst, sent=20, delivered=len(delivered),
+           ids=len({notification_id for notification_id, _ in server.received}))
+    # El proceso completo (el notify-send falso), no solo lanzarlo.
+    command = ['notify-send', "Bench", "Notificación", '-i', "dialog-information"]
+    record('notify_send_process', statistics.median(timed(subprocess.run, command) for _ in range(repeat)))
+    return results
+
+def check_startup_budget(results: list[dict], budget_ms: float) -> int:
+    """Devuelve 1 si el arranque de '--set' supera el presupuesto en alguna biblioteca."""
+    over = [r for r in results if r['metric'] == 'startup_set' and r['seconds'] * 1000 > budget_ms]
+    for r in over:
+        print(f"El arranque de '--set' ({r['seconds'] * 1000:.1f} ms con {r['library_size']} imágenes) "
+              f"supera el presupuesto de {budget_ms:.0f} ms.")
+    return 1 if over else 0
+
+def bench_startup(image: Path, repeat: int) -> tuple[float, float]:
+    """
+    Lanza 'main.py --set' en un proceso nuevo. Devuelve la mediana del
+    tiempo hasta que empieza set_wallpapers (según --profile) y la del
+    proceso completo. La primera ejecución solo llena las cachés.
+    """
+    startups, totals = [], []
+    for attempt in range(repeat + 1):
+        # stderr va a un archivo y no a una tubería: el swaybg falso la
+        # heredaría y subprocess.run esperaría a que la cerrase.
+        with tempfile.TemporaryFile('w+') as stderr:
+            start = time.time()
+            subprocess.run(
+                [sys.executable, str(ROOT / 'main.py'), '--set', str(image), '--quiet', '--profile'],
+                stdout=subprocess.DEVNULL, stderr=stderr
+            )
+            end = time.time()
+            stderr.seek(0)
+            output = stderr.read()
+        spans = [json.loads(line) for line in output.splitlines() if line.startswith('{')]
+        begin = next((span['start'] for span in spans if span['span'] == 'set_wallpapers'), None)
+        if begin is None:
+            raise RuntimeError(f"'main.py --set' no llegó a cambiar el fondo:\n{output}")
+        if attempt:
+            startups.append(begin - start)
+            totals.append(end - start)
+    return statistics.median(startups), statistics.median(totals)
+
+def compare(results: list[dict], baseline_path: Path, max_regression: float) -> int:
+    """Compara con una ejecución anterior. Devuelve 1 si alguna métrica empeora demasiado."""
+    baseline = {
+        (r['library_size'], r['metric']): r['seconds']
+        for r in json.loads(baseline_path.read_text())['results']
+    }
+    failures = 0
+    print(f"\nComparación con {baseline_path}:")
+    for r in results:
+        before = baseline.get((r['library_size'], r['metric']))
+        if not before:
+            continue
+        ratio = r['seconds'] / before
+        flag = ''
+        if ratio > 1 + max_regression:
+            flag = '  <-- regresión'
+            failures += 1
+        print(f"{r['library_size']:>6}  {r['metric']:32} x{ratio:5.2f}{flag}")
+    return 1 if failures else 0
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Mide las rutas críticas con bibliotecas sintéticas.")
+    parser.add_argument('--sizes', default='1000,10000,50000', help="Tamaños de biblioteca separados por comas.")
+    parser.add_argument('--workdir', type=Path, help="Carpeta de trabajo; se reutilizan las bibliotecas ya generadas.")
+    parser.add_argument('--sample', type=int, default=100, help="Imágenes de la muestra para get_thumbnail.")
+    parser.add_argument('--repeat', type=int, default=3, help="Repeticiones de las medidas en caliente (mediana).")
+    parser.add_argument('--output', type=Path, help="Guarda los resultados en JSON.")
+    parser.add_argument('--compare', type=Path, help="JSON de una ejecución anterior con el que comparar.")
+    parser.add_argument('--max-regression', type=float, default=0.25,
+                        help="Empeoramiento relativo permitido con --compare (0.25 = 25%%).")
+    parser.add_argument('--startup-budget-ms', type=float, default=STARTUP_BUDGET_MS,
+                        help="Tiempo máximo de arranque de '--set' (0 = sin límite).")
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(',') if s.strip()]
+
+    workdir = args.workdir.expanduser().absolute() if args.workdir else Path(tempfile.mkdtemp(prefix='sway-wallpaper-bench-'))
+    isolate_environment(workdir)
+    # Los módulos del proyecto calculan sus rutas de caché al importarse,
+    # así que se importan después de cambiar HOME.
+    sys.path.insert(0, str(ROOT))
+    logging.basicConfig(level=logging.ERROR, format='%(levelname)s: %(message)s')
+    import utils
+
+    results = []
+    bus = start_notification_bus(workdir)
+    try:
+        for count in sizes:
+            folder = workdir / f"library-{count}"
+            start = time.perf_counter()
+            make_library(folder, count)
+            print(f"Biblioteca de {count} imágenes lista ({time.perf_counter() - start:.1f} s).")
+            results.extend(bench_library(folder, count, args.sample, args.repeat))
+        if bus is not None:
+            results.extend(bench_notifications(args.repeat))
+    finally:
+        if bus is not None:
+            bus.terminate()
+            bus.wait()
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'version': utils.VERSION,
+        'commit': subprocess.run(
+            ['git', '-C', str(ROOT), 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True
+        ).stdout.strip() or None,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'results': results,
+    }
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2) + '\n')
+    status = check_startup_budget(results, args.startup_budget_ms) if args.startup_budget_ms else 0
+    if args.compare:
+        status |= compare(results, args.compare, args.max_regression)
+    return status
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,262 @@
+# -------------------------------------------------------------------
+# colorindex.py - Índice de Colores Dominantes
+# -------------------------------------------------------------------
+# Guarda en el índice de la biblioteca los colores dominantes de cada
+# imagen (dominant.py), calculados por lotes a partir de las
+# miniaturas ya generadas, y con ellos:
+#
+#   - busca el fondo más cercano a un color ('--set-by-color') con un
+#     índice en rejilla sobre el espacio CIELAB
+#   - ordena el selector de rofi y el orden secuencial del modo
+#     automático por tono o por luminosidad ('sort_by')
+#
+# Las consultas solo leen colores ya guardados; ninguna decodifica
+# imágenes.
+# -------------------------------------------------------------------
+
+import math
+import time
+import heapq
+import logging
+import sqlite3
+from pathlib import Path
+from functools import lru_cache
+from itertools import product, count as count_from
+
+import utils
+import library
+import profiling
+
+SORT_ORDERS = ('name', 'hue', 'lightness')
+# Fracción mínima de la imagen que debe ocupar un color (además del
+# principal) para que cuente en la búsqueda por color.
+MIN_COLOR_WEIGHT = 0.25
+# Croma por debajo del cual un color se considera gris y se ordena por
+# luminosidad después de los que tienen tono.
+GRAY_CHROMA = 10.0
+
+@lru_cache(maxsize=None)
+def _load_extractor():
+    """Importa dominant solo cuando hay colores por calcular (numpy tarda en cargar)."""
+    try:
+        import dominant
+    except ImportError as e:
+        logging.warning(f"El índice de colores requiere numpy y Pillow ({e}).")
+        return None
+    return dominant
+
+def get_sort_by(config) -> str:
+    """Orden del selector y de la rotación secuencial: 'name', 'hue' o 'lightness'."""
+    sort_by = config.get('sort_by', 'name').lower()
+    if sort_by not in SORT_ORDERS:
+        logging.warning(f"Valor no válido para 'sort_by': '{sort_by}'. Opciones: {', '.join(SORT_ORDERS)}.")
+        return 'name'
+    return sort_by
+
+def parse_color(text: str) -> tuple[int, int, int]:
+    """Convierte '#1e1e2e', '1e1e2e' o '#abc' en (r, g, b)."""
+    value = text.strip().lstrip('#')
+    if len(value) == 3:
+        value = ''.join(c * 2 for c in value)
+    if len(value) != 6:
+        raise ValueError(f"Color no válido: '{text}'. Usa el formato '#rrggbb'.")
+    try:
+        return tuple(int(value[i:i + 2], 16) for i in (0, 2, 4))
+    except ValueError:
+        raise ValueError(f"Color no válido: '{text}'. Usa el formato '#rrggbb'.") from None
+
+def encode_colors(colors: list[tuple[tuple[int, int, int], float]]) -> str:
+    """'1e1e2e:0.52 313244:0.31 ...', como se guarda en el índice."""
+    return ' '.join(f"{r:02x}{g:02x}{b:02x}:{weight}" for (r, g, b), weight in colors)
+
+def decode_colors(text: str) -> list[tuple[tuple[int, int, int], float]]:
+    colors = []
+    for entry in text.split():
+        color, _, weight = entry.partition(':')
+        colors.append((parse_color(color), float(weight)))
+    return colors
+
+def _linear(c: int) -> float:
+    c /= 255
+    return c / 12.92 if c <= 0.04045 else ((c + 0.055) / 1.055) ** 2.4
+
+# sRGB a lineal de cada valor de 0 a 255.
+_LINEAR = tuple(_linear(c) for c in range(256))
+
+def rgb_to_lab(rgb: tuple[int, int, int]) -> tuple[float, float, float]:
+    """sRGB (0-255) a CIELAB con iluminante D65."""
+    r, g, b = (_LINEAR[c] for c in rgb)
+    x = (0.4124 * r + 0.3576 * g + 0.1805 * b) / 0.95047
+    y = 0.2126 * r + 0.7152 * g + 0.0722 * b
+    z = (0.0193 * r + 0.1192 * g + 0.9505 * b) / 1.08883
+
+    def f(t: float) -> float:
+        return t ** (1 / 3) if t > 0.008856 else 7.787 * t + 16 / 116
+
+    fx, fy, fz = f(x), f(y), f(z)
+    return (116 * fy - 16, 500 * (fx - fy), 200 * (fy - fz))
+
+def sort_key(lab: tuple[float, float, float] | None, sort_by: str) -> tuple:
+    """Clave de orden de una imagen por su color principal (las que no lo tienen, al final)."""
+    if lab is None:
+        return (2,)
+    lightness, a, b = lab
+    if sort_by == 'lightness':
+        return (0, lightness)
+    if math.hypot(a, b) < GRAY_CHROMA:
+        return (1, lightness)
+    return (0, math.degrees(math.atan2(b, a)) % 360, lightness)
+
+class ColorIndex:
+    """
+    Colores de cada imagen en una rejilla sobre CIELAB, para encontrar las
+    más cercanas a un color sin comparar con todas. La distancia es la
+    euclídea en CIELAB (ΔE 1976).
+    """
+
+    CELL = 5.0
+
+    def __init__(self, colors: dict[Path, list[tuple[tuple[int, int, int], float]]]):
+        self._dominant: dict[Path, tuple[float, float, float]] = {}
+        self._cells: dict[tuple[int, int, int], list[tuple[tuple[float, float, float], Path]]] = {}
+        for path, entries in colors.items():
+            for position, (rgb, weight) in enumerate(entries):
+                if position and weight < MIN_COLOR_WEIGHT:
+                    continue
+                lab = rgb_to_lab(rgb)
+                if not position:
+                    self._dominant[path] = lab
+                self._cells.setdefault(self._cell(lab), []).append((lab, path))
+
+    def __len__(self) -> int:
+        return len(self._dominant)
+
+    def _cell(self, lab: tuple[float, float, float]) -> tuple[int, int, int]:
+        return tuple(math.floor(c / self.CELL) for c in lab)
+
+    def dominant(self, path: Path) -> tuple[float, float, float] | None:
+        """Color principal de una imagen en CIELAB, o None si no está en el índice."""
+        return self._dominant.get(path)
+
+    def nearest(self, rgb: tuple[int, int, int], count: int = 1) -> list[tuple[float, Path]]:
+        """
+        Las 'count' imágenes con algún color dominante más cercano a 'rgb',
+        como (ΔE, ruta). Se recorren anillos de celdas alrededor del color
+        buscado; tras el anillo r, lo que quede fuera está a más de
+        r * CELL, así que se puede parar en cuanto los encontrados estén
+        más cerca. Si un anillo tiene más celdas que las ocupadas (colores
+        lejos de todas las imágenes), se recorren directamente las ocupadas
+        que faltan.
+        """
+        target = rgb_to_lab(rgb)
+        center = self._cell(target)
+        best: dict[Path, float] = {}
+
+        def scan(entries):
+            for lab, path in entries:
+                distance = math.dist(lab, target)
+                if distance < best.get(path, math.inf):
+                    best[path] = distance
+
+        for ring in count_from(0):
+            if (2 * ring + 1) ** 3 - max(2 * ring - 1, 0) ** 3 >= len(self._cells):
+                for cell, entries in self._cells.items():
+                    if max(abs(a - b) for a, b in zip(cell, center)) >= ring:
+                        scan(entries)
+                return heapq.nsmallest(count, ((distance, path) for path, distance in best.items()))
+            for dx, dy, dz in _ring_offsets(ring):
+                scan(self._cells.get((center[0] + dx, center[1] + dy, center[2] + dz), ()))
+            found = heapq.nsmallest(count, ((distance, path) for path, distance in best.items()))
+            if len(found) == count and found[-1][0] <= ring * self.CELL:
+                return found
+
+@lru_cache(maxsize=None)
+def _ring_offsets(ring: int) -> tuple[tuple[int, int, int], ...]:
+    """Desplazamientos de las celdas a distancia de Chebyshev exactamente 'ring'."""
+    span = range(-ring, ring + 1)
+    return tuple(offset for offset in product(span, span, span) if max(map(abs, offset)) == ring)
+
+def update_colors(
+    images: list[Path], max_workers: int, max_cache_bytes: int = 0, generate: bool = False
+) -> dict[Path, list[tuple[tuple[int, int, int], float]]]:
+    """
+    Colores dominantes de 'images'. Se calculan los que falten a partir de
+    las miniaturas en caché; con generate=True también se generan las
+    miniaturas que falten (y se calculan los hashes de contenido).
+    """
+    with profiling.span('colors', images=len(images)) as span:
+        try:
+            conn = library.connect()
+            try:
+                colors = _update_colors(conn, images, max_workers, max_cache_bytes, generate)
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logging.warning(f"No se pudo leer el índice de colores: {e}")
+            colors = {}
+        span['indexed'] = len(colors)
+        return colors
+
+def _update_colors(conn, images, max_workers, max_cache_bytes, generate):
+    if generate:
+        hashes = {}
+        for image_path in images:
+            try:
+                hashes[image_path] = library.content_hash(conn, image_path)
+            except OSError:
+                continue
+    else:
+        hashes = library.known_hashes(conn, images)
+
+    stored = library.get_colors(conn)
+    # Rutas distintas con el mismo contenido se calculan una sola vez.
+    missing = {}
+    for image_path, file_hash in hashes.items():
+        if file_hash not in stored:
+            missing.setdefault(file_hash, image_path)
+    extractor = _load_extractor() if missing else None
+    if extractor is not None:
+        started = time.time()
+        thumbnails = utils.cached_thumbnails(list(missing.values()), started)
+        pending = [image_path for image_path in missing.values() if image_path not in thumbnails]
+        if generate and pending:
+            logging.info(f"Generando {len(pending)} miniaturas para el índice de colores...")
+            thumbnails.update(zip(pending, utils.get_thumbnails(pending, max_workers, max_cache_bytes, started)))
+        entries = [(file_hash, thumbnails[path]) for file_hash, path in missing.items() if path in thumbnails]
+        if entries:
+            logging.info(f"Calculando los colores dominantes de {len(entries)} imágenes...")
+            computed = extractor.dominant_colors([thumbnail for _, thumbnail in entries], max_workers)
+            new = {file_hash: encode_colors(colors) for (file_hash, _), colors in zip(entries, computed) if colors}
+            library.store_colors(conn, new)
+            stored.update(new)
+    return {path: decode_colors(stored[h]) for path, h in hashes.items() if h in stored}
+
+def stored_colors(images: list[Path]) -> dict[Path, list[tuple[tuple[int, int, int], float]]]:
+    """
+    Colores ya guardados de 'images', sin calcular los que falten ni
+    comprobar si los archivos han cambiado. Para ordenar el selector sin
+    retrasar su apertura.
+    """
+    with profiling.span('colors', images=len(images), stored_only=True) as span:
+        try:
+            conn = library.connect()
+            try:
+                hashes = library.indexed_hashes(conn, images)
+                stored = library.get_colors(conn)
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logging.warning(f"No se pudo leer el índice de colores: {e}")
+            hashes, stored = {}, {}
+        colors = {path: decode_colors(stored[h]) for path, h in hashes.items() if h in stored}
+        span['indexed'] = len(colors)
+        return colors
+
+def build_index(images: list[Path], max_workers: int = 1, max_cache_bytes: int = 0, generate: bool = False) -> ColorIndex:
+    return ColorIndex(update_colors(images, max_workers, max_cache_bytes, generate))
+
+def sort_images(images: list[Path], sort_by: str, index: ColorIndex) -> list[Path]:
+    """'images' ordenadas por 'sort_by'. Las que no tienen colores quedan al final, por nombre."""
+    if sort_by == 'name':
+        return images
+    return sorted(images, key=lambda path: sort_key(index.dominant(path), sort_by))
@@ -0,0 +1,340 @@
+# -------------------------------------------------------------------
+# daemon.py - Daemon Residente con API por Socket Unix
+# -------------------------------------------------------------------
+# Mantiene en memoria la configuración, la lista de imágenes, las
+# miniaturas y el planificador del modo automático. Los comandos de
+# main.py actúan como clientes ligeros que envían órdenes por el
+# socket: una línea JSON de petición y una línea JSON de respuesta.
+#
+#   {"cmd": "set", "path": "/ruta/imagen.jpg", "quiet": false, "output": null}
+#   {"cmd": "color", "color": "#1e1e2e", "quiet": false, "output": null}
+#   {"cmd": "next" | "prev" | "pause" | "resume" | "status" | "reload" | "pick" | "warm"}
+#
+# set, color, next, prev y pick aceptan "output" para actuar sobre una sola
+# salida; sin él actúan sobre todas.
+# -------------------------------------------------------------------
+
+import os
+import json
+import signal
+import socket
+import time
+import configparser
+import logging
+import threading
+import socketserver
+from pathlib import Path
+from typing import Callable, Iterator
+
+import utils
+import profiling
+import similarity
+import colorindex
+from automode import AutoModeScheduler, create_rotations, stop_rotations
+
+SOCKET_PATH = Path(
+    os.environ.get('XDG_RUNTIME_DIR') or Path.home() / '.cache/sway-wallpaper-manager'
+) / 'sway-wallpaper-manager.sock'
+
+def send_command(command: str, timeout: float | None = None, **params) -> dict | None:
+    """
+    Envía una orden al daemon y devuelve su respuesta.
+    Devuelve None si el daemon no está en ejecución.
+    """
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(str(SOCKET_PATH))
+            sock.sendall(json.dumps({'cmd': command, **params}).encode() + b'\n')
+            with sock.makefile('rb') as reader:
+                line = reader.readline()
+    except (FileNotFoundError, ConnectionRefusedError):
+        return None
+    except OSError as e:
+        logging.error(f"No se pudo comunicar con el daemon: {e}")
+        return None
+
+    if not line:
+        return None
+    return json.loads(line)
+
+class WallpaperDaemon:
+    """Estado residente del gestor y despacho de las órdenes del socket."""
+
+    def __init__(
+        self,
+        get_config_func: Callable[[], dict],
+        get_images_func: Callable[..., list[Path]],
+        set_wallpapers_func: Callable[[list[tuple[Path, dict]]], None],
+        pick_func: Callable[..., Path | None],
+        warm_func: Callable[[dict], int],
+        prepare_func: Callable[[Path, dict], bool] | None = None,
+        paused: bool = True,
+    ):
+        self.get_config_func = get_config_func
+        self.get_images_func = get_images_func
+        self.set_wallpapers_func = set_wallpapers_func
+        self.pick_func = pick_func
+        self.warm_func = warm_func
+        self.prepare_func = prepare_func
+        self._warm_thread = None
+        self.config = None
+        self.scheduler = None
+        self._scheduler_thread = None
+        self._thumbnails: dict[Path, Path] = {}
+        self._thumbnails_lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._start(*self._create_scheduler(paused))
+
+    def _create_scheduler(self, paused: bool) -> tuple[dict, AutoModeScheduler]:
+        """
+        Lee la configuración y crea las rotaciones de cada salida y el
+        planificador, sin arrancarlo. Si falla, no queda nada a medias.
+        """
+        config = self.get_config_func()
+        rotations = create_rotations(config, self.get_images_func)
+        try:
+            scheduler = AutoModeScheduler(
+                rotations, self.set_wallpapers_func, paused=paused, prepare_func=self.prepare_func
+            )
+        except Exception:
+            stop_rotations(rotations)
+            raise
+        return config, scheduler
+
+    def _start(self, config: dict, scheduler: AutoModeScheduler) -> None:
+        self.config = config
+        self.scheduler = scheduler
+        self._scheduler_thread = threading.Thread(target=scheduler.run, name='auto-mode', daemon=True)
+        self._scheduler_thread.start()
+
+    def _teardown(self) -> None:
+        self.scheduler.stop()
+        self._scheduler_thread.join(timeout=5)
+        stop_rotations(self.scheduler.rotations)
+
+    def reload(self) -> None:
+        """
+        Vuelve a leer config.ini conservando el historial y el estado de pausa.
+        La configuración nueva se prepara antes de detener la anterior: si no
+        es válida, el daemon sigue como estaba.
+        """
+        with self._reload_lock:
+            try:
+                config, scheduler = self._create_scheduler(self.scheduler.paused)
+            except (ValueError, KeyError, configparser.Error) as e:
+                raise ValueError(f"Configuración no válida, se mantiene la anterior: {e}") from e
+            old_scheduler = self.scheduler
+            self._teardown()
+            # Hereda historial y temporizadores antes de arrancar, para que su
+            # primer ciclo no cambie el fondo de inmediato.
+            scheduler.take_over(old_scheduler)
+            self._start(config, scheduler)
+        with self._thumbnails_lock:
+            self._thumbnails.clear()
+
+    def thumbnails(self, images: list[Path]) -> tuple[dict[Path, Path], Iterator[tuple[Path, Path]]]:
+        """
+        Devuelve las miniaturas de 'images' que ya existen y un iterador que
+        genera las que faltan a medida que terminan, guardándolas en memoria.
+        """
+        # Todas las que se devuelven se marcan como usadas en 'started', y la
+        # generación de las que faltan no expulsa ninguna usada desde entonces.
+        started = time.time()
+        with self._thumbnails_lock:
+            # Las que ya no están en disco las ha expulsado el límite de la caché.
+            known = {img: self._thumbnails[img] for img in images
+                     if img in self._thumbnails and self._thumbnails[img].exists()}
+        utils.touch_thumbnails(known.values(), started)
+        unknown = [img for img in images if img not in known]
+        found = utils.cached_thumbnails(unknown, started)
+        known.update(found)
+        missing = [img for img in unknown if img not in found]
+
+        def generate():
+            pending = utils.iter_thumbnails(
+                missing, utils.get_thumbnail_workers(self.config), utils.get_thumbnail_cache_bytes(self.config),
+                started
+            )
+            try:
+                for img, thumbnail in pending:
+                    with self._thumbnails_lock:
+                        self._thumbnails[img] = thumbnail
+                    yield img, thumbnail
+            finally:
+                pending.close()
+
+        with self._thumbnails_lock:
+            self._thumbnails.update(found)
+        return known, generate()
+
+    def status(self) -> dict:
+        outputs = []
+        for rotation in self.scheduler.rotations:
+            current = rotation.current
+            outputs.append({
+                'output': rotation.output,
+                'current': str(current) if current else None,
+                'seconds_until_next': self.scheduler.seconds_until_next(rotation),
+                'images': len(rotation.watcher.images()),
+                'wallpaper_folder': rotation.config['wallpaper_folder'],
+            })
+        # Los campos de primer nivel describen la salida principal.
+        return {
+            'ok': True,
+            'current': outputs[0]['current'],
+            'paused': self.scheduler.paused,
+            'seconds_until_next': self.scheduler.seconds_until_next(),
+            'images': outputs[0]['images'],
+            'wallpaper_folder': outputs[0]['wallpaper_folder'],
+            'outputs': outputs,
+            'latency': self.scheduler.latency.percentiles(),
+        }
+
+    def set_by_color(self, color: str, quiet: bool, output: str | None) -> dict:
+        """Aplica la imagen cuyo color dominante está más cerca de 'color'."""
+        try:
+            rgb = colorindex.parse_color(color)
+        except ValueError as e:
+            return {'ok': False, 'error': str(e)}
+        rotation = self.scheduler.primary if output is None else self.scheduler.rotation(output)
+        index = rotation.colors
+        # Sin 'sort_by' el índice se construye con la primera consulta; si
+        # han aparecido imágenes nuevas, solo se calculan las que faltan.
+        if index is None or len(index) < len(rotation.watcher.images()):
+            index = rotation.colors = rotation.build_color_index()
+        with profiling.span('nearest_color', images=len(index)):
+            matches = index.nearest(rgb)
+        if not matches:
+            return {'ok': False, 'error': "No hay imágenes con colores calculados."}
+        distance, image_path = matches[0]
+        self.scheduler.set(image_path, quiet=quiet, output=output)
+        return {'ok': True, 'image': str(image_path), 'distance': round(distance, 1)}
+
+    def handle(self, request: dict) -> dict:
+        """Ejecuta una orden y devuelve la respuesta que se enviará al cliente."""
+        command = request.get('cmd')
+        output = request.get('output')
+        if output is not None and command in ('set', 'color', 'next', 'prev', 'pick', 'similar'):
+            try:
+                self.scheduler.rotation(output)
+            except ValueError as e:
+                return {'ok': False, 'error': str(e)}
+        if command == 'set':
+            image_path = Path(request.get('path', ''))
+            error_msg = utils.validate_image_path(image_path)
+            if error_msg:
+                return {'ok': False, 'error': error_msg}
+            self.scheduler.set(image_path, quiet=request.get('quiet', False), output=output)
+            return {'ok': True, 'image': str(image_path)}
+        if command == 'color':
+            return self.set_by_color(request.get('color', ''), request.get('quiet', False), output)
+        if command in ('next', 'prev'):
+            image_path = getattr(self.scheduler, command)(output=output)
+            if image_path is None:
+                error_msg = "No hay imágenes disponibles." if command == 'next' else "No hay un fondo anterior."
+                return {'ok': False, 'error': error_msg}
+            return {'ok': True, 'image': str(image_path)}
+        if command == 'pause':
+            self.scheduler.pause()
+            return {'ok': True}
+        if command == 'resume':
+            self.scheduler.resume()
+            return {'ok': True}
+        if command == 'status':
+            return self.status()
+        if command == 'reload':
+            self.reload()
+            return {'ok': True}
+        if command == 'pick':
+            # Se elige entre las imágenes de la salida indicada o de la principal.
+            rotation = self.scheduler.primary if output is None else self.scheduler.rotation(output)
+            images = rotation.sorted_images(rotation.watcher.images())
+            if not images:
+                return {'ok': False, 'error': "No se encontraron imágenes."}
+            selected = self.pick_func(rotation.config, images, *self.thumbnails(images))
+            if selected is None:
+                return {'ok': True, 'image': None}
+            self.scheduler.set(selected, output=output)
+            return {'ok': True, 'image': str(selected)}
+        if command == 'similar':
+            rotation = self.scheduler.primary if output is None else self.scheduler.rotation(output)
+            if rotation.similarity is None:
+                if rotation.duplicate_distance == 0:
+                    return {'ok': False, 'error': "La búsqueda de imágenes parecidas está desactivada (duplicate_distance = 0)."}
+                return {'ok': False, 'error': "El índice de imágenes parecidas aún no está listo."}
+            distance = request.get('distance')
+            if distance is None:
+                distance = rotation.duplicate_distance
+            matches = similarity.find_similar(rotation.similarity, Path(request.get('path', '')), distance)
+            return {'ok': True, 'matches': [[d, str(path)] for d, path in matches]}
+        if command == 'warm':
+            if self._warm_thread is not None and self._warm_thread.is_alive():
+                return {'ok': False, 'error': "Ya se están precalculando las paletas."}
+            self._warm_thread = threading.Thread(
+                target=self.warm_func, args=(self.config,), name='palette-warm', daemon=True
+            )
+            self._warm_thread.start()
+            return {'ok': True}
+        return {'ok': False, 'error': f"Orden desconocida: '{command}'"}
+
+    def close(self) -> None:
+        self._teardown()
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        try:
+            request = json.loads(line)
+            with profiling.span(f"request:{request.get('cmd')}"):
+                response = self.server.daemon.handle(request)
+        except json.JSONDecodeError:
+            response = {'ok': False, 'error': "Petición no válida."}
+        except Exception as e:
+            logging.error(f"Error al atender la orden: {e}")
+            response = {'ok': False, 'error': str(e)}
+        self.wfile.write(json.dumps(response).encode() + b'\n')
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def run_daemon(
+    get_config_func: Callable[[], dict],
+    get_images_func: Callable[..., list[Path]],
+    set_wallpapers_func: Callable[[list[tuple[Path, dict]]], None],
+    pick_func: Callable[..., Path | None],
+    warm_func: Callable[[dict], int],
+    prepare_func: Callable[[Path, dict], bool] | None = None,
+    auto: bool = False,
+) -> None:
+    """Arranca el daemon y atiende el socket hasta recibir SIGTERM o Ctrl+C."""
+    if send_command('status', timeout=2) is not None:
+        logging.error(f"Ya hay un daemon en ejecución en '{SOCKET_PATH}'.")
+        return
+    SOCKET_PATH.parent.mkdir(parents=True, exist_ok=True)
+    SOCKET_PATH.unlink(missing_ok=True)  # Socket huérfano de una ejecución anterior
+
+    wallpaper_daemon = WallpaperDaemon(
+        get_config_func, get_images_func, set_wallpapers_func, pick_func, warm_func,
+        prepare_func, paused=not auto
+    )
+    old_umask = os.umask(0o077)
+    try:
+        server = _Server(str(SOCKET_PATH), _RequestHandler)
+    finally:
+        os.umask(old_umask)
+    server.daemon = wallpaper_daemon
+
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+    logging.info(f"Daemon escuchando en '{SOCKET_PATH}'.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        SOCKET_PATH.unlink(missing_ok=True)
+        wallpaper_daemon.close()
+        logging.info("Daemon detenido.")
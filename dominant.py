@@ -0,0 +1,85 @@
+# -------------------------------------------------------------------
+# dominant.py - Colores Dominantes de las Miniaturas (NumPy)
+# -------------------------------------------------------------------
+# Agrupa los píxeles de cada miniatura en unos pocos colores con un
+# k-means vectorizado sobre lotes enteros: todas las imágenes del lote
+# se agrupan a la vez con operaciones sobre arrays (N, píxeles, 3).
+# Se parte de las miniaturas ya generadas, así que no se decodifica
+# ninguna imagen a tamaño completo. Requiere numpy y Pillow;
+# colorindex.py lo importa solo cuando hay colores por calcular.
+# -------------------------------------------------------------------
+
+import logging
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+# Lado de la copia reducida de la miniatura que se agrupa.
+SAMPLE_SIZE = 32
+COLOR_COUNT = 3
+MAX_ITERATIONS = 10
+BATCH_SIZE = 256
+
+def _load_pixels(thumbnail: Path) -> np.ndarray | None:
+    try:
+        with Image.open(thumbnail) as img:
+            img = img.convert('RGB').resize((SAMPLE_SIZE, SAMPLE_SIZE), Image.Resampling.BOX)
+            return np.asarray(img, dtype=np.float32).reshape(-1, 3)
+    except (OSError, ValueError) as e:
+        logging.warning(f"No se pudieron leer los colores de '{thumbnail.name}': {e}")
+        return None
+
+def kmeans_batch(pixels: np.ndarray, count: int = COLOR_COUNT, iterations: int = MAX_ITERATIONS):
+    """
+    K-means de un lote (N, P, 3). Los centroides iniciales son cuantiles de
+    luminancia de cada imagen, así el resultado es determinista. Devuelve
+    los centroides (N, count, 3) y la fracción de píxeles de cada uno (N, count).
+    """
+    images, size, _ = pixels.shape
+    luminance = pixels @ np.array([0.2126, 0.7152, 0.0722], dtype=np.float32)
+    order = np.argsort(luminance, axis=1, kind='stable')
+    seeds = order[:, np.linspace(0, size - 1, count).astype(int)]
+    centroids = np.take_along_axis(pixels, seeds[:, :, None], axis=1)
+
+    for _ in range(iterations):
+        distances = ((pixels[:, :, None, :] - centroids[:, None, :, :]) ** 2).sum(axis=3)
+        members = (distances.argmin(axis=2)[:, :, None] == np.arange(count)).astype(np.float32)
+        counts = members.sum(axis=1)
+        sums = np.einsum('npk,npc->nkc', members, pixels)
+        # Un grupo vacío conserva su centroide anterior.
+        updated = np.where(counts[:, :, None] > 0, sums / np.maximum(counts, 1)[:, :, None], centroids)
+        converged = np.abs(updated - centroids).max() < 0.5
+        centroids = updated
+        if converged:
+            break
+    return centroids, counts / size
+
+def dominant_colors(thumbnails: list[Path], max_workers: int) -> list[list[tuple[tuple[int, int, int], float]] | None]:
+    """
+    Colores dominantes de cada miniatura como [(rgb, fracción)], del más
+    abundante al menos, en el mismo orden que 'thumbnails' (None si no se
+    pudo leer).
+    """
+    results = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for start in range(0, len(thumbnails), BATCH_SIZE):
+            loaded = list(executor.map(_load_pixels, thumbnails[start:start + BATCH_SIZE]))
+            valid = [pixels for pixels in loaded if pixels is not None]
+            if not valid:
+                results.extend(loaded)
+                continue
+            centroids, weights = kmeans_batch(np.stack(valid))
+            batch = iter(zip(centroids, weights))
+            for pixels in loaded:
+                if pixels is None:
+                    results.append(None)
+                    continue
+                colors, fractions = next(batch)
+                ranked = sorted(zip(colors, fractions), key=lambda entry: -entry[1])
+                results.append([
+                    (tuple(int(round(c)) for c in color), round(float(fraction), 3))
+                    for color, fraction in ranked if fraction > 0
+                ])
+    return results
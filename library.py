@@ -0,0 +1,340 @@
+# -------------------------------------------------------------------
+# library.py - Índice Persistente de la Biblioteca de Fondos
+# -------------------------------------------------------------------
+# Mantiene en SQLite la lista de imágenes (ruta, tamaño, mtime y
+# formato) y la actualiza de forma incremental: los directorios cuyo
+# mtime no ha cambiado no se vuelven a listar. También guarda el hash
+# del contenido de cada archivo, que sirve de clave a las cachés, y el
+# tamaño y último uso de cada miniatura y de cada copia reescalada para
+# sus cachés LRU, y el hash perceptual y los colores dominantes de cada contenido (ver
+# similarity.py y colorindex.py).
+# -------------------------------------------------------------------
+
+import os
+import time
+import hashlib
+import sqlite3
+import logging
+from pathlib import Path
+
+INDEX_FILE = Path.home() / '.cache/sway-wallpaper-manager/library.sqlite3'
+
+# Un directorio modificado hace menos de este margen se volverá a listar
+# en la siguiente actualización: con la granularidad de mtime de algunos
+# sistemas de archivos (NFS, FAT) un cambio en el mismo segundo pasaría
+# desapercibido.
+RACY_MTIME_NS = 2_000_000_000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS dirs (
+    path     TEXT PRIMARY KEY,
+    parent   TEXT,
+    mtime_ns INTEGER
+);
+CREATE INDEX IF NOT EXISTS dirs_parent ON dirs(parent);
+CREATE TABLE IF NOT EXISTS images (
+    path     TEXT PRIMARY KEY,
+    dir      TEXT NOT NULL,
+    name     TEXT NOT NULL,
+    size     INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    format   TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS images_dir ON images(dir);
+CREATE TABLE IF NOT EXISTS hashes (
+    path     TEXT PRIMARY KEY,
+    size     INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    hash     TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS thumbnails (
+    hash      TEXT PRIMARY KEY,
+    path      TEXT NOT NULL,
+    size      INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS thumbnails_last_used ON thumbnails(last_used);
+CREATE TABLE IF NOT EXISTS scaled (
+    path      TEXT PRIMARY KEY,
+    hash      TEXT NOT NULL,
+    size      INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS scaled_last_used ON scaled(last_used);
+CREATE TABLE IF NOT EXISTS phashes (
+    hash   TEXT PRIMARY KEY,
+    phash  INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS colors (
+    hash   TEXT PRIMARY KEY,
+    colors TEXT NOT NULL
+);
+"""
+
+def connect() -> sqlite3.Connection:
+    """Abre (y crea si hace falta) la base de datos del índice."""
+    INDEX_FILE.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(INDEX_FILE, timeout=10)
+    # WAL permite que el daemon y los clientes lean mientras otro escribe.
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+def refresh(conn: sqlite3.Connection, root: Path, extensions: set[str], recursive: bool = False) -> None:
+    """Actualiza el índice de 'root', listando solo los directorios que cambiaron."""
+    pending = [root]
+    with conn:
+        while pending:
+            directory = pending.pop()
+            try:
+                st = os.stat(directory)
+            except OSError:
+                _forget_tree(conn, directory)
+                continue
+
+            row = conn.execute("SELECT mtime_ns FROM dirs WHERE path = ?", (str(directory),)).fetchone()
+            if row and row[0] == st.st_mtime_ns:
+                subdirs = [Path(r[0]) for r in conn.execute(
+                    "SELECT path FROM dirs WHERE parent = ?", (str(directory),)
+                )]
+            else:
+                subdirs = _scan_dir(conn, directory, st.st_mtime_ns, extensions)
+
+            if recursive:
+                pending.extend(subdirs)
+
+def _scan_dir(conn: sqlite3.Connection, directory: Path, mtime_ns: int, extensions: set[str]) -> list[Path]:
+    """Lista un directorio, reemplaza sus entradas en el índice y devuelve sus subdirectorios."""
+    images = []
+    subdirs = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir():
+                        if not entry.name.startswith('.'):
+                            subdirs.append(Path(entry.path))
+                        continue
+                    suffix = os.path.splitext(entry.name)[1].lower()
+                    if suffix in extensions and entry.is_file():
+                        st = entry.stat()
+                        images.append((entry.path, str(directory), entry.name, st.st_size, st.st_mtime_ns, suffix[1:]))
+                except OSError:
+                    continue
+    except OSError as e:
+        logging.warning(f"No se pudo leer el directorio '{directory}': {e}")
+        return []
+
+    conn.execute("DELETE FROM images WHERE dir = ?", (str(directory),))
+    conn.executemany("INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?, ?, ?)", images)
+
+    known = {r[0] for r in conn.execute("SELECT path FROM dirs WHERE parent = ?", (str(directory),))}
+    current = {str(d) for d in subdirs}
+    for gone in known - current:
+        _forget_tree(conn, Path(gone))
+    # Los subdirectorios nuevos se registran sin mtime para que se listen
+    # la primera vez que se recorran.
+    conn.executemany(
+        "INSERT OR IGNORE INTO dirs (path, parent, mtime_ns) VALUES (?, ?, NULL)",
+        [(d, str(directory)) for d in current - known]
+    )
+
+    if time.time_ns() - mtime_ns < RACY_MTIME_NS:
+        mtime_ns = None
+    conn.execute(
+        "INSERT INTO dirs (path, parent, mtime_ns) VALUES (?, ?, ?) "
+        "ON CONFLICT(path) DO UPDATE SET mtime_ns = excluded.mtime_ns",
+        (str(directory), str(directory.parent), mtime_ns)
+    )
+    return subdirs
+
+def _forget_tree(conn: sqlite3.Connection, directory: Path) -> None:
+    """Elimina del índice un directorio y todo lo que cuelga de él."""
+    path = str(directory)
+    prefix = path.rstrip('/') + '/'
+    conn.execute(
+        "DELETE FROM dirs WHERE path = ? OR substr(path, 1, ?) = ?", (path, len(prefix), prefix)
+    )
+    conn.execute(
+        "DELETE FROM images WHERE dir = ? OR substr(dir, 1, ?) = ?", (path, len(prefix), prefix)
+    )
+
+def list_images(conn: sqlite3.Connection, root: Path, recursive: bool = False) -> list[Path]:
+    """Devuelve las imágenes indexadas bajo 'root', ordenadas por nombre."""
+    path = str(root)
+    if recursive:
+        prefix = path.rstrip('/') + '/'
+        rows = conn.execute(
+            "SELECT path FROM images WHERE dir = ? OR substr(dir, 1, ?) = ? ORDER BY name, path",
+            (path, len(prefix), prefix)
+        )
+    else:
+        rows = conn.execute("SELECT path FROM images WHERE dir = ? ORDER BY name, path", (path,))
+    return [Path(r[0]) for r in rows]
+
+def content_hash(conn: sqlite3.Connection, path: Path) -> str:
+    """
+    Devuelve el hash del contenido de un archivo. Se recalcula solo si
+    cambian su tamaño o su mtime.
+    """
+    st = os.stat(path)
+    row = conn.execute("SELECT size, mtime_ns, hash FROM hashes WHERE path = ?", (str(path),)).fetchone()
+    if row and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+        return row[2]
+
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    file_hash = digest.hexdigest()
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?)",
+            (str(path), st.st_size, st.st_mtime_ns, file_hash)
+        )
+    return file_hash
+
+def known_hashes(conn: sqlite3.Connection, paths: list[Path]) -> dict[Path, str]:
+    """Hashes ya calculados y todavía válidos de 'paths', sin leer los archivos."""
+    known = {}
+    for path in paths:
+        row = conn.execute("SELECT size, mtime_ns, hash FROM hashes WHERE path = ?", (str(path),)).fetchone()
+        if row is None:
+            continue
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        if row[0] == st.st_size and row[1] == st.st_mtime_ns:
+            known[path] = row[2]
+    return known
+
+def indexed_hashes(conn: sqlite3.Connection, paths: list[Path]) -> dict[Path, str]:
+    """
+    Hashes guardados de 'paths' sin comprobar si los archivos han cambiado
+    (ni leerlos ni consultar su tamaño). Sirve para ordenar, no para
+    decidir qué hay que volver a calcular.
+    """
+    wanted = {str(path): path for path in paths}
+    return {wanted[path]: file_hash for path, file_hash in conn.execute("SELECT path, hash FROM hashes") if path in wanted}
+
+def prune_hashes(conn: sqlite3.Connection) -> set[str]:
+    """
+    Olvida los hashes de archivos que ya no existen o que han cambiado
+    desde que se calcularon, y devuelve los hashes que siguen vigentes.
+    """
+    stale = []
+    live = set()
+    for path, size, mtime_ns, file_hash in conn.execute("SELECT path, size, mtime_ns, hash FROM hashes").fetchall():
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            stale.append(path)
+            continue
+        except OSError:
+            live.add(file_hash)  # Inaccesible por ahora; se conserva.
+            continue
+        if st.st_size != size or st.st_mtime_ns != mtime_ns:
+            stale.append(path)
+        else:
+            live.add(file_hash)
+    with conn:
+        conn.executemany("DELETE FROM hashes WHERE path = ?", [(p,) for p in stale])
+    return live
+
+def touch_thumbnails(conn: sqlite3.Connection, entries: list[tuple[str, str, int]], now: float) -> None:
+    """Registra el uso de miniaturas, dadas como (hash, ruta, tamaño en bytes)."""
+    with conn:
+        conn.executemany(
+            "INSERT INTO thumbnails VALUES (?, ?, ?, ?) ON CONFLICT(hash) DO UPDATE SET "
+            "path = excluded.path, size = excluded.size, last_used = excluded.last_used",
+            [(file_hash, path, size, now) for file_hash, path, size in entries]
+        )
+
+def touch_thumbnail_paths(conn: sqlite3.Connection, paths: list[str], now: float) -> None:
+    """Registra el uso de miniaturas ya conocidas, por su ruta."""
+    with conn:
+        conn.executemany("UPDATE thumbnails SET last_used = ? WHERE path = ?", [(now, p) for p in paths])
+
+def evict_thumbnails(conn: sqlite3.Connection, max_bytes: int, used_before: float) -> list[Path]:
+    """
+    Olvida las miniaturas usadas hace más tiempo hasta que el total quede
+    por debajo de 'max_bytes' y devuelve sus rutas para borrarlas. Nunca
+    elige las usadas desde 'used_before'.
+    """
+    evicted = _evict(conn, 'thumbnails', 'hash', max_bytes, used_before)
+    forget_thumbnails(conn, [key for key, _ in evicted])
+    return [Path(path) for _, path in evicted]
+
+def forget_thumbnails(conn: sqlite3.Connection, hashes: list[str]) -> None:
+    with conn:
+        conn.executemany("DELETE FROM thumbnails WHERE hash = ?", [(h,) for h in hashes])
+
+def touch_scaled(conn: sqlite3.Connection, entries: list[tuple[str, str, int]], now: float) -> None:
+    """Registra el uso de copias reescaladas, dadas como (ruta, hash, tamaño en bytes)."""
+    with conn:
+        conn.executemany(
+            "INSERT INTO scaled VALUES (?, ?, ?, ?) ON CONFLICT(path) DO UPDATE SET "
+            "hash = excluded.hash, size = excluded.size, last_used = excluded.last_used",
+            [(path, file_hash, size, now) for path, file_hash, size in entries]
+        )
+
+def evict_scaled(conn: sqlite3.Connection, max_bytes: int, used_before: float) -> list[Path]:
+    """Como evict_thumbnails, para las copias reescaladas."""
+    evicted = _evict(conn, 'scaled', 'path', max_bytes, used_before)
+    forget_scaled(conn, [path for path, _ in evicted])
+    return [Path(path) for _, path in evicted]
+
+def forget_scaled(conn: sqlite3.Connection, paths: list[str]) -> None:
+    with conn:
+        conn.executemany("DELETE FROM scaled WHERE path = ?", [(p,) for p in paths])
+
+def _evict(conn: sqlite3.Connection, table: str, key: str, max_bytes: int, used_before: float) -> list[tuple[str, str]]:
+    """(clave, ruta) de las entradas de 'table' a olvidar, de la usada hace más tiempo en adelante."""
+    total = conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {table}").fetchone()[0]
+    if total <= max_bytes:
+        return []
+    evicted = []
+    rows = conn.execute(
+        f"SELECT {key}, path, size FROM {table} WHERE last_used < ? ORDER BY last_used", (used_before,)
+    ).fetchall()
+    for entry_key, path, size in rows:
+        if total <= max_bytes:
+            break
+        evicted.append((entry_key, path))
+        total -= size
+    return evicted
+
+def get_phashes(conn: sqlite3.Connection) -> dict[str, int]:
+    """Hashes perceptuales guardados, por hash de contenido (enteros de 64 bits sin signo)."""
+    # SQLite guarda enteros de 64 bits con signo.
+    return {h: phash & 0xFFFF_FFFF_FFFF_FFFF for h, phash in conn.execute("SELECT hash, phash FROM phashes")}
+
+def store_phashes(conn: sqlite3.Connection, entries: dict[str, int]) -> None:
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO phashes VALUES (?, ?)",
+            [(h, phash - (1 << 64) if phash >= 1 << 63 else phash) for h, phash in entries.items()]
+        )
+
+def _prune_by_hash(conn: sqlite3.Connection, table: str, live_hashes: set[str]) -> int:
+    stale = [(h,) for (h,) in conn.execute(f"SELECT hash FROM {table}") if h not in live_hashes]
+    with conn:
+        conn.executemany(f"DELETE FROM {table} WHERE hash = ?", stale)
+    return len(stale)
+
+def prune_phashes(conn: sqlite3.Connection, live_hashes: set[str]) -> int:
+    """Olvida los hashes perceptuales de contenidos que ya no están en la biblioteca. Devuelve cuántos."""
+    return _prune_by_hash(conn, 'phashes', live_hashes)
+
+def get_colors(conn: sqlite3.Connection) -> dict[str, str]:
+    """Colores dominantes guardados, por hash de contenido (ver colorindex.encode_colors)."""
+    return dict(conn.execute("SELECT hash, colors FROM colors"))
+
+def store_colors(conn: sqlite3.Connection, entries: dict[str, str]) -> None:
+    with conn:
+        conn.executemany("INSERT OR REPLACE INTO colors VALUES (?, ?)", list(entries.items()))
+
+def prune_colors(conn: sqlite3.Connection, live_hashes: set[str]) -> int:
+    """Olvida los colores de contenidos que ya no están en la biblioteca. Devuelve cuántos."""
+    return _prune_by_hash(conn, 'colors', live_hashes)
@@ -6,66 +6,245 @@
 # El flujo es más directo: seleccionar en rofi aplica el fondo.
 # -------------------------------------------------------------------
 
+import os
 import sys
+import time
 import logging
+import threading
+import subprocess
 from pathlib import Path
 from functools import partial
+from typing import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
 from utils import save_last_wallpaper
 
 
 # Importaciones de nuestros módulos locales
 import utils
+import library
+import profiling
 import automode
+import daemon
+import palette
+import swaybg
+import prescale
+import similarity
+import colorindex
 
-def set_wallpaper(image_path: Path, config: dict, quiet: bool = False):
+# Opciones que solo tienen sentido con el daemon en ejecución y la orden
+# del socket a la que corresponden.
+DAEMON_FLAGS = {
+    '--next': 'next',
+    '--prev': 'prev',
+    '--pause': 'pause',
+    '--resume': 'resume',
+    '--status': 'status',
+    '--reload': 'reload',
+}
+
+def warm_palettes(config: dict) -> int:
+    """Precalcula las paletas de toda la biblioteca (de todas las salidas)."""
+    images = {}
+    for output_config in utils.get_output_configs(config):
+        recursive = output_config.getboolean('recursive', fallback=False)
+        for image_path in utils.get_image_files(output_config['wallpaper_folder'], recursive=recursive):
+            images.setdefault(image_path, None)
+    return palette.warm_palettes(
+        list(images), palette.get_palette_workers(config), palette.get_palette_backend(config)
+    )
+
+def gc_cache() -> int:
     """
-    Establece el fondo de pantalla, genera la paleta y envía una notificación.
+    Elimina de las cachés (miniaturas, paletas y copias reescaladas) las
+    entradas de imágenes que ya no existen o han cambiado.
     """
+    conn = library.connect()
+    try:
+        live_hashes = library.prune_hashes(conn)
+        removed = {
+            'miniaturas': utils.gc_thumbnails(conn, live_hashes),
+            'paletas': palette.gc_palettes(live_hashes),
+            'reescaladas': prescale.gc_scaled(conn, live_hashes),
+            'hashes perceptuales': library.prune_phashes(conn, live_hashes),
+            'colores': library.prune_colors(conn, live_hashes),
+        }
+    finally:
+        conn.close()
+    logging.info("Caché limpiada: " + ", ".join(f"{count} {name}" for name, count in removed.items()) + ".")
+    return sum(removed.values())
+
+def find_similar(config, output: str | None, distance: int | None = None) -> list[tuple[int, Path]]:
+    """Imágenes de la carpeta (de 'output' o de la principal) parecidas al último fondo."""
+    config = select_outputs(config, output)[0]
+    image_path = utils.get_last_wallpaper()
+    if image_path is None:
+        logging.error(f"No hay un fondo actual en '{utils.LAST_WALLPAPER_FILE}'.")
+        return []
+    if distance is None:
+        distance = similarity.get_duplicate_distance(config)
+        if distance == 0:
+            logging.error(
+                "La búsqueda de imágenes parecidas está desactivada (duplicate_distance = 0). "
+                "Indica la distancia con '--similar <bits>'."
+            )
+            return []
+    recursive = config.getboolean('recursive', fallback=False)
+    images = utils.get_image_files(config['wallpaper_folder'], recursive=recursive)
+    index = similarity.build_index(images, max_workers=utils.get_thumbnail_workers(config))
+    with profiling.span('similar', images=len(index)):
+        matches = similarity.find_similar(index, image_path, distance)
+    print_similar(image_path, matches)
+    return matches
+
+def print_similar(image_path: Path, matches: Iterable) -> None:
+    matches = list(matches)
+    if not matches:
+        logging.info(f"No hay imágenes parecidas a '{image_path.name}'.")
+        return
+    for distance, path in matches:
+        print(f"{distance:>2}  {path}")
+
+def set_by_color(config, output: str | None, color: str, quiet: bool = False) -> Path | None:
+    """
+    Aplica la imagen de la carpeta (de 'output' o de la principal) cuyo
+    color dominante está más cerca de 'color'. Los colores que falten se
+    calculan una vez y quedan en el índice de la biblioteca.
+    """
+    rgb = colorindex.parse_color(color)
+    output_configs = select_outputs(config, output)
+    config = output_configs[0]
+    recursive = config.getboolean('recursive', fallback=False)
+    images = utils.get_image_files(config['wallpaper_folder'], recursive=recursive)
+    index = colorindex.build_index(
+        images, utils.get_thumbnail_workers(config), utils.get_thumbnail_cache_bytes(config), generate=True
+    )
+    with profiling.span('nearest_color', images=len(index)):
+        matches = index.nearest(rgb)
+    if not matches:
+        logging.error("No hay imágenes con colores calculados.")
+        return None
+    distance, image_path = matches[0]
     if not quiet:
-        logging.info(f"Estableciendo fondo: {image_path.name}")
-    
-    utils.kill_previous_swaybg()
+        logging.info(f"Imagen más cercana a '{color}': {image_path.name} (ΔE {distance:.1f})")
+    set_wallpapers([(image_path, c) for c in output_configs], quiet=quiet)
+    return image_path
 
-    swaybg_cmd = [
-        'swaybg', '-o', config['swaybg_output'], '-i', str(image_path), '-m', config['swaybg_mode']
-    ]
-    utils.run_command(swaybg_cmd, background=True)
-    utils.save_last_wallpaper(image_path)
+def select_outputs(config: dict, output: str | None) -> list:
+    """Configuración de las salidas a las que se aplica una orden ('output' o todas)."""
+    output_configs = utils.get_output_configs(config)
+    if output is None:
+        return output_configs
+    selected = [c for c in output_configs if c['swaybg_output'] == output]
+    if not selected:
+        raise ValueError(f"Salida no configurada: '{output}'")
+    return selected
 
+def show_wallpaper(image_path: Path, config: dict) -> bool:
+    """Muestra la imagen en la salida de 'config', sin tocar la paleta."""
+    # swaybg recibe una copia ya adaptada a la resolución de la salida.
+    display_path = image_path
+    if config.getboolean('prescale', fallback=True):
+        with profiling.span('prescale', output=config['swaybg_output']):
+            display_path = prescale.get_scaled(
+                image_path, config['swaybg_output'], config['swaybg_mode'],
+                max_cache_bytes=prescale.get_prescale_cache_bytes(config)
+            )
+    with profiling.span('swaybg', output=config['swaybg_output']) as span:
+        span['ok'] = swaybg.set_background(display_path, config['swaybg_output'], config['swaybg_mode'])
+    return span['ok']
+
+def set_wallpapers(assignments: list[tuple[Path, dict]], quiet: bool = False):
+    """
+    Establece un fondo por salida, genera la paleta y envía una notificación.
+    Los swaybg de todas las salidas se lanzan a la vez. Solo la paleta de
+    la salida principal se aplica antes de volver; las del resto se
+    calculan en segundo plano para tenerlas en caché.
+    """
+    with profiling.span('set_wallpapers', outputs=len(assignments)):
+        _set_wallpapers(assignments, quiet)
 
+def _set_wallpapers(assignments: list[tuple[Path, dict]], quiet: bool):
     if not quiet:
-        logging.info("Generando paleta de colores con pywal...")
-    wal_cmd = ['wal', '-i', str(image_path), '-n', '-q']
-    utils.run_command(wal_cmd)
-    
+        for image_path, config in assignments:
+            logging.info(f"Estableciendo fondo en '{config['swaybg_output']}': {image_path.name}")
+
+    if len(assignments) == 1:
+        show_wallpaper(*assignments[0])
+    else:
+        with ThreadPoolExecutor(max_workers=len(assignments)) as executor:
+            list(executor.map(lambda assignment: show_wallpaper(*assignment), assignments))
+
+    # restore.sh vuelve a poner en cada salida su último fondo.
+    for image_path, config in assignments:
+        if config['swaybg_output'] != '*':
+            utils.save_last_wallpaper(image_path, config['swaybg_output'])
+
+    # Sin secciones [Output ...] la única configuración es la principal.
+    primary = next(((image_path, config) for image_path, config in assignments
+                    if config.getboolean('primary', fallback=True)), None)
+    if primary is not None:
+        utils.save_last_wallpaper(primary[0])
+        if not quiet:
+            logging.info("Generando paleta de colores con pywal...")
+        backend = palette.get_palette_backend(primary[1])
+        with profiling.span('palette', backend=backend):
+            palette.apply_palette(primary[0], backend)
+    for image_path, config in assignments:
+        if primary is None or image_path != primary[0]:
+            palette.warm_palette_in_background(image_path, palette.get_palette_backend(config))
+
     if not quiet:
-        utils.send_notification(
-            "Fondo de Pantalla Actualizado",
-            image_path.name,
-            icon=str(image_path)
-        )
+        if len(assignments) == 1:
+            message = assignments[0][0].name
+        else:
+            message = "\n".join(f"{config['swaybg_output']}: {image_path.name}" for image_path, config in assignments)
+        utils.send_notification("Fondo de Pantalla Actualizado", message, icon=str(assignments[0][0]))
         logging.info("¡Listo!")
 
-def main_interactive(config: dict, persist_mode: bool = False):
-    """Lanza el modo interactivo usando rofi con miniaturas."""
-    images = utils.get_image_files(config['wallpaper_folder'])
-    if not images:
-        utils.send_notification("Error", "No se encontraron imágenes.", "dialog-warning")
-        return
+def prepare_wallpaper(image_path: Path, config: dict) -> bool:
+    """
+    Deja listo un fondo antes de que le toque: comprueba que el archivo
+    sigue siendo válido, lo carga en la caché de página y precalcula su
+    paleta y su copia reescalada, para que set_wallpapers solo tenga que
+    intercambiarlo.
+    """
+    if utils.validate_image_path(image_path):
+        return False
+    utils.warm_page_cache(image_path)
+    if config.getboolean('prescale', fallback=True):
+        utils.warm_page_cache(prescale.get_scaled(
+            image_path, config['swaybg_output'], config['swaybg_mode'],
+            max_cache_bytes=prescale.get_prescale_cache_bytes(config)
+        ))
+    return palette.warm_palette(image_path, palette.get_palette_backend(config))
 
-    # Genera las miniaturas y prepara la entrada para rofi
-    rofi_input = []
+# Icono del tema para las entradas cuya miniatura no se pudo generar.
+PLACEHOLDER_ICON = 'image-x-generic'
+
+def choose_with_rofi(
+    config: dict,
+    images: list[Path],
+    thumbnails: dict[Path, Path],
+    pending: Iterable[tuple[Path, Path]] = (),
+) -> Path | None:
+    """
+    Muestra las imágenes en rofi con sus miniaturas y devuelve la elegida.
+    rofi se abre enseguida con las de 'thumbnails' (miniaturas ya en caché);
+    las de 'pending', pares (imagen, miniatura) que se van generando
+    mientras tanto, se le envían a medida que llegan.
+    """
+    recursive = config.getboolean('recursive', fallback=False)
+    folder = Path(config['wallpaper_folder']).expanduser()
     image_map = {}
-    logging.info("Preparando imágenes para rofi...")
     for img in images:
-        thumbnail_path = utils.get_thumbnail(img)
-        # El formato es: "<texto>\0icon\x1f<ruta_icono>"
-        rofi_input.append(f"{img.name}\0icon\x1f{thumbnail_path}")
-        image_map[img.name] = img
-
-    rofi_input_str = "\n".join(rofi_input)
+        # Con subcarpetas se muestra la ruta relativa para distinguir
+        # imágenes con el mismo nombre.
+        label = str(img.relative_to(folder)) if recursive else img.name
+        image_map[label] = img
+    labels = {img: label for label, img in image_map.items()}
 
-    # Lanza rofi en modo de iconos
+    # Lanza rofi en modo de iconos. Con '-async-pre-read 0' se muestra sin
+    # esperar a leer ninguna entrada y el resto se añade según llega.
     rofi_theme = 'window {width: 80%;} configuration {font: "JetBrains Mono 14";}'
     rofi_process = utils.run_command(
         [
@@ -74,26 +253,211 @@ def main_interactive(config: dict, persist_mode: bool = False):
             '-p', '🖼️ Fondo',
             '-i',
             '-show-icons',
+            '-async-pre-read', '0',
             '-theme-str', rofi_theme,
         ],
-        input=rofi_input_str, capture_output=True, text=True
+        background=True, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True
     )
+    if rofi_process is None:
+        return None
 
-    if not rofi_process or rofi_process.returncode != 0:
+    def feed():
+        def write(img: Path, thumbnail: Path):
+            icon = thumbnail if thumbnail.exists() else PLACEHOLDER_ICON
+            # El formato es: "<texto>\0icon\x1f<ruta_icono>"
+            rofi_process.stdin.write(f"{labels[img]}\0icon\x1f{icon}\n")
+
+        try:
+            for img in images:
+                if img in thumbnails:
+                    write(img, thumbnails[img])
+            rofi_process.stdin.flush()
+            for img, thumbnail in pending:
+                write(img, thumbnail)
+                rofi_process.stdin.flush()
+        except (BrokenPipeError, ValueError):
+            pass  # rofi ya se cerró
+        finally:
+            if hasattr(pending, 'close'):
+                pending.close()
+            try:
+                rofi_process.stdin.close()
+            except BrokenPipeError:
+                pass
+
+    threading.Thread(target=feed, name='rofi-feed', daemon=True).start()
+    with profiling.span('rofi') as span:
+        selected_filename = rofi_process.stdout.read().strip()
+        span['exit'] = rofi_process.wait()
+    if rofi_process.returncode != 0:
         logging.info("Selección cancelada.")
-        return
+        return None
 
     # La salida de rofi es solo el texto, sin la parte del icono
-    selected_filename = rofi_process.stdout.strip()
     selected_image_path = image_map.get(selected_filename)
+    if not selected_image_path:
+        logging.error(f"No se encontró la imagen para '{selected_filename}'")
+    return selected_image_path
+
+def main_interactive(config: dict, persist_mode: bool = False, output: str | None = None):
+    """
+    Lanza el modo interactivo usando rofi con miniaturas. Se elige entre
+    las imágenes de la salida indicada (o de la principal) y el fondo se
+    aplica a esa salida (o a todas).
+    """
+    output_configs = select_outputs(config, output)
+    config = output_configs[0]
+    recursive = config.getboolean('recursive', fallback=False)
+    images = utils.get_image_files(config['wallpaper_folder'], recursive=recursive)
+    if not images:
+        utils.send_notification("Error", "No se encontraron imágenes.", "dialog-warning")
+        return
+    sort_by = colorindex.get_sort_by(config)
+    index = None
+    if sort_by != 'name':
+        # Solo con los colores ya guardados, sin decodificar nada antes de
+        # abrir rofi; las imágenes sin ellos van al final.
+        index = colorindex.ColorIndex(colorindex.stored_colors(images))
+        images = colorindex.sort_images(images, sort_by, index)
+
+    # rofi se abre con las miniaturas que ya existen; las que faltan se
+    # generan en segundo plano y se le envían según terminan.
+    # Las que se muestran no pueden expulsarse al generar las que faltan.
+    started = time.time()
+    thumbnails = utils.cached_thumbnails(images, started)
+    missing = [img for img in images if img not in thumbnails]
+    if missing:
+        logging.info(f"Generando {len(missing)} miniaturas mientras se muestra rofi...")
+    pending = utils.iter_thumbnails(
+        missing, utils.get_thumbnail_workers(config), utils.get_thumbnail_cache_bytes(config), started
+    )
+    color_thread = None
+    if index is not None and len(index) < len(images):
+        # Los colores que faltan se calculan de las miniaturas cuando
+        # terminan de generarse (o al cerrarse rofi), para la próxima vez.
+        stream_done = threading.Event()
+        pending = _signal_when_done(pending, stream_done)
+        color_thread = threading.Thread(
+            target=_index_missing_colors, args=(images, utils.get_thumbnail_workers(config), stream_done),
+            name='color-index', daemon=True
+        )
+        color_thread.start()
+    selected_image_path = choose_with_rofi(config, images, thumbnails, pending)
 
     if selected_image_path:
         # Al seleccionar, se aplica directamente el fondo.
-        set_wallpaper(selected_image_path, config)
+        set_wallpapers([(selected_image_path, c) for c in output_configs])
         if persist_mode:
             utils.manage_persistence()
+    if color_thread is not None:
+        stream_done.set()
+        color_thread.join()
+
+def _signal_when_done(pending: Iterator[tuple[Path, Path]], done: threading.Event) -> Iterator[tuple[Path, Path]]:
+    """Pasa los pares de 'pending' y activa 'done' al agotarse o cerrarse."""
+    try:
+        yield from pending
+    finally:
+        pending.close()
+        done.set()
+
+def _index_missing_colors(images: list[Path], max_workers: int, stream_done: threading.Event):
+    """Espera a que no se generen más miniaturas y calcula con ellas los colores que falten."""
+    stream_done.wait()
+    colorindex.update_colors(images, max_workers)
+
+def similar_distance(args: list[str]) -> int | None:
+    """Distancia opcional de '--similar <bits>'."""
+    if len(args) > 1 and args[1].isdigit():
+        return int(args[1])
+    return None
+
+def run_client(args: list[str], quiet_mode: bool, persist_mode: bool, output: str | None = None) -> bool:
+    """
+    Si hay un daemon en ejecución, le delega la orden y devuelve True.
+    Devuelve False para que la orden se ejecute en este mismo proceso.
+    """
+    daemon_only = args and args[0] in DAEMON_FLAGS
+    if not args:
+        request = ('pick', {'output': output})
+    elif args[0] == '--auto':
+        request = ('resume', {})
+    elif args[0] == '--warm-palettes':
+        request = ('warm', {})
+    elif args[0] == '--set' and len(args) > 1:
+        image_path = Path(args[1]).expanduser().absolute()
+        request = ('set', {'path': str(image_path), 'quiet': quiet_mode, 'output': output})
+    elif args[0] == '--set-by-color' and len(args) > 1:
+        request = ('color', {'color': args[1], 'quiet': quiet_mode, 'output': output})
+    elif args[0] == '--similar':
+        image_path = utils.get_last_wallpaper()
+        if image_path is None:
+            return False
+        request = ('similar', {'path': str(image_path), 'output': output, 'distance': similar_distance(args)})
+    elif daemon_only:
+        command = DAEMON_FLAGS[args[0]]
+        request = (command, {'output': output} if command in ('next', 'prev') else {})
     else:
-        logging.error(f"No se encontró la imagen para '{selected_filename}'")
+        return False
+
+    command, params = request
+    with profiling.span(f"daemon:{command}"):
+        response = daemon.send_command(command, **params)
+    if response is None:
+        if daemon_only:
+            logging.error("El daemon no está en ejecución. Inícialo con 'sway-wallpaper --daemon'.")
+            return True
+        return False
+
+    if not response.get('ok'):
+        logging.error(response.get('error', "Error desconocido en el daemon."))
+        return True
+
+    if command == 'status':
+        print(f"Fondo actual:   {response['current'] or '-'}")
+        print(f"Estado:         {'en pausa' if response['paused'] else 'rotando'}")
+        if response['seconds_until_next'] is not None:
+            print(f"Próximo cambio: {int(response['seconds_until_next'])} s")
+        print(f"Imágenes:       {response['images']} en {response['wallpaper_folder']}")
+        latency = response.get('latency')
+        if latency:
+            print(f"Latencia:       p50 {latency['p50_ms']} ms, p90 {latency['p90_ms']} ms, "
+                  f"p99 {latency['p99_ms']} ms ({latency['count']} cambios)")
+        outputs = response.get('outputs', [])
+        if len(outputs) > 1:
+            for info in outputs:
+                next_change = '-' if info['seconds_until_next'] is None else f"{int(info['seconds_until_next'])} s"
+                print(f"  {info['output']}: {info['current'] or '-'} (próximo: {next_change}, "
+                      f"{info['images']} en {info['wallpaper_folder']})")
+    elif command == 'similar':
+        print_similar(Path(params['path']), response['matches'])
+    elif response.get('image') and not quiet_mode:
+        logging.info(f"Fondo establecido: {response['image']}")
+
+    if persist_mode and command in ('pick', 'resume', 'set', 'color'):
+        utils.manage_persistence()
+    return True
+
+def required_commands(args: list[str], config) -> list[str]:
+    """
+    Comandos externos que necesita la orden pedida (ver utils.check_dependencies).
+    'notify-send' no está: las notificaciones van por D-Bus y solo lo usan
+    como alternativa.
+    """
+    if '--gc-cache' in args or '--similar' in args:
+        return []
+    commands = []
+    if '--warm-palettes' not in args:
+        commands.append('swaybg')
+    if config.get('palette_backend', 'wal').lower() != 'native':
+        commands.append('wal')
+    # El selector de rofi: el modo interactivo y el daemon, que lo abre con 'pick'.
+    if not args or '--daemon' in args:
+        commands.append('rofi')
+        # Sin Pillow las miniaturas se generan con 'convert'.
+        if utils.load_pillow() is None:
+            commands.append('convert')
+    return commands
 
 def print_help():
     """Imprime un mensaje de ayuda detallado."""
@@ -103,6 +467,17 @@ def print_help():
     print(f"  {script_name}                - Inicia en modo interactivo con rofi.")
     print(f"  {script_name} --auto         - Inicia el modo de rotación automática.")
     print(f"  {script_name} --set <ruta>   - Establece un fondo de pantalla específico.")
+    print(f"  {script_name} --daemon       - Inicia el daemon residente (con --auto, rotando desde el inicio).")
+    print(f"  {script_name} --next, --prev - Cambia al fondo siguiente/anterior (requiere el daemon).")
+    print(f"  {script_name} --pause, --resume - Pausa/reanuda la rotación del daemon.")
+    print(f"  {script_name} --status       - Muestra el estado del daemon.")
+    print(f"  {script_name} --reload       - Hace que el daemon vuelva a leer config.ini.")
+    print(f"  {script_name} --warm-palettes - Precalcula las paletas de pywal de toda la biblioteca.")
+    print(f"  {script_name} --output <salida> - Limita --set, --next, --prev y el modo interactivo a una salida.")
+    print(f"  {script_name} --gc-cache     - Borra de la caché las entradas de imágenes que ya no existen.")
+    print(f"  {script_name} --set-by-color <#rrggbb> - Establece la imagen cuyo color dominante está más cerca.")
+    print(f"  {script_name} --similar [bits] - Lista las imágenes casi idénticas al fondo actual.")
+    print(f"  {script_name} --profile[=table] - Mide cada fase y comando externo (líneas JSON en stderr o tabla resumen).")
     print(f"  {script_name} --quiet        - Suprime las notificaciones (solo con --set y --auto).")
     print(f"  {script_name} --persist      - Guarda el fondo actual o el modo automático para restaurar al inicio de Sway.")
     print(f"  {script_name} --disable-persist - Deshabilita la persistencia del fondo de pantalla.")
@@ -114,18 +489,8 @@ def print_help():
 def main():
     """Punto de entrada principal."""
     logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
-    utils.check_dependencies()
-    config = utils.get_config()
     args = sys.argv[1:]
 
-    if '--version' in args or '-v' in args:
-        print(f"sway-wallpaper-manager v{utils.VERSION}")
-        return
-
-    if '--disable-persist' in args:
-        utils.disable_persistence()
-        return
-
     quiet_mode = '--quiet' in args or '--no-notify' in args
     if quiet_mode:
         if '--quiet' in args:
@@ -137,31 +502,104 @@ def main():
     if persist_mode:
         args.remove('--persist')
 
-    if not args:
-        main_interactive(config, persist_mode=persist_mode)
-    elif args[0] in ['--help', '-h']:
+    profile_args = [arg for arg in args if arg == '--profile' or arg.startswith('--profile=')]
+    for arg in profile_args:
+        args.remove(arg)
+    if profile_args:
+        try:
+            profiling.enable(profile_args[-1].partition('=')[2] or 'json')
+        except ValueError as e:
+            logging.error(str(e))
+            return
+
+    output = None
+    if '--output' in args:
+        index = args.index('--output')
+        if index + 1 >= len(args):
+            logging.error("Falta el nombre de la salida tras '--output'.")
+            return
+        output = args[index + 1]
+        del args[index:index + 2]
+
+    # Las órdenes que no usan la configuración ni comandos externos terminan
+    # aquí, sin leer nada del disco.
+    if '--version' in args or '-v' in args:
+        print(f"sway-wallpaper-manager v{utils.VERSION}")
+        return
+
+    if args and args[0] in ['--help', '-h']:
         print_help()
+        return
+
+    if '--disable-persist' in args:
+        utils.disable_persistence()
+        return
+
+    # Con el daemon en marcha no hace falta comprobar dependencias, leer la
+    # configuración ni escanear la carpeta: se le envía la orden y listo.
+    if run_client(args, quiet_mode, persist_mode, output):
+        return
+
+    config = utils.get_config()
+    utils.check_dependencies(required_commands(args, config))
+
+    if '--daemon' in args:
+        daemon.run_daemon(
+            utils.get_config, utils.get_image_files, set_wallpapers, choose_with_rofi,
+            warm_palettes, prepare_wallpaper, auto='--auto' in args
+        )
+        return
+
+    if '--gc-cache' in args:
+        gc_cache()
+        return
+
+    if args and args[0] == '--similar':
+        try:
+            find_similar(config, output, similar_distance(args))
+        except ValueError as e:
+            logging.error(str(e))
+        return
+
+    if '--warm-palettes' in args:
+        # Sin daemon se calcula aquí mismo, con prioridad baja.
+        os.nice(10)
+        warm_palettes(config)
+        return
+
+    if output is not None:
+        try:
+            select_outputs(config, output)
+        except ValueError as e:
+            logging.error(str(e))
+            return
+
+    if not args:
+        main_interactive(config, persist_mode=persist_mode, output=output)
     elif args[0] == '--auto':
-        wallpaper_setter = partial(set_wallpaper, quiet=quiet_mode)
-        automode.start_auto_mode(config, utils.get_image_files, wallpaper_setter)
+        wallpaper_setter = partial(set_wallpapers, quiet=quiet_mode)
+        automode.start_auto_mode(config, utils.get_image_files, wallpaper_setter, prepare_wallpaper)
         if persist_mode:
             utils.manage_persistence()
     elif args[0] == '--set' and len(args) > 1:
         image_path = Path(args[1]).expanduser()
-        supported_extensions = [ext.replace("*", "") for ext in utils.SUPPORTED_EXTENSIONS]
+        error_msg = utils.validate_image_path(image_path)
 
-        if not image_path.is_file():
-            error_msg = f"El archivo '{image_path}' no existe."
-            logging.error(error_msg)
-            utils.send_notification("Error", error_msg, "dialog-error")
-        elif image_path.suffix.lower() not in supported_extensions:
-            error_msg = f"Tipo de archivo no soportado: '{image_path.suffix}'. Use un formato de imagen válido."
+        if error_msg:
             logging.error(error_msg)
             utils.send_notification("Error", error_msg, "dialog-error")
         else:
-            set_wallpaper(image_path, config, quiet=quiet_mode)
+            set_wallpapers([(image_path, c) for c in select_outputs(config, output)], quiet=quiet_mode)
             if persist_mode:
                 utils.manage_persistence()
+    elif args[0] == '--set-by-color' and len(args) > 1:
+        try:
+            image_path = set_by_color(config, output, args[1], quiet=quiet_mode)
+        except ValueError as e:
+            logging.error(str(e))
+            return
+        if image_path is not None and persist_mode:
+            utils.manage_persistence()
     else:
         logging.error(f"Argumento no válido: '{args[0]}'. Usa '--help' para ver las opciones.")
 
@@ -0,0 +1,153 @@
+# -------------------------------------------------------------------
+# native_palette.py - Extractor de Paletas Nativo (NumPy)
+# -------------------------------------------------------------------
+# Alternativa a ejecutar 'wal': reduce la imagen, agrupa sus píxeles
+# con k-means vectorizado y escribe los mismos archivos que pywal
+# (colors.json, colors, sequences, wal, colors.Xresources y
+# colors-kitty.conf) para que las herramientas que los leen sigan
+# funcionando. Requiere numpy y Pillow; palette.py lo importa solo
+# cuando palette_backend = native.
+# -------------------------------------------------------------------
+
+import json
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+# Lado mayor (en píxeles) de la copia reducida que se analiza.
+SAMPLE_SIZE = 200
+COLOR_COUNT = 16
+MAX_ITERATIONS = 12
+
+def _load_pixels(image_path: Path) -> np.ndarray:
+    """Devuelve los píxeles RGB de una copia reducida de la imagen como (N, 3) float32."""
+    with Image.open(image_path) as img:
+        # draft() permite a JPEG decodificar directamente a escala reducida.
+        img.draft('RGB', (SAMPLE_SIZE, SAMPLE_SIZE))
+        img = img.convert('RGB')
+        img.thumbnail((SAMPLE_SIZE, SAMPLE_SIZE), Image.Resampling.BILINEAR)
+        return np.asarray(img, dtype=np.float32).reshape(-1, 3)
+
+def _luminance(rgb: np.ndarray) -> np.ndarray:
+    return rgb @ np.array([0.2126, 0.7152, 0.0722], dtype=np.float32)
+
+def kmeans(pixels: np.ndarray, count: int = COLOR_COUNT, iterations: int = MAX_ITERATIONS) -> np.ndarray:
+    """
+    K-means determinista: los centroides iniciales son cuantiles de
+    luminancia, así la misma imagen produce siempre la misma paleta.
+    Devuelve los centroides ordenados de oscuro a claro.
+    """
+    order = np.argsort(_luminance(pixels), kind='stable')
+    centroids = pixels[order[np.linspace(0, len(pixels) - 1, count).astype(int)]]
+    pixel_norms = (pixels ** 2).sum(axis=1)[:, None]
+
+    for _ in range(iterations):
+        distances = pixel_norms - 2 * pixels @ centroids.T + (centroids ** 2).sum(axis=1)[None, :]
+        labels = distances.argmin(axis=1)
+        counts = np.bincount(labels, minlength=count)
+        sums = np.stack(
+            [np.bincount(labels, weights=pixels[:, c], minlength=count) for c in range(3)], axis=1
+        )
+        # Un grupo vacío conserva su centroide anterior.
+        updated = np.where(counts[:, None] > 0, sums / np.maximum(counts, 1)[:, None], centroids)
+        converged = np.abs(updated - centroids).max() < 0.5
+        centroids = updated.astype(np.float32)
+        if converged:
+            break
+
+    return centroids[np.argsort(_luminance(centroids), kind='stable')]
+
+def _to_hex(rgb) -> str:
+    return '#{:02x}{:02x}{:02x}'.format(*(int(c) for c in rgb))
+
+def _darken(rgb, amount: float) -> list[int]:
+    return [int(c * (1 - amount)) for c in rgb]
+
+def _lighten(rgb, amount: float) -> list[int]:
+    return [int(c + (255 - c) * amount) for c in rgb]
+
+def adjust(centroids: np.ndarray) -> list[str]:
+    """
+    Convierte 16 colores ordenados en la paleta de terminal con el mismo
+    ajuste que el backend por defecto de pywal (tema oscuro).
+    """
+    cols = [[int(round(c)) for c in rgb] for rgb in np.clip(centroids, 0, 255)]
+    raw = cols[:1] + cols[8:16] + cols[8:-1]
+    raw[0] = _darken(raw[0], 0.80)
+    raw[7] = _lighten(raw[0], 0.75)
+    raw[8] = _lighten(raw[0], 0.25)
+    raw[15] = raw[7]
+    return [_to_hex(rgb) for rgb in raw]
+
+def extract_colors(image_path: Path) -> list[str]:
+    """Devuelve los 16 colores de terminal de una imagen en formato '#rrggbb'."""
+    return adjust(kmeans(_load_pixels(image_path)))
+
+def create_sequences(colors: list[str]) -> str:
+    """Secuencias OSC equivalentes a las que genera pywal."""
+    background, foreground = colors[0], colors[15]
+    sequences = [f"\033]4;{i};{color}\033\\" for i, color in enumerate(colors)]
+    sequences += [
+        f"\033]10;{foreground}\033\\",
+        f"\033]11;{background}\033\\",
+        f"\033]12;{foreground}\033\\",
+        f"\033]13;{foreground}\033\\",
+        f"\033]17;{foreground}\033\\",
+        f"\033]19;{background}\033\\",
+        f"\033]4;232;{background}\033\\",
+        f"\033]4;256;{foreground}\033\\",
+        f"\033]4;257;{background}\033\\",
+        f"\033]708;{background}\033\\",
+    ]
+    return ''.join(sequences)
+
+def create_xresources(colors: list[str]) -> str:
+    """colors.Xresources, con las mismas claves que la plantilla de pywal."""
+    background, foreground = colors[0], colors[15]
+    lines = [
+        f"*foreground: {foreground}", f"*background: {background}",
+        f"*.foreground: {foreground}", f"*.background: {background}",
+        f"*cursorColor: {foreground}", f"*.cursorColor: {foreground}",
+    ]
+    for i, color in enumerate(colors):
+        lines += [f"*.color{i}: {color}", f"*color{i}: {color}"]
+    return '\n'.join(lines) + '\n'
+
+def create_kitty_conf(colors: list[str]) -> str:
+    """colors-kitty.conf, como la plantilla de pywal."""
+    background, foreground = colors[0], colors[15]
+    lines = [
+        f"foreground {foreground}", f"background {background}", f"cursor {foreground}",
+        f"active_tab_foreground {background}", f"active_tab_background {foreground}",
+        f"inactive_tab_foreground {foreground}", f"inactive_tab_background {background}",
+        f"active_border_color {foreground}", f"inactive_border_color {background}",
+        f"bell_border_color {colors[1]}",
+    ]
+    lines += [f"color{i} {color}" for i, color in enumerate(colors)]
+    return '\n'.join(lines) + '\n'
+
+def write_palette(image_path: Path, output_dir: Path) -> None:
+    """
+    Escribe colors.json, colors, sequences y wal en 'output_dir', y las
+    plantillas que recarga palette.py (colors.Xresources y colors-kitty.conf),
+    para que no se apliquen las de una ejecución anterior de wal.
+    """
+    colors = extract_colors(image_path)
+    scheme = {
+        'wallpaper': str(image_path),
+        'alpha': '100',
+        'special': {
+            'background': colors[0],
+            'foreground': colors[15],
+            'cursor': colors[15],
+        },
+        'colors': {f"color{i}": color for i, color in enumerate(colors)},
+    }
+    output_dir.mkdir(parents=True, exist_ok=True)
+    (output_dir / 'colors.json').write_text(json.dumps(scheme, indent=4) + '\n')
+    (output_dir / 'colors').write_text('\n'.join(colors) + '\n')
+    (output_dir / 'sequences').write_text(create_sequences(colors))
+    (output_dir / 'wal').write_text(str(image_path))
+    (output_dir / 'colors.Xresources').write_text(create_xresources(colors))
+    (output_dir / 'colors-kitty.conf').write_text(create_kitty_conf(colors))
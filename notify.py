@@ -0,0 +1,400 @@
+# -------------------------------------------------------------------
+# notify.py - Notificaciones de Escritorio por D-Bus
+# -------------------------------------------------------------------
+# En lugar de lanzar un 'notify-send' por mensaje, se llama
+# directamente a org.freedesktop.Notifications.Notify por el bus de
+# sesión, con una conexión que se abre una vez por proceso. Cada
+# notificación sustituye a la anterior (replaces_id), también entre
+# procesos: el último id se guarda en NOTIFICATION_ID_FILE, así que
+# varios '--set' seguidos no apilan avisos.
+#
+# Los mensajes los envía un hilo propio. De una ráfaga se envía el
+# primero enseguida y, de los que lleguen en los COALESCE_SECONDS
+# siguientes, solo el último. Al terminar el proceso se envía el que
+# quede pendiente. Sin bus de sesión o sin servidor de notificaciones
+# se recurre a 'notify-send'.
+#
+# Solo se implementa la parte del protocolo D-Bus que hace falta
+# (autenticación EXTERNAL sobre un socket Unix y los tipos básicos),
+# sin depender de bibliotecas externas. El bus se toma de
+# DBUS_SESSION_BUS_ADDRESS, por lo que se puede probar contra un
+# dbus-daemon propio con un servidor de notificaciones falso.
+# -------------------------------------------------------------------
+
+import os
+import atexit
+import socket
+import struct
+import logging
+import threading
+import subprocess
+from pathlib import Path
+from typing import NamedTuple
+from urllib.parse import unquote
+
+import profiling
+
+APP_NAME = 'sway-wallpaper-manager'
+NOTIFICATION_ID_FILE = Path(
+    os.environ.get('XDG_RUNTIME_DIR') or Path.home() / '.cache/sway-wallpaper-manager'
+) / 'sway-wallpaper-manager-notification-id'
+# Ventana en la que varias notificaciones seguidas se agrupan en una.
+COALESCE_SECONDS = 0.25
+# Tiempo máximo de espera a la respuesta del bus o del servidor.
+CALL_TIMEOUT_SECONDS = 2.0
+# Tiempo máximo que se espera al salir a que se envíe la pendiente.
+FLUSH_TIMEOUT_SECONDS = 2.0
+
+NOTIFICATIONS_NAME = 'org.freedesktop.Notifications'
+NOTIFICATIONS_PATH = '/org/freedesktop/Notifications'
+
+# Tipos de mensaje y códigos de los campos de cabecera de D-Bus.
+METHOD_CALL, METHOD_RETURN, ERROR, SIGNAL = 1, 2, 3, 4
+FIELD_PATH, FIELD_INTERFACE, FIELD_MEMBER, FIELD_ERROR_NAME = 1, 2, 3, 4
+FIELD_REPLY_SERIAL, FIELD_DESTINATION, FIELD_SENDER, FIELD_SIGNATURE = 5, 6, 7, 8
+_FIELD_TYPES = {
+    FIELD_PATH: 'o', FIELD_INTERFACE: 's', FIELD_MEMBER: 's', FIELD_ERROR_NAME: 's',
+    FIELD_REPLY_SERIAL: 'u', FIELD_DESTINATION: 's', FIELD_SENDER: 's', FIELD_SIGNATURE: 'g',
+}
+
+class DBusError(Exception):
+    """Error del bus o respuesta de error a una llamada."""
+
+class Message(NamedTuple):
+    type: int
+    serial: int
+    fields: dict[int, object]
+    body: bytes
+    endian: str
+
+    @property
+    def signature(self) -> str:
+        return self.fields.get(FIELD_SIGNATURE, '')
+
+class Writer:
+    """Serializa valores D-Bus (little-endian) con la alineación de cada tipo."""
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def align(self, alignment: int) -> None:
+        self.data += b'\0' * (-len(self.data) % alignment)
+
+    def byte(self, value: int) -> None:
+        self.data.append(value)
+
+    def uint32(self, value: int) -> None:
+        self.align(4)
+        self.data += struct.pack('<I', value)
+
+    def int32(self, value: int) -> None:
+        self.align(4)
+        self.data += struct.pack('<i', value)
+
+    def string(self, value: str) -> None:
+        encoded = value.encode()
+        self.uint32(len(encoded))
+        self.data += encoded + b'\0'
+
+    def signature(self, value: str) -> None:
+        encoded = value.encode()
+        self.byte(len(encoded))
+        self.data += encoded + b'\0'
+
+    def array(self, alignment: int, write_items=None) -> None:
+        """Array cuyos elementos escribe write_items(); la longitud se rellena después."""
+        self.uint32(0)
+        length_at = len(self.data) - 4
+        self.align(alignment)
+        start = len(self.data)
+        if write_items is not None:
+            write_items()
+        struct.pack_into('<I', self.data, length_at, len(self.data) - start)
+
+    def value(self, signature: str, value) -> None:
+        if signature in ('s', 'o'):
+            self.string(value)
+        elif signature == 'g':
+            self.signature(value)
+        elif signature == 'u':
+            self.uint32(value)
+        else:
+            raise DBusError(f"Tipo no soportado: '{signature}'")
+
+def _read_value(data: bytes, pos: int, signature: str, endian: str) -> tuple[object, int]:
+    """Lee un valor básico en 'pos' y devuelve (valor, posición siguiente)."""
+    if signature in ('s', 'o'):
+        pos += -pos % 4
+        (length,) = struct.unpack_from(endian + 'I', data, pos)
+        return data[pos + 4:pos + 4 + length].decode(), pos + 5 + length
+    if signature == 'g':
+        length = data[pos]
+        return data[pos + 1:pos + 1 + length].decode(), pos + 2 + length
+    if signature == 'u':
+        pos += -pos % 4
+        return struct.unpack_from(endian + 'I', data, pos)[0], pos + 4
+    raise DBusError(f"Tipo no soportado: '{signature}'")
+
+def read_body(message: Message, count: int | None = None) -> list:
+    """
+    Valores del cuerpo de un mensaje. Solo se leen tipos básicos (s, o, g,
+    u): con 'count' se leen solo los primeros, si detrás hay otros.
+    """
+    values, pos = [], 0
+    for signature in message.signature[:count]:
+        value, pos = _read_value(message.body, pos, signature, message.endian)
+        values.append(value)
+    return values
+
+def build_message(msg_type: int, serial: int, fields: dict[int, object], body: bytes = b'', flags: int = 0) -> bytes:
+    header = Writer()
+    # 'l' = little-endian; versión 1 del protocolo.
+    header.data += bytes([ord('l'), msg_type, flags, 1])
+    header.uint32(len(body))
+    header.uint32(serial)
+
+    def write_fields():
+        for code, value in fields.items():
+            header.align(8)
+            header.byte(code)
+            header.signature(_FIELD_TYPES[code])
+            header.value(_FIELD_TYPES[code], value)
+
+    header.array(8, write_fields)
+    header.align(8)
+    return bytes(header.data) + body
+
+def bus_address() -> str | bytes:
+    """Socket del bus de sesión (DBUS_SESSION_BUS_ADDRESS o $XDG_RUNTIME_DIR/bus)."""
+    address = os.environ.get('DBUS_SESSION_BUS_ADDRESS')
+    if not address:
+        runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+        if not runtime_dir:
+            raise DBusError("No hay bus de sesión (DBUS_SESSION_BUS_ADDRESS no está definida).")
+        return str(Path(runtime_dir) / 'bus')
+    for entry in address.split(';'):
+        transport, _, params = entry.partition(':')
+        if transport != 'unix':
+            continue
+        values = dict(param.split('=', 1) for param in params.split(',') if '=' in param)
+        if 'path' in values:
+            return unquote(values['path'])
+        if 'abstract' in values:
+            return b'\0' + unquote(values['abstract']).encode()
+    raise DBusError(f"Dirección del bus no soportada: '{address}'")
+
+class SessionBus:
+    """Conexión al bus de sesión: autenticación, Hello y llamadas con respuesta."""
+
+    def __init__(self, address: str | bytes | None = None, timeout: float = CALL_TIMEOUT_SECONDS):
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.settimeout(timeout)
+        self._buffer = bytearray()
+        self._serial = 0
+        try:
+            self._sock.connect(address if address is not None else bus_address())
+            self._authenticate()
+            (self.unique_name,) = read_body(self.call(
+                'org.freedesktop.DBus', '/org/freedesktop/DBus', 'org.freedesktop.DBus', 'Hello'
+            ))
+        except BaseException:
+            self._sock.close()
+            raise
+
+    def close(self) -> None:
+        self._sock.close()
+
+    def _authenticate(self) -> None:
+        uid = str(os.getuid()).encode().hex()
+        self._sock.sendall(b'\0AUTH EXTERNAL ' + uid.encode() + b'\r\n')
+        line = self._read_line()
+        if not line.startswith(b'OK '):
+            raise DBusError(f"El bus rechazó la autenticación: {line.decode(errors='replace')}")
+        self._sock.sendall(b'BEGIN\r\n')
+
+    def _recv(self) -> None:
+        chunk = self._sock.recv(65536)
+        if not chunk:
+            raise DBusError("El bus cerró la conexión.")
+        self._buffer += chunk
+
+    def _read_line(self) -> bytes:
+        while b'\r\n' not in self._buffer:
+            self._recv()
+        line, _, rest = bytes(self._buffer).partition(b'\r\n')
+        self._buffer = bytearray(rest)
+        return line
+
+    def _read_exactly(self, size: int) -> bytes:
+        while len(self._buffer) < size:
+            self._recv()
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def read_message(self) -> Message:
+        fixed = self._read_exactly(16)
+        endian = '<' if fixed[0] == ord('l') else '>'
+        body_length, serial, fields_length = struct.unpack(endian + 'III', fixed[4:16])
+        # La cabecera ocupa un múltiplo de 8 bytes; los 16 primeros ya están leídos.
+        raw_fields = self._read_exactly(fields_length + (-fields_length % 8))
+        body = self._read_exactly(body_length)
+        fields, pos = {}, 0
+        while pos < fields_length:
+            pos += -pos % 8
+            code = raw_fields[pos]
+            signature, pos = _read_value(raw_fields, pos + 1, 'g', endian)
+            fields[code], pos = _read_value(raw_fields, pos, signature, endian)
+        return Message(fixed[1], serial, fields, body, endian)
+
+    def send(self, msg_type: int, fields: dict[int, object], body: bytes = b'') -> int:
+        self._serial += 1
+        self._sock.sendall(build_message(msg_type, self._serial, fields, body))
+        return self._serial
+
+    def call(
+        self, destination: str, path: str, interface: str, member: str, signature: str = '', body: bytes = b''
+    ) -> Message:
+        """Llama a un método y espera su respuesta (se descartan las señales que lleguen entre medias)."""
+        fields = {
+            FIELD_PATH: path, FIELD_INTERFACE: interface, FIELD_MEMBER: member, FIELD_DESTINATION: destination,
+        }
+        if signature:
+            fields[FIELD_SIGNATURE] = signature
+        serial = self.send(METHOD_CALL, fields, body)
+        while True:
+            message = self.read_message()
+            if message.fields.get(FIELD_REPLY_SERIAL) != serial:
+                continue
+            if message.type == ERROR:
+                detail = read_body(message)[0] if message.signature.startswith('s') else ''
+                raise DBusError(f"{message.fields.get(FIELD_ERROR_NAME)}: {detail}")
+            return message
+
+    def reply(self, call: Message, signature: str = '', body: bytes = b'') -> None:
+        """Responde a una llamada recibida (para servidores)."""
+        fields = {FIELD_REPLY_SERIAL: call.serial, FIELD_DESTINATION: call.fields[FIELD_SENDER]}
+        if signature:
+            fields[FIELD_SIGNATURE] = signature
+        self.send(METHOD_RETURN, fields, body)
+
+    def notify(self, title: str, message: str, icon: str, replaces_id: int = 0) -> int:
+        """Muestra (o sustituye) una notificación y devuelve su id."""
+        body = Writer()
+        body.string(APP_NAME)
+        body.uint32(replaces_id)
+        body.string(icon)
+        body.string(title)
+        body.string(message)
+        body.array(4)   # actions: as
+        body.array(8)   # hints: a{sv}
+        body.int32(-1)  # expire_timeout: el del servidor
+        reply = self.call(
+            NOTIFICATIONS_NAME, NOTIFICATIONS_PATH, NOTIFICATIONS_NAME, 'Notify', 'susssasa{sv}i', bytes(body.data)
+        )
+        if reply.signature != 'u':
+            raise DBusError(f"Respuesta inesperada de Notify: '{reply.signature}'")
+        return read_body(reply)[0]
+
+def _read_notification_id() -> int:
+    try:
+        return int(NOTIFICATION_ID_FILE.read_text())
+    except (OSError, ValueError):
+        return 0
+
+def _write_notification_id(notification_id: int) -> None:
+    try:
+        NOTIFICATION_ID_FILE.parent.mkdir(parents=True, exist_ok=True)
+        NOTIFICATION_ID_FILE.write_text(str(notification_id))
+    except OSError as e:
+        logging.debug(f"No se pudo guardar el id de la notificación: {e}")
+
+def notify_send(title: str, message: str, icon: str) -> None:
+    """Envía la notificación lanzando 'notify-send' (sin D-Bus)."""
+    try:
+        with profiling.span('cmd:notify-send', background=True):
+            subprocess.Popen(['notify-send', title, message, '-i', icon])
+    except FileNotFoundError:
+        logging.warning(f"El comando 'notify-send' no se encontró. Notificación: {title} - {message}")
+
+class Notifier:
+    """
+    Envía las notificaciones desde un hilo propio por una conexión D-Bus
+    persistente, agrupando las ráfagas y sustituyendo siempre la anterior.
+    """
+
+    def __init__(self, connect_func=SessionBus, fallback_func=notify_send):
+        self.connect_func = connect_func
+        self.fallback_func = fallback_func
+        self._bus = None
+        self._replaces_id = None
+        self._pending = None
+        self._closing = False
+        self._thread = None
+        self._condition = threading.Condition()
+        self._registered = False
+
+    def notify(self, title: str, message: str, icon: str) -> None:
+        """Encola una notificación; si ya había una pendiente, la sustituye."""
+        with self._condition:
+            self._pending = (title, message, icon)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='notify', daemon=True)
+                self._thread.start()
+                if not self._registered:
+                    atexit.register(self.flush)
+                    self._registered = True
+            self._condition.notify()
+
+    def flush(self, timeout: float = FLUSH_TIMEOUT_SECONDS) -> None:
+        """Envía la notificación pendiente sin esperar a la ventana y termina el hilo."""
+        with self._condition:
+            self._closing = True
+            self._condition.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        with self._condition:
+            # Si se vuelve a notificar después, se agrupa como siempre.
+            if thread is None or not thread.is_alive():
+                self._closing = False
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending is not None or self._closing)
+                if self._pending is None:
+                    return
+                pending, self._pending = self._pending, None
+            self._send(*pending)
+            # Lo que llegue durante la ventana se queda en _pending y solo se
+            # envía el último.
+            with self._condition:
+                self._condition.wait_for(lambda: self._closing, timeout=COALESCE_SECONDS)
+
+    def _send(self, title: str, message: str, icon: str) -> None:
+        with profiling.span('notify') as span:
+            if self._replaces_id is None:
+                self._replaces_id = _read_notification_id()
+            # Si la conexión que ya estaba abierta se ha roto, se reintenta con una nueva.
+            for _ in range(2 if self._bus is not None else 1):
+                try:
+                    if self._bus is None:
+                        self._bus = self.connect_func()
+                    self._replaces_id = self._bus.notify(title, message, icon, self._replaces_id)
+                except (OSError, DBusError) as e:
+                    logging.debug(f"No se pudo notificar por D-Bus: {e}")
+                    if self._bus is not None:
+                        self._bus.close()
+                        self._bus = None
+                    continue
+                span['backend'] = 'dbus'
+                _write_notification_id(self._replaces_id)
+                return
+            span['backend'] = 'notify-send'
+        self.fallback_func(title, message, icon)
+
+_notifier = Notifier()
+
+def send_notification(title: str, message: str, icon: str = "dialog-information") -> None:
+    _notifier.notify(title, message, icon)
@@ -0,0 +1,281 @@
+# -------------------------------------------------------------------
+# palette.py - Caché de Paletas de pywal
+# -------------------------------------------------------------------
+# Guarda los archivos que genera 'wal' (colors.json, colors,
+# sequences, plantillas...) en una caché indexada por el hash del
+# contenido de la imagen. Si la paleta ya existe se restauran los
+# archivos en ~/.cache/wal, se envían las secuencias a las terminales
+# y se recargan los mismos programas que recarga 'wal' (xrdb, i3,
+# bspwm, kitty, sway y polybar) sin volver a ejecutarlo. Con
+# palette_backend = native la paleta se calcula dentro del proceso
+# (ver native_palette.py).
+# -------------------------------------------------------------------
+
+import os
+import glob
+import shutil
+import sqlite3
+import subprocess
+import logging
+import tempfile
+import threading
+from pathlib import Path
+from functools import lru_cache, partial
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import utils
+import library
+import profiling
+
+WAL_CACHE_DIR = Path(os.environ.get('PYWAL_CACHE_DIR', Path.home() / '.cache/wal'))
+PALETTE_CACHE_DIR = Path.home() / '.cache/sway-wallpaper-manager/palettes'
+# Archivo dentro de cada entrada con la ruta de la imagen original, para
+# poder sustituirla en colors.json y las plantillas al restaurar.
+SOURCE_FILE = '.source'
+PALETTE_BACKENDS = ('wal', 'native')
+
+# Hilo único para las paletas de las salidas secundarias, que no bloquean
+# el cambio de fondo. Se crea al usarse por primera vez.
+_background_executor = None
+_background_lock = threading.Lock()
+
+@lru_cache(maxsize=None)
+def _load_native():
+    """Importa el backend nativo solo cuando se usa (numpy tarda en cargar)."""
+    try:
+        import native_palette
+    except ImportError as e:
+        logging.warning(f"El backend de paletas 'native' requiere numpy y Pillow ({e}). Se usará 'wal'.")
+        return None
+    return native_palette
+
+def get_palette_backend(config) -> str:
+    """Devuelve el backend de paletas configurado, o 'wal' si no está disponible."""
+    backend = config.get('palette_backend', 'wal').lower()
+    if backend not in PALETTE_BACKENDS:
+        logging.warning(f"Backend de paletas no válido: '{backend}'. Se usará 'wal'.")
+        return 'wal'
+    if backend == 'native' and _load_native() is None:
+        return 'wal'
+    return backend
+
+def _entry_dir(image_hash: str, backend: str) -> Path:
+    name = image_hash if backend == 'wal' else f"{image_hash}-{backend}"
+    return PALETTE_CACHE_DIR / name
+
+def _image_hash(image_path: Path) -> str | None:
+    try:
+        conn = library.connect()
+        try:
+            return library.content_hash(conn, image_path)
+        finally:
+            conn.close()
+    except (OSError, sqlite3.Error) as e:
+        logging.warning(f"No se pudo calcular el hash de '{image_path.name}': {e}")
+        return None
+
+def _snapshot(source_dir: Path, entry_dir: Path, image_path: Path) -> None:
+    """Copia los archivos generados por wal a la caché de forma atómica."""
+    if not (source_dir / 'colors.json').exists():
+        logging.warning(f"wal no generó 'colors.json' en '{source_dir}'; la paleta no se guarda.")
+        return
+    entry_dir.parent.mkdir(parents=True, exist_ok=True)
+    tmp_dir = Path(tempfile.mkdtemp(prefix='.tmp-', dir=entry_dir.parent))
+    try:
+        for item in source_dir.iterdir():
+            if item.is_file():
+                shutil.copy2(item, tmp_dir / item.name)
+        (tmp_dir / SOURCE_FILE).write_text(str(image_path))
+        tmp_dir.rename(entry_dir)
+    except OSError as e:
+        # Otro proceso pudo crear la misma entrada a la vez; cualquiera vale.
+        if not entry_dir.is_dir():
+            logging.warning(f"No se pudo guardar la paleta en caché: {e}")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+def _restore(entry_dir: Path, image_path: Path) -> None:
+    """
+    Copia una paleta cacheada a ~/.cache/wal y aplica sus secuencias. Los
+    archivos de ~/.cache/wal que la entrada no tiene (plantillas de una
+    ejecución anterior de wal) se borran, para no volver a aplicarlos
+    encima de la paleta nueva.
+    """
+    WAL_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    source_file = entry_dir / SOURCE_FILE
+    source_path = source_file.read_text() if source_file.exists() else str(image_path)
+    restored = set()
+    for item in entry_dir.iterdir():
+        if item.name == SOURCE_FILE or not item.is_file():
+            continue
+        restored.add(item.name)
+        data = item.read_bytes()
+        if source_path != str(image_path):
+            data = data.replace(source_path.encode(), str(image_path).encode())
+        tmp_path = WAL_CACHE_DIR / f".tmp-{os.getpid()}-{item.name}"
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, WAL_CACHE_DIR / item.name)
+
+    for item in WAL_CACHE_DIR.iterdir():
+        # Las temporales son de otros procesos que están restaurando a la vez.
+        if item.name not in restored and not item.name.startswith('.tmp-') and item.is_file():
+            item.unlink(missing_ok=True)
+
+    # Lo mismo que hace wal: escribir las secuencias en cada pseudo-terminal.
+    sequences = WAL_CACHE_DIR / 'sequences'
+    if sequences.exists():
+        data = sequences.read_bytes()
+        for term in glob.glob('/dev/pts/[0-9]*'):
+            try:
+                with open(term, 'wb') as f:
+                    f.write(data)
+            except OSError:
+                continue
+
+    _reload_programs(restored)
+
+def _process_names() -> set[str]:
+    """Nombres de los procesos en ejecución (lo que compara 'pidof', sin lanzarlo)."""
+    names = set()
+    for comm in glob.glob('/proc/[0-9]*/comm'):
+        try:
+            with open(comm) as f:
+                names.add(f.read().rstrip('\n'))
+        except OSError:
+            continue
+    return names
+
+def _reload_programs(restored: set[str]) -> None:
+    """
+    Los mismos pasos que 'wal' da tras aplicar una paleta (pywal/reload.py),
+    para que restaurarla desde la caché tenga el mismo efecto. Cada uno se
+    salta si falta el programa o, si usa una plantilla, si la paleta
+    restaurada ('restored', nombres de archivo) no la trae.
+    """
+    commands = utils.find_commands(['xrdb', 'i3-msg', 'bspc', 'kitty', 'swaymsg', 'polybar'])
+    running = _process_names()
+    quiet = {'stdout': subprocess.DEVNULL, 'stderr': subprocess.DEVNULL}
+
+    if os.environ.get('TERM') == 'linux' and 'colors-tty.sh' in restored:
+        utils.run_command(['sh', str(WAL_CACHE_DIR / 'colors-tty.sh')], background=True, **quiet)
+    if commands['xrdb'] and 'colors.Xresources' in restored:
+        subprocess.run(['xrdb', '-merge', '-quiet', str(WAL_CACHE_DIR / 'colors.Xresources')], check=False, **quiet)
+    if commands['i3-msg'] and 'i3' in running:
+        utils.run_command(['i3-msg', 'reload'], background=True, **quiet)
+    if commands['bspc'] and 'bspwm' in running:
+        utils.run_command(['bspc', 'wm', '-r'], background=True, **quiet)
+    if commands['kitty'] and os.environ.get('TERM') == 'xterm-kitty' and 'colors-kitty.conf' in restored:
+        subprocess.run(['kitty', '@', 'set-colors', '--all', str(WAL_CACHE_DIR / 'colors-kitty.conf')], check=False, **quiet)
+    if commands['swaymsg'] and 'sway' in running:
+        utils.run_command(['swaymsg', 'reload'], background=True, **quiet)
+    if commands['polybar'] and 'polybar' in running:
+        utils.run_command(['pkill', '-USR1', 'polybar'], background=True, **quiet)
+
+def _generate(image_path: Path, output_dir: Path, backend: str) -> bool:
+    """
+    Genera la paleta en 'output_dir' sin aplicarla. Con 'wal' se usa su propia
+    carpeta de caché (PYWAL_CACHE_DIR) y sin tocar terminales ni recargar
+    programas, para poder lanzar varios a la vez.
+    """
+    if backend == 'native':
+        try:
+            _load_native().write_palette(image_path, output_dir)
+            return True
+        except (OSError, ValueError) as e:
+            logging.warning(f"El backend nativo no pudo procesar '{image_path.name}': {e}")
+            return False
+
+    env = dict(os.environ, PYWAL_CACHE_DIR=str(output_dir))
+    wal_cmd = ['wal', '-i', str(image_path), '-n', '-s', '-t', '-e', '-q']
+    return utils.run_command(wal_cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL) is not None
+
+def apply_palette(image_path: Path, backend: str = 'wal') -> None:
+    """
+    Aplica la paleta de 'image_path'. Usa la caché si existe; si no, la genera
+    con el backend indicado y la guarda para la próxima vez.
+    """
+    image_hash = _image_hash(image_path)
+    entry_dir = _entry_dir(image_hash, backend) if image_hash else None
+
+    if entry_dir is not None and entry_dir.is_dir():
+        try:
+            _restore(entry_dir, image_path)
+            logging.info("Paleta restaurada desde la caché.")
+            return
+        except OSError as e:
+            logging.warning(f"No se pudo restaurar la paleta cacheada: {e}")
+
+    if backend == 'native':
+        PALETTE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        with tempfile.TemporaryDirectory(prefix='.native-', dir=PALETTE_CACHE_DIR) as output_dir:
+            if _generate(image_path, Path(output_dir), backend):
+                if entry_dir is not None:
+                    _snapshot(Path(output_dir), entry_dir, image_path)
+                _restore(Path(output_dir), image_path)
+                return
+        logging.warning("Se usará 'wal' para esta imagen.")
+
+    # wal se ejecuta tal cual para que además recargue los programas que
+    # soporta; luego se guarda en caché lo que dejó en ~/.cache/wal.
+    wal_cmd = ['wal', '-i', str(image_path), '-n', '-q']
+    if utils.run_command(wal_cmd) is not None and entry_dir is not None:
+        _snapshot(WAL_CACHE_DIR, _entry_dir(image_hash, 'wal'), image_path)
+
+def warm_palette(image_path: Path, backend: str = 'wal') -> bool:
+    """Calcula y guarda en caché la paleta de una imagen sin aplicarla."""
+    image_hash = _image_hash(image_path)
+    if image_hash is None:
+        return False
+    entry_dir = _entry_dir(image_hash, backend)
+    if entry_dir.is_dir():
+        return True
+
+    PALETTE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix='.warm-', dir=PALETTE_CACHE_DIR) as output_dir:
+        if not _generate(image_path, Path(output_dir), backend):
+            return False
+        _snapshot(Path(output_dir), entry_dir, image_path)
+    return True
+
+def warm_palette_in_background(image_path: Path, backend: str = 'wal') -> Future:
+    """Encola warm_palette en un hilo aparte y devuelve su Future."""
+    global _background_executor
+    with _background_lock:
+        if _background_executor is None:
+            _background_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='palette')
+        return _background_executor.submit(_warm_palette_profiled, image_path, backend)
+
+def _warm_palette_profiled(image_path: Path, backend: str) -> bool:
+    with profiling.span('palette.warm', backend=backend, image=image_path.name):
+        return warm_palette(image_path, backend)
+
+def warm_palettes(images: list[Path], max_workers: int, backend: str = 'wal') -> int:
+    """Precalcula las paletas de 'images' en paralelo. Devuelve cuántas hay en caché."""
+    logging.info(f"Precalculando paletas de {len(images)} imágenes ({max_workers} en paralelo)...")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        done = sum(executor.map(partial(warm_palette, backend=backend), images))
+    logging.info(f"Paletas en caché: {done}/{len(images)}")
+    return done
+
+def gc_palettes(live_hashes: set[str]) -> int:
+    """Borra las paletas de contenidos que ya no están en la biblioteca. Devuelve cuántas."""
+    if not PALETTE_CACHE_DIR.is_dir():
+        return 0
+    removed = 0
+    for entry in PALETTE_CACHE_DIR.iterdir():
+        # Las entradas son '<hash>' o '<hash>-<backend>'; las ocultas son temporales en uso.
+        if entry.name.startswith('.') or entry.name.split('-')[0] in live_hashes:
+            continue
+        shutil.rmtree(entry, ignore_errors=True)
+        removed += 1
+    return removed
+
+def get_palette_workers(config) -> int:
+    """Devuelve cuántas paletas se precalculan a la vez (0 = todos los núcleos)."""
+    try:
+        workers = int(config.get('palette_workers', 2))
+    except ValueError:
+        logging.warning("Valor no válido para 'palette_workers'. Se usarán 2.")
+        workers = 2
+    if workers < 1:
+        workers = os.cpu_count() or 1
+    return workers
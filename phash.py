@@ -0,0 +1,68 @@
+# -------------------------------------------------------------------
+# phash.py - Hash Perceptual de Imágenes (NumPy)
+# -------------------------------------------------------------------
+# Calcula el pHash de 64 bits de cada imagen: se reduce a 32x32 en
+# escala de grises, se toma la DCT y cada bit indica si uno de los
+# 8x8 coeficientes de baja frecuencia supera la mediana. Copias de la
+# misma imagen a otra resolución, recomprimidas o con un recorte leve
+# quedan a pocos bits de distancia.
+#
+# Las imágenes se decodifican en paralelo y la DCT se calcula por
+# lotes con productos de matrices. Requiere numpy y Pillow;
+# similarity.py lo importa solo cuando hay hashes por calcular.
+# -------------------------------------------------------------------
+
+import logging
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+# Lado de la imagen reducida y de la esquina de baja frecuencia que se usa.
+SAMPLE_SIZE = 32
+HASH_SIZE = 8
+BATCH_SIZE = 256
+
+def _dct_matrix(n: int) -> np.ndarray:
+    """Matriz de la DCT-II ortonormal: D @ x es la DCT de x."""
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.sqrt(2 / n) * np.cos(np.pi * (2 * i + 1) * k / (2 * n))
+    matrix[0] /= np.sqrt(2)
+    return matrix.astype(np.float32)
+
+_DCT = _dct_matrix(SAMPLE_SIZE)
+
+def _load_gray(image_path: Path) -> np.ndarray | None:
+    try:
+        with Image.open(image_path) as img:
+            # draft() permite a JPEG decodificar directamente a escala reducida.
+            img.draft('L', (SAMPLE_SIZE * 2, SAMPLE_SIZE * 2))
+            img = img.convert('L').resize((SAMPLE_SIZE, SAMPLE_SIZE), Image.Resampling.BOX)
+            return np.asarray(img, dtype=np.float32)
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        logging.warning(f"No se pudo calcular el hash perceptual de '{image_path.name}': {e}")
+        return None
+
+def hash_pixels(pixels: np.ndarray) -> np.ndarray:
+    """pHash de un lote de imágenes (N, 32, 32) en escala de grises. Devuelve (N,) uint64."""
+    coefficients = _DCT @ pixels @ _DCT.T
+    low = coefficients[:, :HASH_SIZE, :HASH_SIZE].reshape(len(pixels), -1)
+    # La componente continua (brillo medio) no entra en la mediana.
+    bits = low > np.median(low[:, 1:], axis=1)[:, None]
+    return np.packbits(bits, axis=1).view('>u8').ravel().astype(np.uint64)
+
+def hash_images(images: list[Path], max_workers: int) -> dict[Path, int]:
+    """pHash de cada imagen que se pueda leer, calculado por lotes."""
+    hashes = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for start in range(0, len(images), BATCH_SIZE):
+            batch = images[start:start + BATCH_SIZE]
+            loaded = [(path, pixels) for path, pixels in zip(batch, executor.map(_load_gray, batch))
+                      if pixels is not None]
+            if not loaded:
+                continue
+            values = hash_pixels(np.stack([pixels for _, pixels in loaded]))
+            hashes.update((path, int(value)) for (path, _), value in zip(loaded, values))
+    return hashes
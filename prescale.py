@@ -0,0 +1,249 @@
+# -------------------------------------------------------------------
+# prescale.py - Caché de Fondos Reescalados a cada Salida
+# -------------------------------------------------------------------
+# swaybg decodifica y mantiene en memoria la imagen original aunque
+# la salida sea mucho más pequeña. Aquí se guardan copias ya
+# recortadas y reescaladas a la resolución y el modo de cada salida,
+# y set_wallpaper le pasa a swaybg esa copia. Como la de miniaturas,
+# la caché tiene un tamaño máximo (prescale_cache_mb) y al superarlo
+# se borran las copias que hace más tiempo que no se usan.
+#
+# La geometría de las salidas se pide a Sway por su socket IPC
+# ($SWAYSOCK) o con 'swaymsg -t get_outputs'. Para pruebas se puede
+# indicar un JSON equivalente en SWAY_WALLPAPER_OUTPUTS_JSON.
+# -------------------------------------------------------------------
+
+import os
+import json
+import time
+import socket
+import struct
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+
+import utils
+import library
+import profiling
+
+SCALED_CACHE_DIR = Path.home() / '.cache/sway-wallpaper-manager/scaled'
+OUTPUTS_JSON_ENV = 'SWAY_WALLPAPER_OUTPUTS_JSON'
+# Modos de swaybg para los que tiene sentido reescalar. 'tile' repite la
+# imagen a su tamaño original, así que se deja tal cual.
+SCALABLE_MODES = {'fill', 'fit', 'stretch', 'center'}
+
+_IPC_MAGIC = b'i3-ipc'
+_IPC_GET_OUTPUTS = 3
+
+def _outputs_from_ipc(sock_path: str) -> list[dict]:
+    """Consulta GET_OUTPUTS directamente en el socket IPC de Sway."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(2)
+        sock.connect(sock_path)
+        sock.sendall(_IPC_MAGIC + struct.pack('=II', 0, _IPC_GET_OUTPUTS))
+        header = b''
+        while len(header) < 14:
+            chunk = sock.recv(14 - len(header))
+            if not chunk:
+                raise OSError("Respuesta IPC incompleta")
+            header += chunk
+        length, _ = struct.unpack('=II', header[6:])
+        payload = b''
+        while len(payload) < length:
+            chunk = sock.recv(length - len(payload))
+            if not chunk:
+                raise OSError("Respuesta IPC incompleta")
+            payload += chunk
+    return json.loads(payload)
+
+def get_outputs() -> list[dict]:
+    """Devuelve las salidas activas como dicts con 'name', 'width' y 'height' en píxeles físicos."""
+    try:
+        if os.environ.get(OUTPUTS_JSON_ENV):
+            raw = json.loads(Path(os.environ[OUTPUTS_JSON_ENV]).read_text())
+        elif os.environ.get('SWAYSOCK'):
+            raw = _outputs_from_ipc(os.environ['SWAYSOCK'])
+        else:
+            result = utils.run_command(['swaymsg', '-r', '-t', 'get_outputs'], capture_output=True, text=True)
+            raw = json.loads(result.stdout) if result else []
+    except (OSError, ValueError) as e:
+        logging.warning(f"No se pudo obtener la geometría de las salidas: {e}")
+        return []
+
+    outputs = []
+    for output in raw:
+        mode = output.get('current_mode') or {}
+        if not output.get('active', True) or not mode.get('width'):
+            continue
+        width, height = mode['width'], mode['height']
+        if output.get('transform') in ('90', '270', 'flipped-90', 'flipped-270'):
+            width, height = height, width
+        outputs.append({'name': output['name'], 'width': width, 'height': height})
+    return outputs
+
+def target_size(output: str, outputs: list[dict]) -> tuple[int, int] | None:
+    """
+    Resolución a la que reescalar para 'output'. Con '*' solo se reescala si
+    todas las salidas activas comparten resolución.
+    """
+    if output == '*':
+        sizes = {(o['width'], o['height']) for o in outputs}
+        return sizes.pop() if len(sizes) == 1 else None
+    for o in outputs:
+        if o['name'] == output:
+            return (o['width'], o['height'])
+    return None
+
+def _scale_with_pillow(image_path: Path, output_path: Path, size: tuple[int, int], mode: str) -> bool:
+    pillow = utils.load_pillow()
+    if pillow is None or image_path.suffix.lower() in utils.CONVERT_ONLY_EXTENSIONS:
+        return False
+    Image, ImageOps = pillow
+    width, height = size
+    try:
+        with Image.open(image_path) as img:
+            img.draft('RGB', size)
+            img = ImageOps.exif_transpose(img)
+            if mode == 'fill':
+                scale = max(width / img.width, height / img.height)
+                crop_w, crop_h = width / scale, height / scale
+                left, top = (img.width - crop_w) / 2, (img.height - crop_h) / 2
+                result = img.resize(size, Image.Resampling.LANCZOS,
+                                    box=(left, top, left + crop_w, top + crop_h), reducing_gap=3.0)
+            elif mode == 'fit':
+                scale = min(width / img.width, height / img.height)
+                new_size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+                result = img.resize(new_size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+            elif mode == 'stretch':
+                result = img.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+            else:  # center: sin escalar, solo se recorta lo que no se verá
+                left = max(0, (img.width - width) // 2)
+                top = max(0, (img.height - height) // 2)
+                result = img.crop((left, top, left + min(width, img.width), top + min(height, img.height)))
+            if output_path.suffix == '.jpg' and result.mode != 'RGB':
+                result = result.convert('RGB')
+            result.save(output_path, quality=95)
+        return True
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        logging.warning(f"Pillow no pudo reescalar '{image_path.name}': {e}")
+        output_path.unlink(missing_ok=True)
+        return False
+
+def _scale_with_convert(image_path: Path, output_path: Path, size: tuple[int, int], mode: str) -> bool:
+    geometry = f"{size[0]}x{size[1]}"
+    options = {
+        'fill': ['-resize', geometry + '^', '-gravity', 'center', '-extent', geometry],
+        'fit': ['-resize', geometry],
+        'stretch': ['-resize', geometry + '!'],
+        'center': ['-gravity', 'center', '-crop', geometry + '+0+0', '+repage'],
+    }[mode]
+    command = ['convert', str(image_path) + '[0]', '-auto-orient', *options, '-quality', '95', str(output_path)]
+    return utils.run_command(command) is not None
+
+def _needs_scaling(image_path: Path, size: tuple[int, int], mode: str) -> bool:
+    """Solo merece la pena si la imagen es mayor que la salida (swaybg ya amplía)."""
+    pillow = utils.load_pillow()
+    if pillow is None:
+        return True
+    try:
+        with pillow[0].open(image_path) as img:
+            width, height = img.size
+    except (OSError, ValueError):
+        return True  # Formato que Pillow no lee; que decida 'convert'.
+    return width > size[0] or height > size[1]
+
+def get_prescale_cache_bytes(config) -> int:
+    """Tamaño máximo de la caché de copias reescaladas en bytes (0 = sin límite)."""
+    try:
+        megabytes = int(config.get('prescale_cache_mb', utils.PRESCALE_CACHE_MB))
+    except ValueError:
+        logging.warning(f"Valor no válido para 'prescale_cache_mb'. Se usarán {utils.PRESCALE_CACHE_MB} MB.")
+        megabytes = utils.PRESCALE_CACHE_MB
+    return max(0, megabytes) * 1024 * 1024
+
+def get_scaled(
+    image_path: Path, output: str, mode: str, outputs: list[dict] | None = None, max_cache_bytes: int = 0
+) -> Path:
+    """
+    Devuelve una copia de 'image_path' adaptada a 'output' y 'mode',
+    generándola si no existe. Si no se puede o no compensa, devuelve la
+    imagen original. Si la caché supera 'max_cache_bytes', borra las copias
+    que hace más tiempo que no se usan (nunca la que se acaba de pedir).
+    """
+    started = time.time()
+    if mode not in SCALABLE_MODES:
+        return image_path
+    if outputs is None:
+        with profiling.span('outputs'):
+            outputs = get_outputs()
+    size = target_size(output, outputs)
+    if size is None:
+        return image_path
+
+    try:
+        conn = library.connect()
+    except (OSError, sqlite3.Error) as e:
+        logging.warning(f"No se pudo abrir el índice de la biblioteca: {e}")
+        return image_path
+    try:
+        try:
+            image_hash = library.content_hash(conn, image_path)
+        except (OSError, sqlite3.Error) as e:
+            logging.warning(f"No se pudo calcular el hash de '{image_path.name}': {e}")
+            return image_path
+        scaled_path = _get_scaled(image_path, image_hash, size, mode)
+        if scaled_path != image_path:
+            _record_use(conn, scaled_path, image_hash, started, max_cache_bytes)
+        return scaled_path
+    finally:
+        conn.close()
+
+def _get_scaled(image_path: Path, image_hash: str, size: tuple[int, int], mode: str) -> Path:
+    # JPEG para fotos (mucho más pequeño); PNG si la original puede tener transparencia.
+    suffix = '.jpg' if image_path.suffix.lower() in ('.jpg', '.jpeg') else '.png'
+    scaled_path = SCALED_CACHE_DIR / f"{image_hash}-{size[0]}x{size[1]}-{mode}{suffix}"
+    # La copia en caché se comprueba antes de abrir la imagen, para que un
+    # fondo ya usado no tenga que cargar Pillow.
+    if scaled_path.exists():
+        return scaled_path
+    if not _needs_scaling(image_path, size, mode):
+        return image_path
+
+    SCALED_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    # El nombre temporal incluye el hilo: el de precarga y el que aplica el
+    # fondo pueden estar generando la misma copia a la vez.
+    tmp_path = scaled_path.with_name(f".tmp-{os.getpid()}-{threading.get_ident()}-{scaled_path.name}")
+    if _scale_with_pillow(image_path, tmp_path, size, mode) or _scale_with_convert(image_path, tmp_path, size, mode):
+        if tmp_path.exists():
+            os.replace(tmp_path, scaled_path)
+            return scaled_path
+    tmp_path.unlink(missing_ok=True)
+    return image_path
+
+def _record_use(conn: sqlite3.Connection, scaled_path: Path, image_hash: str, now: float, max_cache_bytes: int) -> None:
+    """Actualiza el orden LRU de la caché de copias reescaladas y aplica el límite de tamaño."""
+    evicted = []
+    try:
+        library.touch_scaled(conn, [(str(scaled_path), image_hash, scaled_path.stat().st_size)], now)
+        if max_cache_bytes:
+            evicted = library.evict_scaled(conn, max_cache_bytes, now)
+    except (OSError, sqlite3.Error) as e:
+        logging.warning(f"No se pudo actualizar el registro de copias reescaladas: {e}")
+    for path in evicted:
+        path.unlink(missing_ok=True)
+    if evicted:
+        logging.info(f"Caché de copias reescaladas llena: se eliminaron {len(evicted)} copias antiguas.")
+
+def gc_scaled(conn: sqlite3.Connection, live_hashes: set[str]) -> int:
+    """Borra las copias reescaladas de contenidos que ya no están en la biblioteca. Devuelve cuántas."""
+    if not SCALED_CACHE_DIR.is_dir():
+        return 0
+    removed = []
+    for entry in SCALED_CACHE_DIR.iterdir():
+        if entry.name.startswith('.') or entry.name.split('-')[0] in live_hashes:
+            continue
+        entry.unlink(missing_ok=True)
+        removed.append(str(entry))
+    library.forget_scaled(conn, removed)
+    return len(removed)
@@ -0,0 +1,142 @@
+# -------------------------------------------------------------------
+# profiling.py - Medición de Tiempos por Fase
+# -------------------------------------------------------------------
+# span() mide lo que tarda cada fase (escaneo, miniaturas, rofi,
+# swaybg, wal, notificación...) y run_command mide cada comando
+# externo con su código de salida. Con --profile cada medida se
+# escribe como una línea JSON en stderr; con --profile=table se
+# imprime un resumen por fase al terminar. Sin --profile, span() solo
+# cuesta una comprobación.
+#
+# LatencyTracker guarda los últimos tiempos de cambio de fondo del
+# modo automático para consultar sus percentiles (--status).
+# -------------------------------------------------------------------
+
+import sys
+import json
+import math
+import time
+import atexit
+import threading
+import contextlib
+from collections import deque
+
+PROFILE_MODES = ('json', 'table')
+
+_mode = None
+_stream = sys.stderr
+_lock = threading.Lock()
+_local = threading.local()
+# Para --profile=table: nombre de la fase -> [duraciones, errores]
+_totals: dict[str, list] = {}
+
+def enable(mode: str = 'json', stream=None) -> None:
+    """Activa el perfilado en modo 'json' (una línea por medida) o 'table' (resumen al salir)."""
+    global _mode, _stream
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Modo de perfilado no válido: '{mode}'. Opciones: {', '.join(PROFILE_MODES)}.")
+    _mode = mode
+    if stream is not None:
+        _stream = stream
+    if mode == 'table':
+        atexit.register(print_summary)
+
+def enabled() -> bool:
+    return _mode is not None
+
+@contextlib.contextmanager
+def span(name: str, **attrs):
+    """
+    Mide el bloque 'with'. Devuelve el dict de atributos para que el bloque
+    pueda añadir datos (p. ej. el código de salida de un comando).
+    """
+    if _mode is None:
+        yield attrs
+        return
+    stack = _local.__dict__.setdefault('stack', [])
+    parent = stack[-1] if stack else None
+    stack.append(name)
+    started_at = time.time()
+    start = time.perf_counter()
+    try:
+        yield attrs
+    except BaseException as e:
+        attrs.setdefault('error', type(e).__name__)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        stack.pop()
+        _emit(name, started_at, elapsed, parent, len(stack), attrs)
+
+def _emit(name: str, started_at: float, elapsed: float, parent: str | None, depth: int, attrs: dict) -> None:
+    failed = 'error' in attrs or attrs.get('exit') not in (None, 0)
+    with _lock:
+        if _mode == 'table':
+            entry = _totals.setdefault(name, [[], 0])
+            entry[0].append(elapsed)
+            entry[1] += failed
+            return
+        record = {
+            'span': name,
+            'start': round(started_at, 6),
+            'ms': round(elapsed * 1000, 3),
+            'parent': parent,
+            'depth': depth,
+            'thread': threading.current_thread().name,
+            **attrs,
+        }
+        _stream.write(json.dumps(record, default=str) + '\n')
+        _stream.flush()
+
+def print_summary() -> None:
+    """Imprime el resumen de --profile=table, de la fase más costosa a la menos."""
+    with _lock:
+        rows = sorted(_totals.items(), key=lambda item: sum(item[1][0]), reverse=True)
+    if not rows:
+        return
+    _stream.write(f"\n{'fase':28} {'n':>5} {'total ms':>10} {'media ms':>10} {'máx ms':>10} {'errores':>8}\n")
+    for name, (durations, errors) in rows:
+        total = sum(durations) * 1000
+        _stream.write(
+            f"{name:28} {len(durations):>5} {total:>10.1f} {total / len(durations):>10.1f} "
+            f"{max(durations) * 1000:>10.1f} {errors:>8}\n"
+        )
+    _stream.flush()
+
+class LatencyTracker:
+    """Últimas 'size' latencias y sus percentiles."""
+
+    def __init__(self, size: int = 256):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentiles(self) -> dict | None:
+        """p50, p90, p99 y máximo en milisegundos, o None si aún no hay muestras."""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+
+        def rank(p: float) -> float:
+            # Percentil por rango más cercano.
+            index = max(0, math.ceil(p * len(samples)) - 1)
+            return round(samples[index] * 1000, 1)
+
+        return {
+            'count': len(samples),
+            'p50_ms': rank(0.50),
+            'p90_ms': rank(0.90),
+            'p99_ms': rank(0.99),
+            'max_ms': round(samples[-1] * 1000, 1),
+        }
+
+    def describe(self) -> str:
+        stats = self.percentiles()
+        if stats is None:
+            return "sin cambios registrados"
+        return (f"p50 {stats['p50_ms']} ms, p90 {stats['p90_ms']} ms, p99 {stats['p99_ms']} ms, "
+                f"máx {stats['max_ms']} ms ({stats['count']} cambios)")
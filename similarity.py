@@ -0,0 +1,189 @@
+# -------------------------------------------------------------------
+# similarity.py - Índice de Imágenes Parecidas
+# -------------------------------------------------------------------
+# Asocia a cada imagen su hash perceptual (phash.py) y los organiza en
+# tablas por bloques para encontrar enseguida las que están a una
+# distancia de Hamming dada. Los hashes se guardan en el índice de la
+# biblioteca, junto a los datos de la caché de miniaturas, por hash de
+# contenido: solo se calculan una vez por imagen aunque se renombre o
+# se mueva.
+#
+# El modo automático lo usa para no mostrar seguidas copias casi
+# idénticas de un mismo fondo y '--similar' para listarlas.
+# -------------------------------------------------------------------
+
+import os
+import logging
+import sqlite3
+from pathlib import Path
+from functools import lru_cache
+from itertools import combinations
+
+import library
+import profiling
+
+# Distancia máxima (en bits, de 64) entre dos imágenes casi idénticas.
+DUPLICATE_DISTANCE = 10
+
+@lru_cache(maxsize=None)
+def _load_hasher():
+    """Importa phash solo cuando hay hashes por calcular (numpy tarda en cargar)."""
+    try:
+        import phash
+    except ImportError as e:
+        logging.warning(f"El índice de imágenes parecidas requiere numpy y Pillow ({e}).")
+        return None
+    return phash
+
+def get_duplicate_distance(config) -> int:
+    """Distancia de 'duplicate_distance' (0 = no se buscan imágenes parecidas)."""
+    try:
+        return max(0, min(64, int(config.get('duplicate_distance', DUPLICATE_DISTANCE))))
+    except ValueError:
+        logging.warning(f"Valor no válido para 'duplicate_distance'. Se usará {DUPLICATE_DISTANCE}.")
+        return DUPLICATE_DISTANCE
+
+@lru_cache(maxsize=None)
+def _flip_masks(bits: int) -> tuple[int, ...]:
+    """Máscaras de bloque con como mucho 'bits' bits a 1."""
+    return tuple(
+        sum(1 << position for position in positions)
+        for count in range(bits + 1)
+        for positions in combinations(range(HammingIndex.BLOCK_BITS), count)
+    )
+
+class HammingIndex:
+    """
+    Búsqueda por distancia de Hamming entre enteros de 64 bits con tablas
+    por bloques (multi-index hashing). Cada clave se parte en 4 bloques de
+    16 bits; si dos claves están a distancia <= r, al menos uno de sus
+    bloques está a <= r // 4. Solo se comparan enteras las claves de las
+    tablas que coinciden en algún bloque con los vecinos del buscado.
+    """
+
+    BLOCKS = 4
+    BLOCK_BITS = 16
+
+    def __init__(self):
+        self._items: dict[int, list] = {}
+        self._tables = [{} for _ in range(self.BLOCKS)]
+
+    def _blocks(self, key: int) -> list[int]:
+        block_mask = (1 << self.BLOCK_BITS) - 1
+        return [(key >> shift) & block_mask for shift in range(0, self.BLOCKS * self.BLOCK_BITS, self.BLOCK_BITS)]
+
+    def add(self, key: int, item) -> None:
+        items = self._items.get(key)
+        if items is not None:
+            items.append(item)
+            return
+        self._items[key] = [item]
+        for table, block in zip(self._tables, self._blocks(key)):
+            bucket = table.get(block)
+            if bucket is None:
+                table[block] = [key]
+            else:
+                bucket.append(key)
+
+    def search(self, key: int, radius: int) -> list[tuple[int, object]]:
+        """Elementos a distancia <= radius de 'key', como (distancia, elemento)."""
+        masks = _flip_masks(min(radius // self.BLOCKS, self.BLOCK_BITS))
+        candidates = set()
+        for table, block in zip(self._tables, self._blocks(key)):
+            for mask in masks:
+                bucket = table.get(block ^ mask)
+                if bucket:
+                    candidates.update(bucket)
+        found = []
+        for candidate in candidates:
+            distance = (key ^ candidate).bit_count()
+            if distance <= radius:
+                found.extend((distance, item) for item in self._items[candidate])
+        return found
+
+class SimilarityIndex:
+    """Hash perceptual de cada imagen de una lista, con búsqueda por distancia."""
+
+    def __init__(self, phashes: dict[Path, int]):
+        self._phashes = dict(phashes)
+        self._index = HammingIndex()
+        for path, value in self._phashes.items():
+            self._index.add(value, path)
+
+    def __len__(self) -> int:
+        return len(self._phashes)
+
+    def phash(self, path: Path) -> int | None:
+        return self._phashes.get(path)
+
+    def distance(self, a: Path, b: Path) -> int | None:
+        """Distancia entre dos imágenes, o None si alguna no está en el índice."""
+        value_a, value_b = self._phashes.get(a), self._phashes.get(b)
+        if value_a is None or value_b is None:
+            return None
+        return (value_a ^ value_b).bit_count()
+
+    def similar(self, value: int, distance: int) -> list[tuple[int, Path]]:
+        """Imágenes a 'distance' bits o menos del hash 'value', de la más parecida a la menos."""
+        return sorted(self._index.search(value, distance), key=lambda match: (match[0], str(match[1])))
+
+def _phashes_by_content(conn: sqlite3.Connection, images: list[Path], compute: bool, max_workers: int) -> dict[Path, int]:
+    if compute:
+        content = {}
+        for image_path in images:
+            try:
+                content[image_path] = library.content_hash(conn, image_path)
+            except OSError:
+                continue
+    else:
+        content = library.known_hashes(conn, images)
+
+    stored = library.get_phashes(conn)
+    # Rutas distintas con el mismo contenido se calculan una sola vez.
+    missing = {}
+    for image_path, file_hash in content.items():
+        if file_hash not in stored:
+            missing.setdefault(file_hash, image_path)
+    if missing and compute:
+        hasher = _load_hasher()
+        if hasher is not None:
+            logging.info(f"Calculando el hash perceptual de {len(missing)} imágenes...")
+            with profiling.span('phash', images=len(missing)):
+                computed = hasher.hash_images(list(missing.values()), max_workers)
+            new = {file_hash: computed[path] for file_hash, path in missing.items() if path in computed}
+            library.store_phashes(conn, new)
+            stored.update(new)
+    return {path: stored[h] for path, h in content.items() if h in stored}
+
+def build_index(images: list[Path], compute: bool = True, max_workers: int = 0) -> SimilarityIndex:
+    """
+    Índice de 'images'. Con compute=True se calculan los hashes que falten;
+    si no, solo entran las imágenes que ya lo tienen guardado.
+    """
+    max_workers = max_workers if max_workers > 0 else (os.cpu_count() or 1)
+    with profiling.span('similarity.index', images=len(images)) as span:
+        try:
+            conn = library.connect()
+            try:
+                phashes = _phashes_by_content(conn, images, compute, max_workers)
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logging.warning(f"No se pudo leer el índice de hashes perceptuales: {e}")
+            phashes = {}
+        span['indexed'] = len(phashes)
+        return SimilarityIndex(phashes)
+
+def image_phash(index: SimilarityIndex, image_path: Path) -> int | None:
+    """Hash perceptual de una imagen, aunque no esté en el índice (se calcula y se guarda)."""
+    value = index.phash(image_path)
+    if value is None:
+        value = build_index([image_path], max_workers=1).phash(image_path)
+    return value
+
+def find_similar(index: SimilarityIndex, image_path: Path, distance: int) -> list[tuple[int, Path]]:
+    """Imágenes del índice parecidas a 'image_path', sin incluirla a ella."""
+    value = image_phash(index, image_path)
+    if value is None:
+        return []
+    return [(d, path) for d, path in index.similar(value, distance) if path != image_path]
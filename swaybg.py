@@ -0,0 +1,196 @@
+# -------------------------------------------------------------------
+# swaybg.py - Gestión de los Procesos swaybg por Salida
+# -------------------------------------------------------------------
+# En lugar de 'pkill -f swaybg' antes de lanzar el nuevo fondo (que
+# deja un fotograma en negro y mata los swaybg de otras salidas), se
+# arranca primero el nuevo swaybg, se espera a que haya creado el
+# buffer de su superficie y solo entonces se terminan los anteriores
+# de esa misma salida. Los PID propios se guardan por salida en
+# SWAYBG_STATE_FILE. Un swaybg de todas las salidas ('-o *') se
+# termina cuando cada salida activa ya tiene el suyo.
+#
+# La espera detecta el buffer compartido que swaybg mapea al dibujar
+# (un archivo de /dev/shm o un memfd en /proc/<pid>/maps). swaybg
+# cierra el descriptor tras crear el pool de wl_shm, así que solo
+# queda el mapa. Un swaybg falso para pruebas tiene que hacer lo
+# mismo: mapear un archivo de /dev/shm y quedarse esperando.
+# -------------------------------------------------------------------
+
+import os
+import json
+import time
+import signal
+import logging
+import threading
+import subprocess
+from pathlib import Path
+
+import utils
+import prescale
+import profiling
+
+SWAYBG_STATE_FILE = Path(
+    os.environ.get('XDG_RUNTIME_DIR') or Path.home() / '.cache/sway-wallpaper-manager'
+) / 'sway-wallpaper-manager-swaybg.json'
+# Tiempo máximo que se espera a que el nuevo swaybg dibuje su superficie.
+READY_TIMEOUT_SECONDS = 3.0
+# Margen tras crear el buffer para que el compositor presente el fotograma.
+PRESENT_GRACE_SECONDS = 0.05
+POLL_SECONDS = 0.01
+
+# Procesos swaybg lanzados por este proceso, para recogerlos al terminarlos
+# y no dejar zombis en el daemon.
+_children: dict[int, subprocess.Popen] = {}
+# Varias salidas se cambian a la vez desde hilos distintos; el cerrojo
+# evita que se pisen al leer y reescribir SWAYBG_STATE_FILE.
+_state_lock = threading.Lock()
+
+def _read_state() -> dict[str, int]:
+    try:
+        return {output: int(pid) for output, pid in json.loads(SWAYBG_STATE_FILE.read_text()).items()}
+    except (OSError, ValueError, AttributeError):
+        return {}
+
+def _write_state(state: dict[str, int]) -> None:
+    SWAYBG_STATE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = SWAYBG_STATE_FILE.with_name(f".tmp-{os.getpid()}-{SWAYBG_STATE_FILE.name}")
+    try:
+        tmp_path.write_text(json.dumps(state))
+        os.replace(tmp_path, SWAYBG_STATE_FILE)
+    except OSError as e:
+        logging.warning(f"No se pudo guardar el estado de swaybg: {e}")
+
+def _swaybg_output(pid: int) -> str | None:
+    """Devuelve la salida ('-o') de un proceso swaybg, o None si el PID no es un swaybg."""
+    try:
+        # 'comm' es el nombre del ejecutable (o del script, si lo es).
+        if Path(f"/proc/{pid}/comm").read_text().strip() != 'swaybg':
+            return None
+        argv = [os.fsdecode(a) for a in Path(f"/proc/{pid}/cmdline").read_bytes().split(b'\0')]
+    except OSError:
+        return None
+    if argv == ['']:
+        return None  # Proceso zombi
+    # Si swaybg es un script, argv empieza por el intérprete.
+    names = [os.path.basename(a) for a in argv]
+    args = argv[names.index('swaybg') + 1:] if 'swaybg' in names else argv[1:]
+    for flag in ('-o', '--output'):
+        if flag in args and args.index(flag) + 1 < len(args):
+            return args[args.index(flag) + 1]
+    return '*'
+
+def _running_swaybg() -> dict[int, str]:
+    """Todos los swaybg del usuario con la salida que ocupa cada uno."""
+    found = {}
+    uid = os.getuid()
+    try:
+        entries = os.listdir('/proc')
+    except OSError:
+        return found
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            if os.stat(f"/proc/{entry}").st_uid != uid:
+                continue
+        except OSError:
+            continue
+        output = _swaybg_output(int(entry))
+        if output is not None:
+            found[int(entry)] = output
+    return found
+
+def _has_mapped(pid: int) -> bool:
+    """swaybg ha mapeado el buffer compartido de su superficie."""
+    try:
+        with open(f"/proc/{pid}/maps") as f:
+            for line in f:
+                # dirección permisos desplazamiento dispositivo inodo [ruta]
+                fields = line.split(maxsplit=5)
+                if len(fields) == 6 and fields[5].startswith(('/dev/shm/', '/memfd:')):
+                    return True
+    except OSError:
+        return False
+    return False
+
+def _wait_until_mapped(process: subprocess.Popen, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            return False
+        if _has_mapped(process.pid):
+            time.sleep(PRESENT_GRACE_SECONDS)
+            return True
+        time.sleep(POLL_SECONDS)
+    logging.warning("swaybg tardó demasiado en mostrar el fondo; se reemplaza igualmente.")
+    return process.poll() is None
+
+def set_background(image_path: Path, output: str, mode: str) -> bool:
+    """
+    Muestra 'image_path' en 'output' sin parpadeo: el swaybg anterior de esa
+    salida se termina cuando el nuevo ya está dibujado. Con output '*' se
+    reemplazan los de todas las salidas; con una salida concreta, el de '*'
+    se termina cuando todas tienen ya el suyo.
+    """
+    process = utils.run_command(
+        ['swaybg', '-o', output, '-i', str(image_path), '-m', mode],
+        background=True, start_new_session=True
+    )
+    if process is None:
+        return False
+    with profiling.span('swaybg.wait', output=output) as span:
+        span['mapped'] = _wait_until_mapped(process, READY_TIMEOUT_SECONDS)
+    if not span['mapped']:
+        logging.error(f"swaybg terminó sin mostrar '{image_path.name}' (código {process.returncode}).")
+        return False
+
+    with _state_lock, profiling.span('swaybg.replace', output=output):
+        _replace_previous(process, output)
+    return True
+
+def _replace_previous(process: subprocess.Popen, output: str) -> None:
+    """Termina los swaybg anteriores de 'output' y registra el nuevo."""
+    # Los anteriores de esta salida: el registrado por el gestor y cualquier
+    # otro swaybg lanzado para ella desde fuera (p. ej. por restore.sh).
+    state = _read_state()
+    running = _running_swaybg()
+    previous = {pid for pid, pid_output in running.items() if output == '*' or pid_output == output}
+    tracked = state.get(output)
+    if tracked is not None and running.get(tracked) is not None:
+        previous.add(tracked)
+    previous.discard(process.pid)
+    running[process.pid] = output
+    if output != '*':
+        previous |= _covered_wildcards(running, previous)
+
+    for pid in previous:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+        except PermissionError as e:
+            logging.warning(f"No se pudo terminar swaybg ({pid}): {e}")
+        child = _children.pop(pid, None)
+        if child is not None:
+            threading.Thread(target=child.wait, daemon=True).start()
+    _children[process.pid] = process
+
+    # Se descartan las entradas de procesos que ya no existen.
+    state = {o: pid for o, pid in state.items() if pid in running and pid not in previous}
+    state[output] = process.pid
+    _write_state(state)
+
+def _covered_wildcards(running: dict[int, str], replaced: set[int]) -> set[int]:
+    """
+    Los swaybg de '*' que ya no se ven porque cada salida activa tiene su
+    propio swaybg dibujado. Si no se sabe qué salidas hay, no se toca ninguno.
+    """
+    wildcards = {pid for pid, pid_output in running.items() if pid_output == '*'}
+    if not wildcards:
+        return set()
+    covered = {pid_output for pid, pid_output in running.items()
+               if pid_output != '*' and pid not in replaced and _has_mapped(pid)}
+    names = {o['name'] for o in prescale.get_outputs()}
+    if not names or not names <= covered:
+        return set()
+    return wildcards
@@ -0,0 +1,22 @@
+# -------------------------------------------------------------------
+# conftest.py - Entorno Aislado para las Pruebas
+# -------------------------------------------------------------------
+# Los módulos del proyecto calculan sus rutas de caché y de estado al
+# importarse, así que HOME y XDG_RUNTIME_DIR se apuntan a una carpeta
+# temporal antes de que ninguna prueba los importe. Tampoco se usa el
+# bus de sesión real.
+# -------------------------------------------------------------------
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+_HOME = Path(tempfile.mkdtemp(prefix='sway-wallpaper-tests-'))
+
+os.environ['HOME'] = str(_HOME)
+os.environ['XDG_RUNTIME_DIR'] = str(_HOME)
+os.environ.pop('DBUS_SESSION_BUS_ADDRESS', None)
+os.environ.pop('SWAYSOCK', None)
+sys.path.insert(0, str(ROOT))
@@ -0,0 +1,50 @@
+import time
+import threading
+import configparser
+from pathlib import Path
+
+import pytest
+
+import automode
+
+def list_images(folder: str, recursive: bool = False) -> list[Path]:
+    return sorted(Path(folder).glob('*.jpg'))
+
+@pytest.fixture
+def rotation(tmp_path):
+    for name in ('a', 'b', 'c'):
+        (tmp_path / f"{name}.jpg").write_bytes(b'x')
+    config = configparser.ConfigParser()
+    config['Settings'] = {
+        'wallpaper_folder': str(tmp_path),
+        'rotation_order': 'sequential',
+        'swaybg_output': '*',
+        'prefetch_count': '2',
+        'duplicate_distance': '0',
+    }
+    rotation = automode.OutputRotation(config['Settings'], list_images)
+    rotation.watcher.start()
+    yield rotation
+    automode.stop_rotations([rotation])
+
+def test_paused_scheduler_does_not_prefetch_until_resumed(rotation):
+    prepared = []
+    scheduler = automode.AutoModeScheduler(
+        [rotation], lambda assignments, quiet=False: None, paused=True,
+        prepare_func=lambda image_path, config: prepared.append(image_path),
+    )
+    thread = threading.Thread(target=scheduler.run, daemon=True)
+    thread.start()
+    try:
+        time.sleep(0.3)
+        assert prepared == []
+        assert not rotation.upcoming
+
+        scheduler.resume()
+        deadline = time.monotonic() + 5
+        while len(prepared) < 2 and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert len(prepared) >= 2
+    finally:
+        scheduler.stop()
+        thread.join(timeout=5)
@@ -0,0 +1,47 @@
+import threading
+import configparser
+
+import pytest
+
+import main
+import utils
+import library
+import colorindex
+
+pytest.importorskip('numpy')
+Image = pytest.importorskip('PIL.Image')
+
+@pytest.fixture
+def library_folder(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, 'THUMBNAIL_CACHE_DIR', tmp_path / 'thumbnails')
+    monkeypatch.setattr(library, 'INDEX_FILE', tmp_path / 'library.sqlite3')
+    monkeypatch.setattr(utils, '_thread_local', threading.local())
+    folder = tmp_path / 'fondos'
+    folder.mkdir()
+    config = configparser.ConfigParser()
+    config['Settings'] = {'wallpaper_folder': str(folder), 'swaybg_output': '*', 'sort_by': 'hue'}
+    monkeypatch.setattr(main, 'select_outputs', lambda config, output: [config])
+    return folder, config['Settings']
+
+def test_interactive_sorts_by_stored_colors_and_indexes_the_rest(library_folder, monkeypatch):
+    folder, config = library_folder
+    for name, rgb in (('a', (20, 40, 220)), ('b', (220, 30, 20)), ('c', (30, 200, 40)), ('d', (230, 220, 30))):
+        Image.new('RGB', (300, 300), rgb).save(folder / f"{name}.png")
+    # 'a' y 'b' ya tienen colores, 'c' solo miniatura y 'd' es nueva.
+    colorindex.update_colors([folder / 'a.png', folder / 'b.png'], 1, generate=True)
+    utils.get_thumbnails([folder / 'c.png'], 1)
+    shown = []
+
+    def choose_with_rofi(config, images, thumbnails, pending):
+        shown.extend(images)
+        # rofi se abre sin haber calculado nada.
+        assert len(colorindex.stored_colors(images)) == 2
+        list(pending)
+        return None
+
+    monkeypatch.setattr(main, 'choose_with_rofi', choose_with_rofi)
+    main.main_interactive(config)
+
+    # Por tono: rojo, azul y, al final, las que no tenían colores.
+    assert shown == [folder / 'b.png', folder / 'a.png', folder / 'c.png', folder / 'd.png']
+    assert len(colorindex.stored_colors(shown)) == 4
@@ -0,0 +1,56 @@
+import configparser
+from pathlib import Path
+
+import pytest
+
+import daemon
+
+def list_images(folder: str, recursive: bool = False) -> list[Path]:
+    return sorted(Path(folder).glob('*.jpg'))
+
+@pytest.fixture
+def settings(tmp_path):
+    (tmp_path / 'a.jpg').write_bytes(b'x')
+    config = configparser.ConfigParser()
+    config['Settings'] = {
+        'wallpaper_folder': str(tmp_path),
+        'rotation_interval_minutes': '30',
+        'rotation_order': 'sequential',
+        'swaybg_output': '*',
+        'prefetch_count': '0',
+        'duplicate_distance': '0',
+    }
+    return config['Settings']
+
+@pytest.fixture
+def wallpaper_daemon(settings):
+    applied = []
+    instance = daemon.WallpaperDaemon(
+        lambda: settings, list_images, lambda assignments, quiet=False: applied.extend(assignments),
+        lambda *args: None, lambda config: 0,
+    )
+    yield instance
+    instance.close()
+
+def test_reload_keeps_running_with_invalid_config(wallpaper_daemon, settings, tmp_path):
+    wallpaper_daemon.handle({'cmd': 'set', 'path': str(tmp_path / 'a.jpg'), 'quiet': True})
+    scheduler = wallpaper_daemon.scheduler
+    settings['rotation_interval_minutes'] = 'abc'
+    with pytest.raises(ValueError):
+        wallpaper_daemon.reload()
+    assert wallpaper_daemon.scheduler is scheduler
+    assert wallpaper_daemon._scheduler_thread.is_alive()
+    assert wallpaper_daemon.handle({'cmd': 'status'})['current'] == str(tmp_path / 'a.jpg')
+    assert all(not r.watcher._stop.is_set() for r in scheduler.rotations)
+
+def test_reload_keeps_history(wallpaper_daemon, settings, tmp_path):
+    wallpaper_daemon.handle({'cmd': 'set', 'path': str(tmp_path / 'a.jpg'), 'quiet': True})
+    scheduler = wallpaper_daemon.scheduler
+    settings['rotation_interval_minutes'] = '60'
+    assert wallpaper_daemon.handle({'cmd': 'reload'}) == {'ok': True}
+    assert wallpaper_daemon.scheduler is not scheduler
+    assert wallpaper_daemon.scheduler.paused
+    assert wallpaper_daemon.scheduler.current == tmp_path / 'a.jpg'
+    # Las rotaciones anteriores ya están paradas; cerrarlas de nuevo no falla.
+    for rotation in scheduler.rotations:
+        rotation.watcher.stop()
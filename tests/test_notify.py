@@ -0,0 +1,119 @@
+import shutil
+import threading
+import subprocess
+import time
+
+import pytest
+
+import notify
+
+class NotificationServer(threading.Thread):
+    """Servidor de notificaciones falso en el bus de pruebas: responde a Notify y anota lo recibido."""
+
+    def __init__(self):
+        super().__init__(name='notification-server', daemon=True)
+        self.bus = notify.SessionBus(timeout=None)
+        body = notify.Writer()
+        body.string(notify.NOTIFICATIONS_NAME)
+        body.uint32(4)  # DBUS_NAME_FLAG_DO_NOT_QUEUE
+        self.bus.call('org.freedesktop.DBus', '/org/freedesktop/DBus', 'org.freedesktop.DBus',
+                      'RequestName', 'su', bytes(body.data))
+        # (replaces_id recibido, id devuelto, texto)
+        self.received: list[tuple[int, int, str]] = []
+        self._last_id = 0
+
+    def run(self) -> None:
+        while True:
+            try:
+                message = self.bus.read_message()
+            except (OSError, notify.DBusError):
+                return
+            if message.type != notify.METHOD_CALL or message.fields.get(notify.FIELD_MEMBER) != 'Notify':
+                continue
+            _, replaces_id, _, _, text = notify.read_body(message, 5)
+            notification_id = replaces_id
+            if not notification_id:
+                self._last_id += 1
+                notification_id = self._last_id
+            self.received.append((replaces_id, notification_id, text))
+            body = notify.Writer()
+            body.uint32(notification_id)
+            self.bus.reply(message, 'u', bytes(body.data))
+
+@pytest.fixture
+def notification_id_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(notify, 'NOTIFICATION_ID_FILE', tmp_path / 'notification-id')
+    return tmp_path / 'notification-id'
+
+@pytest.fixture
+def server(tmp_path, monkeypatch, notification_id_file):
+    dbus_daemon = shutil.which('dbus-daemon')
+    if dbus_daemon is None:
+        pytest.skip("dbus-daemon no está instalado")
+    socket_path = tmp_path / 'bus'
+    address = f"unix:path={socket_path}"
+    process = subprocess.Popen(
+        [dbus_daemon, '--session', '--nofork', f'--address={address}'],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + 5
+    while not socket_path.exists():
+        if process.poll() is not None or time.monotonic() > deadline:
+            process.kill()
+            pytest.skip("dbus-daemon no arrancó")
+        time.sleep(0.01)
+    monkeypatch.setenv('DBUS_SESSION_BUS_ADDRESS', address)
+    server = NotificationServer()
+    server.start()
+    yield server
+    server.bus.close()
+    process.terminate()
+    process.wait()
+
+def _fail(*args):
+    raise AssertionError(f"No debería usarse notify-send: {args}")
+
+def test_delivers_and_reuses_id_across_processes(server, notification_id_file):
+    first = notify.Notifier(fallback_func=_fail)
+    first.notify("Fondo", "a.png", "dialog-information")
+    first.flush()
+    # Un proceso nuevo parte del id guardado por el anterior.
+    second = notify.Notifier(fallback_func=_fail)
+    second.notify("Fondo", "b.png", "dialog-information")
+    second.flush()
+
+    assert server.received == [(0, 1, "a.png"), (1, 1, "b.png")]
+    assert notification_id_file.read_text() == '1'
+
+def test_coalesces_bursts(server):
+    notifier = notify.Notifier(fallback_func=_fail)
+    for name in ('a.png', 'b.png', 'c.png', 'd.png'):
+        notifier.notify("Fondo", name, "dialog-information")
+    notifier.flush()
+
+    # Lo que llega dentro de la ventana se agrupa y solo se envía el último.
+    texts = [text for _, _, text in server.received]
+    assert texts[-1] == 'd.png'
+    assert len(texts) <= 2
+
+def test_reconnects_when_connection_breaks(server):
+    notifier = notify.Notifier(fallback_func=_fail)
+    notifier.notify("Fondo", "a.png", "dialog-information")
+    notifier.flush()
+    notifier._bus.close()
+
+    notifier.notify("Fondo", "b.png", "dialog-information")
+    notifier.flush()
+
+    assert [text for _, _, text in server.received] == ['a.png', 'b.png']
+
+def test_falls_back_without_bus(tmp_path, monkeypatch, notification_id_file):
+    monkeypatch.delenv('DBUS_SESSION_BUS_ADDRESS', raising=False)
+    monkeypatch.setenv('XDG_RUNTIME_DIR', str(tmp_path / 'sin-bus'))
+    sent = []
+    notifier = notify.Notifier(fallback_func=lambda *args: sent.append(args))
+
+    notifier.notify("Fondo", "a.png", "dialog-information")
+    notifier.flush()
+
+    assert sent == [("Fondo", "a.png", "dialog-information")]
@@ -0,0 +1,117 @@
+import os
+import json
+import time
+from pathlib import Path
+
+import pytest
+
+import palette
+
+def _stub(bin_dir: Path, name: str, log: Path) -> None:
+    """Anota los argumentos y, si el último es un archivo (una plantilla), su contenido."""
+    script = bin_dir / name
+    script.write_text(
+        f'#!/bin/sh\necho "{name} $*" >> {log}\n'
+        f'for last; do :; done\n[ -f "$last" ] && cat "$last" >> {log}\nexit 0\n'
+    )
+    script.chmod(0o755)
+
+def _wait_for_lines(log: Path, count: int) -> list[str]:
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        lines = log.read_text().splitlines() if log.exists() else []
+        if len(lines) >= count:
+            return lines
+        time.sleep(0.02)
+    return lines
+
+@pytest.fixture
+def cached_palette(tmp_path, monkeypatch):
+    """Una paleta ya en caché y 'swaymsg', 'xrdb' y 'kitty' falsos en el PATH."""
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir()
+    log = tmp_path / 'calls.log'
+    for name in ('swaymsg', 'xrdb', 'kitty'):
+        _stub(bin_dir, name, log)
+    monkeypatch.setenv('TERM', 'xterm-kitty')
+    monkeypatch.setenv('PATH', f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setattr(palette, 'WAL_CACHE_DIR', tmp_path / 'wal')
+    monkeypatch.setattr(palette, 'PALETTE_CACHE_DIR', tmp_path / 'palettes')
+    monkeypatch.setattr(palette, '_image_hash', lambda image_path: 'abc')
+
+    image = tmp_path / 'a.jpg'
+    image.write_bytes(b'')
+    entry = palette._entry_dir('abc', 'wal')
+    entry.mkdir(parents=True)
+    (entry / 'colors.json').write_text(f'{{"wallpaper": "{tmp_path / "old.jpg"}"}}')
+    (entry / 'colors.Xresources').write_text('*.color0: #000000\n')
+    (entry / palette.SOURCE_FILE).write_text(str(tmp_path / 'old.jpg'))
+    return image, log
+
+def test_restore_reloads_sway(cached_palette, monkeypatch):
+    image, log = cached_palette
+    monkeypatch.setattr(palette, '_process_names', lambda: {'sway'})
+
+    palette.apply_palette(image)
+
+    assert str(image) in (palette.WAL_CACHE_DIR / 'colors.json').read_text()
+    # xrdb anota también el contenido de la plantilla.
+    lines = _wait_for_lines(log, 3)
+    assert f"xrdb -merge -quiet {palette.WAL_CACHE_DIR / 'colors.Xresources'}" in lines
+    assert 'swaymsg reload' in lines
+
+def test_restore_skips_programs_not_running(cached_palette, monkeypatch):
+    image, log = cached_palette
+    monkeypatch.setattr(palette, '_process_names', lambda: set())
+
+    palette.apply_palette(image)
+
+    assert 'swaymsg reload' not in _wait_for_lines(log, 1)
+
+def test_restore_drops_templates_of_an_earlier_palette(cached_palette, monkeypatch):
+    image, log = cached_palette
+    monkeypatch.setattr(palette, '_process_names', lambda: set())
+    # Plantilla de una ejecución anterior de wal que la paleta en caché no trae.
+    palette.WAL_CACHE_DIR.mkdir(parents=True)
+    (palette.WAL_CACHE_DIR / 'colors-kitty.conf').write_text('color0 #OLDOLD\n')
+
+    palette.apply_palette(image)
+
+    assert not (palette.WAL_CACHE_DIR / 'colors-kitty.conf').exists()
+    lines = _wait_for_lines(log, 2)
+    assert not any(line.startswith('kitty') for line in lines)
+    assert '#OLDOLD' not in log.read_text()
+
+# Como wal: escribe en PYWAL_CACHE_DIR la paleta y sus plantillas, todas con el color #aaaaaa.
+FAKE_WAL = """#!/bin/sh
+cache="$PYWAL_CACHE_DIR"
+mkdir -p "$cache"
+echo '{"wallpaper": "a", "colors": {"color0": "#aaaaaa"}}' > "$cache/colors.json"
+echo '#aaaaaa' > "$cache/colors"
+: > "$cache/sequences"
+echo '*.color0: #aaaaaa' > "$cache/colors.Xresources"
+echo 'color0 #aaaaaa' > "$cache/colors-kitty.conf"
+"""
+
+def test_native_after_wal_applies_its_own_templates(cached_palette, tmp_path, monkeypatch):
+    pytest.importorskip('numpy')
+    Image = pytest.importorskip('PIL.Image')
+    _, log = cached_palette
+    (tmp_path / 'bin' / 'wal').write_text(FAKE_WAL)
+    (tmp_path / 'bin' / 'wal').chmod(0o755)
+    monkeypatch.setenv('PYWAL_CACHE_DIR', str(palette.WAL_CACHE_DIR))
+    monkeypatch.setattr(palette, '_image_hash', lambda image_path: image_path.stem)
+    monkeypatch.setattr(palette, '_process_names', lambda: set())
+    image_a, image_b = tmp_path / 'a.png', tmp_path / 'b.png'
+    Image.new('RGB', (64, 64), (170, 170, 170)).save(image_a)
+    Image.new('RGB', (64, 64), (20, 90, 200)).save(image_b)
+
+    palette.apply_palette(image_a, 'wal')
+    log.write_text('')
+    palette.apply_palette(image_b, 'native')
+
+    color0 = json.loads((palette.WAL_CACHE_DIR / 'colors.json').read_text())['colors']['color0']
+    calls = log.read_text()
+    assert '#aaaaaa' not in calls
+    assert f"*.color0: {color0}" in calls
+    assert f"color0 {color0}" in calls
@@ -0,0 +1,99 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
+import utils
+
+pytestmark = pytest.mark.skipif(shutil.which('pgrep') is None, reason="restore.sh necesita pgrep")
+
+CONFIG = """
+[Settings]
+wallpaper_folder = ~/wallpaper
+swaybg_output = *
+swaybg_mode = fill
+
+[Output DP-1]
+primary = true
+
+[Output HDMI-A-1]
+swaybg_mode = fit
+"""
+
+# Anota con qué argumentos se lanzó y se queda en marcha hasta recibir SIGTERM.
+FAKE_SWAYBG = """#!/bin/sh
+echo "$*" >> "{log}"
+trap 'exit 0' TERM
+while :; do sleep 0.05; done
+"""
+
+@pytest.fixture
+def persistence(tmp_path, monkeypatch):
+    config_dir = tmp_path / 'config'
+    config_file = tmp_path / 'config.ini'
+    config_file.write_text(CONFIG)
+    monkeypatch.setattr(utils, 'CONFIG_FILE', config_file)
+    monkeypatch.setattr(utils, 'SWAY_WM_CONFIG_DIR', config_dir)
+    monkeypatch.setattr(utils, 'RESTORE_SCRIPT_PATH', config_dir / 'restore.sh')
+    monkeypatch.setattr(utils, 'LAST_WALLPAPER_FILE', config_dir / 'last_wallpaper.txt')
+    monkeypatch.setattr(utils, 'SWAY_CONFIG_FILE', tmp_path / 'sway' / 'config')
+    monkeypatch.setattr(utils, 'send_notification', lambda *args, **kwargs: None)
+
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir()
+    log = tmp_path / 'swaybg.log'
+    (bin_dir / 'swaybg').write_text(FAKE_SWAYBG.format(log=log))
+    (bin_dir / 'swaybg').chmod(0o755)
+    monkeypatch.setenv('PATH', f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    processes = []
+
+    def start(output: str) -> subprocess.Popen:
+        process = subprocess.Popen([str(bin_dir / 'swaybg'), '-o', output, '-i', 'old.png', '-m', 'fill'])
+        processes.append(process)
+        return process
+
+    yield start, log
+    subprocess.run(['pkill', '-f', f"{bin_dir}/swaybg"], check=False)
+    for process in processes:
+        process.wait()
+
+def _alive(process: subprocess.Popen, timeout: float = 2) -> bool:
+    try:
+        process.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return True
+    return False
+
+def test_restore_one_swaybg_per_output(persistence):
+    start, log = persistence
+    utils.save_last_wallpaper('/fondos/a.png')
+    utils.save_last_wallpaper('/fondos/a.png', 'DP-1')
+    old_dp = start('DP-1')
+    old_all = start('*')
+    other = start('eDP-1')
+
+    utils.manage_persistence()
+    subprocess.run([str(utils.RESTORE_SCRIPT_PATH)], check=True, timeout=10)
+
+    launched = log.read_text().splitlines()
+    assert '-o DP-1 -i /fondos/a.png -m fill' in launched
+    # HDMI-A-1 aún no tiene fondo propio: usa el de la salida principal con su modo.
+    assert '-o HDMI-A-1 -i /fondos/a.png -m fit' in launched
+    assert not _alive(old_dp)
+    assert not _alive(old_all)
+    # Las salidas que no están en la configuración no se tocan.
+    assert _alive(other, timeout=0.2)
+
+def test_restore_uses_each_output_wallpaper(persistence):
+    start, log = persistence
+    utils.save_last_wallpaper('/fondos/a.png')
+    utils.save_last_wallpaper('/fondos/a.png', 'DP-1')
+    utils.save_last_wallpaper('/fondos/b.png', 'HDMI-A-1')
+
+    utils.manage_persistence()
+    subprocess.run([str(utils.RESTORE_SCRIPT_PATH)], check=True, timeout=10)
+
+    launched = log.read_text().splitlines()
+    assert '-o DP-1 -i /fondos/a.png -m fill' in launched
+    assert '-o HDMI-A-1 -i /fondos/b.png -m fit' in launched
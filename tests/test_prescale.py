@@ -0,0 +1,77 @@
+import json
+
+import pytest
+
+import library
+import prescale
+
+OUTPUTS = [
+    {'name': 'DP-1', 'active': True, 'current_mode': {'width': 2560, 'height': 1440}, 'transform': 'normal'},
+    {'name': 'HDMI-A-1', 'active': True, 'current_mode': {'width': 1920, 'height': 1080}, 'transform': '90'},
+    {'name': 'eDP-1', 'active': False, 'current_mode': {'width': 1920, 'height': 1080}},
+    {'name': 'HEADLESS-1', 'active': True, 'current_mode': None},
+]
+
+@pytest.fixture
+def outputs_json(tmp_path, monkeypatch):
+    path = tmp_path / 'outputs.json'
+    path.write_text(json.dumps(OUTPUTS))
+    monkeypatch.setenv(prescale.OUTPUTS_JSON_ENV, str(path))
+    return path
+
+@pytest.fixture
+def scaled_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(prescale, 'SCALED_CACHE_DIR', tmp_path / 'scaled')
+    monkeypatch.setattr(library, 'INDEX_FILE', tmp_path / 'library.sqlite3')
+    return tmp_path / 'scaled'
+
+def test_outputs_from_json(outputs_json):
+    outputs = prescale.get_outputs()
+
+    # Las inactivas y las que no tienen modo se ignoran; las giradas intercambian ancho y alto.
+    assert outputs == [
+        {'name': 'DP-1', 'width': 2560, 'height': 1440},
+        {'name': 'HDMI-A-1', 'width': 1080, 'height': 1920},
+    ]
+
+def test_target_size(outputs_json):
+    outputs = prescale.get_outputs()
+
+    assert prescale.target_size('DP-1', outputs) == (2560, 1440)
+    assert prescale.target_size('HDMI-A-1', outputs) == (1080, 1920)
+    assert prescale.target_size('eDP-1', outputs) is None
+    # Con '*' solo si todas comparten resolución.
+    assert prescale.target_size('*', outputs) is None
+    assert prescale.target_size('*', outputs[:1]) == (2560, 1440)
+
+def test_unreadable_json_means_no_outputs(outputs_json):
+    outputs_json.write_text('{')
+
+    assert prescale.get_outputs() == []
+
+def test_cache_evicts_least_recently_used(scaled_cache, tmp_path):
+    Image = pytest.importorskip('PIL.Image')
+    images = []
+    for i in range(3):
+        path = tmp_path / f"{i}.png"
+        # Mismo tamaño y mismo contenido salvo el color: todas las copias ocupan lo mismo.
+        Image.new('RGB', (400, 400), (i, 0, 0)).save(path)
+        images.append(path)
+    outputs = [{'name': 'DP-1', 'width': 200, 'height': 200}]
+
+    first = prescale.get_scaled(images[0], 'DP-1', 'fill', outputs)
+    second = prescale.get_scaled(images[1], 'DP-1', 'fill', outputs)
+    assert first.parent == second.parent == scaled_cache
+    # Se vuelve a usar la primera: la más antigua pasa a ser la segunda.
+    assert prescale.get_scaled(images[0], 'DP-1', 'fill', outputs) == first
+    budget = first.stat().st_size + second.stat().st_size
+    third = prescale.get_scaled(images[2], 'DP-1', 'fill', outputs, max_cache_bytes=budget)
+
+    assert first.exists() and third.exists()
+    assert not second.exists()
+    conn = library.connect()
+    try:
+        tracked = {path for path, in conn.execute("SELECT path FROM scaled")}
+    finally:
+        conn.close()
+    assert tracked == {str(first), str(third)}
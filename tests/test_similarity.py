@@ -0,0 +1,40 @@
+import configparser
+from pathlib import Path
+
+import pytest
+
+import main
+import utils
+import similarity
+
+# Hashes perceptuales inventados: 'copia' es idéntica y 'parecida' difiere en 3 bits.
+PHASHES = {Path('/fondos/a.png'): 0b1011, Path('/fondos/copia.png'): 0b1011, Path('/fondos/parecida.png'): 0b0100}
+
+@pytest.fixture
+def settings(monkeypatch):
+    config = configparser.ConfigParser()
+    config['Settings'] = {'wallpaper_folder': '/fondos', 'swaybg_output': '*', 'duplicate_distance': '10'}
+    built = []
+
+    def build_index(images, compute=True, max_workers=0):
+        built.append(images)
+        return similarity.SimilarityIndex(PHASHES)
+
+    monkeypatch.setattr(main, 'select_outputs', lambda config, output: [config])
+    monkeypatch.setattr(utils, 'get_last_wallpaper', lambda: Path('/fondos/a.png'))
+    monkeypatch.setattr(utils, 'get_image_files', lambda folder, recursive=False: list(PHASHES))
+    monkeypatch.setattr(similarity, 'build_index', build_index)
+    return config['Settings'], built
+
+def test_similar_respects_an_explicit_zero(settings):
+    config, _ = settings
+    assert main.find_similar(config, None, 0) == [(0, Path('/fondos/copia.png'))]
+    assert len(main.find_similar(config, None)) == 2
+
+def test_similar_is_disabled_with_duplicate_distance_zero(settings):
+    config, built = settings
+    config['duplicate_distance'] = '0'
+    assert main.find_similar(config, None) == []
+    assert built == []
+    # Con una distancia explícita se busca igualmente.
+    assert main.find_similar(config, None, 0) == [(0, Path('/fondos/copia.png'))]
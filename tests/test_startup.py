@@ -0,0 +1,46 @@
+import os
+import sys
+import json
+import subprocess
+
+import pytest
+
+from conftest import ROOT
+
+pytest.importorskip('PIL.Image')
+sys.path.insert(0, str(ROOT / 'benchmarks'))
+import bench_suite
+
+@pytest.fixture
+def stub_environment(tmp_path, monkeypatch):
+    """Lo mismo que prepara bench_suite: binarios falsos, HOME temporal y una salida falsa."""
+    home = tmp_path / 'home'
+    home.mkdir()
+    outputs_json = tmp_path / 'outputs.json'
+    outputs_json.write_text(json.dumps([
+        {'name': 'BENCH-1', 'active': True, 'current_mode': {'width': 1920, 'height': 1080}, 'transform': 'normal'}
+    ]))
+    bin_dir = tmp_path / 'bin'
+    bench_suite.install_stubs(bin_dir)
+    monkeypatch.setenv('HOME', str(home))
+    monkeypatch.setenv('XDG_RUNTIME_DIR', str(home))
+    monkeypatch.setenv('PATH', f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv('SWAY_WALLPAPER_OUTPUTS_JSON', str(outputs_json))
+    for name in ('SWAYSOCK', 'PYWAL_CACHE_DIR', 'DBUS_SESSION_BUS_ADDRESS'):
+        monkeypatch.delenv(name, raising=False)
+    yield tmp_path
+    subprocess.run(['pkill', '-f', f"{bin_dir}/swaybg"], check=False)
+
+def test_set_starts_within_budget(stub_environment):
+    images = bench_suite.make_library(stub_environment / 'library', 20)
+    # Una foto mayor que la salida, como un fondo normal: '--set' usa su copia
+    # reescalada en caché sin cargar Pillow.
+    image = max((path for path in images if path.suffix == '.jpg'), key=lambda path: path.stat().st_size)
+
+    # La primera ejecución llena las cachés; se mide la mediana de las siguientes.
+    startup, _ = bench_suite.bench_startup(image, repeat=3)
+
+    assert startup * 1000 <= bench_suite.STARTUP_BUDGET_MS, (
+        f"El arranque de '--set' ({startup * 1000:.1f} ms) supera el presupuesto "
+        f"de {bench_suite.STARTUP_BUDGET_MS} ms."
+    )
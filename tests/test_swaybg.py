@@ -0,0 +1,97 @@
+import os
+import sys
+import json
+import time
+import logging
+
+import pytest
+
+import swaybg
+import prescale
+
+# Como el swaybg real: el buffer se mapea desde /dev/shm y el descriptor
+# se cierra, así que solo queda en /proc/<pid>/maps. La espera previa
+# simula lo que tarda en conectarse al compositor.
+FAKE_SWAYBG = f"#!{sys.executable}\n" + """import os, mmap, time, ctypes, signal
+time.sleep(0.1)
+path = f"/dev/shm/test-swaybg-{os.getpid()}"
+fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o600)
+os.unlink(path)
+os.ftruncate(fd, 4096)
+# mmap.mmap() se queda con una copia del descriptor; libc no.
+libc = ctypes.CDLL(None)
+libc.mmap.restype = ctypes.c_void_p
+libc.mmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_long]
+libc.mmap(None, 4096, mmap.PROT_READ | mmap.PROT_WRITE, mmap.MAP_SHARED, fd, 0)
+os.close(fd)
+while True:
+    signal.pause()
+"""
+
+def _alive(pid: int) -> bool:
+    return swaybg._swaybg_output(pid) is not None
+
+def _wait_gone(pid: int) -> bool:
+    deadline = time.monotonic() + 2
+    while _alive(pid) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return not _alive(pid)
+
+@pytest.fixture
+def fake_swaybg(tmp_path, monkeypatch):
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir()
+    script = bin_dir / 'swaybg'
+    script.write_text(FAKE_SWAYBG)
+    script.chmod(0o755)
+    outputs = tmp_path / 'outputs.json'
+    outputs.write_text(json.dumps([
+        {'name': name, 'active': True, 'current_mode': {'width': 1920, 'height': 1080}}
+        for name in ('DP-1', 'HDMI-A-1')
+    ]))
+    monkeypatch.setenv('PATH', f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv(prescale.OUTPUTS_JSON_ENV, str(outputs))
+    monkeypatch.setattr(swaybg, 'SWAYBG_STATE_FILE', tmp_path / 'swaybg.json')
+    monkeypatch.setattr(swaybg, 'PRESENT_GRACE_SECONDS', 0)
+    image = tmp_path / 'a.png'
+    image.write_bytes(b'')
+    yield image
+    for pid, process in list(swaybg._children.items()):
+        process.kill()
+        process.wait()
+    swaybg._children.clear()
+
+def test_waits_for_mapping_without_open_fd(fake_swaybg, caplog):
+    with caplog.at_level(logging.WARNING):
+        assert swaybg.set_background(fake_swaybg, 'DP-1', 'fill')
+
+    pid = swaybg._read_state()['DP-1']
+    assert swaybg._has_mapped(pid)
+    fds = [os.readlink(f"/proc/{pid}/fd/{fd}") for fd in os.listdir(f"/proc/{pid}/fd")]
+    assert not any(target.startswith('/dev/shm/') for target in fds)
+    assert 'tardó demasiado' not in caplog.text
+
+def test_handoff_replaces_same_output_only(fake_swaybg):
+    assert swaybg.set_background(fake_swaybg, 'DP-1', 'fill')
+    assert swaybg.set_background(fake_swaybg, 'HDMI-A-1', 'fill')
+    first = swaybg._read_state()
+
+    assert swaybg.set_background(fake_swaybg, 'DP-1', 'fill')
+    state = swaybg._read_state()
+
+    assert state['DP-1'] != first['DP-1']
+    assert state['HDMI-A-1'] == first['HDMI-A-1']
+    assert _wait_gone(first['DP-1'])
+    assert _alive(state['DP-1']) and _alive(state['HDMI-A-1'])
+
+def test_wildcard_retired_once_every_output_has_its_own(fake_swaybg):
+    assert swaybg.set_background(fake_swaybg, '*', 'fill')
+    wildcard = swaybg._read_state()['*']
+
+    assert swaybg.set_background(fake_swaybg, 'DP-1', 'fill')
+    assert _alive(wildcard)
+    assert '*' in swaybg._read_state()
+
+    assert swaybg.set_background(fake_swaybg, 'HDMI-A-1', 'fill')
+    assert _wait_gone(wildcard)
+    assert set(swaybg._read_state()) == {'DP-1', 'HDMI-A-1'}
@@ -0,0 +1,65 @@
+import time
+import threading
+
+import pytest
+
+import utils
+import library
+
+Image = pytest.importorskip('PIL.Image')
+
+@pytest.fixture
+def thumbnail_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, 'THUMBNAIL_CACHE_DIR', tmp_path / 'thumbnails')
+    monkeypatch.setattr(library, 'INDEX_FILE', tmp_path / 'library.sqlite3')
+    # Cada hilo guarda su conexión al índice; se empieza con una nueva.
+    monkeypatch.setattr(utils, '_thread_local', threading.local())
+
+    def make_images(prefix: str, count: int) -> list:
+        images = []
+        for i in range(count):
+            path = tmp_path / f"{prefix}{i}.png"
+            # Mismo tamaño y distinto color: contenidos distintos con miniaturas iguales de tamaño.
+            Image.new('RGB', (300, 300), (len(list(tmp_path.glob('*.png'))), 0, 0)).save(path)
+            images.append(path)
+        return images
+
+    return make_images
+
+def _budget(thumbnails: list, count: int) -> int:
+    return thumbnails[0].stat().st_size * count
+
+def test_interactive_thumbnails_survive_eviction(thumbnail_cache):
+    old = thumbnail_cache('old', 4)
+    shown = thumbnail_cache('shown', 4)
+    new = thumbnail_cache('new', 4)
+    old_thumbnails = utils.get_thumbnails(old, 1)
+    utils.get_thumbnails(shown, 1)
+    time.sleep(0.01)
+
+    # Lo mismo que main_interactive: las que existen se muestran y las que faltan se generan.
+    started = time.time()
+    cached = utils.cached_thumbnails(shown, started)
+    budget = _budget(old_thumbnails, len(shown) + len(new))
+    generated = dict(utils.iter_thumbnails(new, 2, budget, started))
+
+    assert len(cached) == len(shown) and len(generated) == len(new)
+    assert all(thumbnail.exists() for thumbnail in cached.values())
+    assert all(thumbnail.exists() for thumbnail in generated.values())
+    assert not any(thumbnail.exists() for thumbnail in old_thumbnails)
+
+def test_touched_thumbnails_survive_eviction(thumbnail_cache):
+    old = thumbnail_cache('old', 4)
+    known = thumbnail_cache('known', 4)
+    new = thumbnail_cache('new', 4)
+    old_thumbnails = utils.get_thumbnails(old, 1)
+    known_thumbnails = utils.get_thumbnails(known, 1)
+    time.sleep(0.01)
+
+    # Como el daemon con las que ya tenía en memoria.
+    started = time.time()
+    utils.touch_thumbnails(known_thumbnails, started)
+    generated = utils.get_thumbnails(new, 2, _budget(old_thumbnails, len(known) + len(new)), started)
+
+    assert all(thumbnail.exists() for thumbnail in known_thumbnails + generated)
+    assert not any(thumbnail.exists() for thumbnail in old_thumbnails)
@@ -0,0 +1,88 @@
+import shutil
+from pathlib import Path
+
+import pytest
+
+import watcher
+
+SUFFIXES = {'.jpg', '.png'}
+
+def list_images(folder: str, recursive: bool = True) -> list[Path]:
+    root = Path(folder)
+    if not root.is_dir():
+        return []
+    return [p for p in root.rglob('*') if p.suffix in SUFFIXES]
+
+def wait_for(folder_watcher: watcher.FolderWatcher, expected: set[Path], timeout: float = 3) -> bool:
+    with folder_watcher._condition:
+        return folder_watcher._condition.wait_for(
+            lambda: set(folder_watcher._images) == expected, timeout=timeout
+        )
+
+@pytest.fixture
+def start_watcher(monkeypatch):
+    monkeypatch.setattr(watcher, 'ROOT_RETRY_SECONDS', 0.1)
+    started = []
+
+    def start(folder: Path, recursive: bool = False) -> watcher.FolderWatcher:
+        folder_watcher = watcher.FolderWatcher(str(folder), list_images, SUFFIXES, recursive)
+        folder_watcher.start()
+        started.append(folder_watcher)
+        return folder_watcher
+
+    yield start
+    for folder_watcher in started:
+        folder_watcher.stop()
+
+def test_root_missing_at_start(tmp_path, start_watcher):
+    folder = tmp_path / 'wallpaper'
+    folder_watcher = start_watcher(folder)
+    assert folder_watcher.images() == []
+    folder.mkdir()
+    image = folder / 'a.jpg'
+    image.write_bytes(b'x')
+    assert folder_watcher.wait_for_images(3)
+    assert folder_watcher.images() == [image]
+
+def test_root_deleted_and_recreated(tmp_path, start_watcher):
+    folder = tmp_path / 'wallpaper'
+    folder.mkdir()
+    (folder / 'a.jpg').write_bytes(b'x')
+    folder_watcher = start_watcher(folder)
+    assert folder_watcher.images() == [folder / 'a.jpg']
+    shutil.rmtree(folder)
+    assert wait_for(folder_watcher, set())
+    folder.mkdir()
+    (folder / 'b.jpg').write_bytes(b'x')
+    assert wait_for(folder_watcher, {folder / 'b.jpg'})
+
+def test_root_moved_away_and_back(tmp_path, start_watcher):
+    folder = tmp_path / 'wallpaper'
+    folder.mkdir()
+    (folder / 'a.jpg').write_bytes(b'x')
+    folder_watcher = start_watcher(folder)
+    folder.rename(tmp_path / 'elsewhere')
+    # Lo que pase en la carpeta movida ya no cuenta.
+    (tmp_path / 'elsewhere' / 'c.jpg').write_bytes(b'x')
+    folder.mkdir()
+    (folder / 'b.jpg').write_bytes(b'x')
+    assert wait_for(folder_watcher, {folder / 'b.jpg'})
+
+def test_recursive_tree_moved_in(tmp_path, start_watcher):
+    folder = tmp_path / 'wallpaper'
+    folder.mkdir()
+    folder_watcher = start_watcher(folder, recursive=True)
+    outside = tmp_path / 'outside'
+    (outside / 'deep' / 'deeper').mkdir(parents=True)
+    (outside / 'deep' / 'a.jpg').write_bytes(b'x')
+    outside.rename(folder / 'moved')
+    assert wait_for(folder_watcher, {folder / 'moved/deep/a.jpg'})
+    # Las subcarpetas de la que llegó movida también se vigilan.
+    new_image = folder / 'moved/deep/deeper/b.png'
+    new_image.write_bytes(b'x')
+    assert wait_for(folder_watcher, {folder / 'moved/deep/a.jpg', new_image})
+
+def test_stop_twice(tmp_path, start_watcher):
+    folder_watcher = start_watcher(tmp_path)
+    folder_watcher.stop()
+    folder_watcher.stop()
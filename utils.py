@@ -8,25 +8,69 @@ import subprocess
 import configparser
 import hashlib
 import logging
+import sqlite3
 from pathlib import Path
 import sys
+import os
+import shlex
+import time
 import shutil
+import threading
+import json
+from functools import lru_cache
+from typing import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import library
+import profiling
+import notify
+
+# Conexiones al índice de cada hilo (ver _index_connection).
+_thread_local = threading.local()
 
 # Constantes del proyecto
 VERSION = "1.1.0"
 CONFIG_FILE = Path(__file__).parent / 'config.ini'
 THUMBNAIL_CACHE_DIR = Path.home() / '.cache/sway-wallpaper-manager/thumbnails'
 THUMBNAIL_SIZE = "128x128"
+# Límite por defecto de la caché de miniaturas (en MB).
+THUMBNAIL_CACHE_MB = 200
+# Límite por defecto de la caché de copias reescaladas (en MB, ver prescale.py).
+PRESCALE_CACHE_MB = 500
 SUPPORTED_EXTENSIONS = [
     "*.jpg", "*.jpeg", "*.png", "*.gif", "*.bmp", "*.svg", "*.webp",
     "*.tiff", "*.avif", "*.heic"
 ]
+IMAGE_SUFFIXES = {ext.replace("*", "") for ext in SUPPORTED_EXTENSIONS}
+# Formatos que Pillow no decodifica de forma fiable; se delegan en 'convert'.
+CONVERT_ONLY_EXTENSIONS = {".svg", ".avif", ".heic"}
 
 # Rutas para la persistencia en Sway
 SWAY_CONFIG_DIR = Path.home() / '.config/sway'
 SWAY_CONFIG_FILE = SWAY_CONFIG_DIR / 'config'
 SWAY_WM_CONFIG_DIR = Path.home() / '.config/sway-wallpaper-manager'
 RESTORE_SCRIPT_PATH = SWAY_WM_CONFIG_DIR / 'restore.sh'
+# Prefijo de las secciones de config.ini con ajustes propios de una salida.
+OUTPUT_SECTION_PREFIX = 'Output '
+# Comandos externos que usa el gestor; cada modo comprueba solo los suyos.
+DEPENDENCIES = ('swaybg', 'rofi', 'wal', 'notify-send', 'convert')
+# Dónde se encuentra cada comando, para no recorrer el PATH en cada arranque.
+DEPENDENCY_CACHE_FILE = Path(
+    os.environ.get('XDG_RUNTIME_DIR') or Path.home() / '.cache/sway-wallpaper-manager'
+) / 'sway-wallpaper-manager-commands.json'
+
+@lru_cache(maxsize=None)
+def load_pillow():
+    """
+    Importa Pillow solo cuando hace falta (tarda en cargar y '--set' con la
+    copia reescalada ya en caché no lo usa). Devuelve (Image, ImageOps), o
+    None si no está instalado; sin él se usa 'convert'.
+    """
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        return None
+    return Image, ImageOps
 
 def create_default_config():
     """Crea un archivo config.ini con valores por defecto si no existe."""
@@ -37,7 +81,17 @@ def create_default_config():
         'rotation_interval_minutes': '30',
         'rotation_order': 'random',
         'swaybg_output': '*',
-        'swaybg_mode': 'fill'
+        'swaybg_mode': 'fill',
+        'thumbnail_workers': '0',
+        'recursive': 'false',
+        'palette_workers': '2',
+        'palette_backend': 'wal',
+        'prefetch_count': '2',
+        'prescale': 'true',
+        'thumbnail_cache_mb': str(THUMBNAIL_CACHE_MB),
+        'prescale_cache_mb': str(PRESCALE_CACHE_MB),
+        'duplicate_distance': '10',
+        'sort_by': 'name'
     }
     try:
         with open(CONFIG_FILE, 'w') as configfile:
@@ -56,10 +110,78 @@ def get_config():
     config.read(CONFIG_FILE)
     return config['Settings']
 
-def check_dependencies():
-    """Verifica que todas las dependencias de línea de comandos estén instaladas."""
-    dependencies = ['swaybg', 'rofi', 'wal', 'notify-send', 'convert']
-    missing = [dep for dep in dependencies if not shutil.which(dep)]
+def get_output_configs(config) -> list:
+    """
+    Devuelve la configuración de cada salida. Cada sección [Output <nombre>]
+    hereda los valores de [Settings] y puede cambiar, entre otros, la
+    carpeta, el modo y la rotación. La salida con 'primary = true' (o, si
+    no hay ninguna, la primera) va al principio de la lista. Sin secciones
+    de salida se devuelve solo [Settings]. 'primary' queda a 'true' solo
+    en la salida principal.
+    """
+    sections = [s for s in config.parser.sections() if s.startswith(OUTPUT_SECTION_PREFIX)]
+    if not sections:
+        return [config]
+
+    outputs = configparser.ConfigParser(interpolation=None)
+    for section in sections:
+        name = section[len(OUTPUT_SECTION_PREFIX):].strip()
+        outputs[name] = {**config, **config.parser[section], 'swaybg_output': name}
+    configs = [outputs[name] for name in outputs.sections()]
+    primary = next((c for c in configs if c.getboolean('primary', fallback=False)), configs[0])
+    for c in configs:
+        c['primary'] = 'true' if c is primary else 'false'
+    return [primary] + [c for c in configs if c is not primary]
+
+def _mtime_ns(path: str) -> int | None:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+def find_commands(commands: Iterable[str]) -> dict[str, str | None]:
+    """
+    Ruta de cada comando en el PATH (None si no está), como shutil.which.
+    Los resultados se guardan en DEPENDENCY_CACHE_FILE y siguen valiendo
+    mientras no cambien el PATH, la fecha de modificación de sus carpetas
+    (se ha instalado o borrado algo) ni la de los propios ejecutables.
+    """
+    search_path = os.environ.get('PATH', os.defpath)
+    dirs = {d: _mtime_ns(d) for d in search_path.split(os.pathsep) if d}
+    try:
+        cache = json.loads(DEPENDENCY_CACHE_FILE.read_text())
+        if cache.get('path') != search_path or cache.get('dirs') != dirs:
+            cache = {}
+    except (OSError, ValueError):
+        cache = {}
+    known = cache.get('commands', {})
+
+    found = {}
+    probed = False
+    for command in commands:
+        entry = known.get(command)
+        if entry is not None and (entry[0] is None or _mtime_ns(entry[0]) == entry[1]):
+            found[command] = entry[0]
+            continue
+        path = shutil.which(command, path=search_path)
+        found[command] = path
+        known[command] = [path, _mtime_ns(path) if path else None]
+        probed = True
+
+    if probed:
+        try:
+            DEPENDENCY_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = DEPENDENCY_CACHE_FILE.with_name(f".tmp-{os.getpid()}-{DEPENDENCY_CACHE_FILE.name}")
+            tmp_path.write_text(json.dumps({'path': search_path, 'dirs': dirs, 'commands': known}))
+            os.replace(tmp_path, DEPENDENCY_CACHE_FILE)
+        except OSError as e:
+            logging.debug(f"No se pudo guardar la caché de comandos: {e}")
+    return found
+
+def check_dependencies(commands: Iterable[str] = DEPENDENCIES):
+    """Verifica que los comandos que necesita el modo en uso estén instalados."""
+    with profiling.span('dependencies'):
+        missing = [dep for dep, path in find_commands(commands).items() if path is None]
     
     if missing:
         logging.error("Faltan dependencias críticas.")
@@ -68,8 +190,11 @@ def check_dependencies():
         logging.error("\nPor favor, ejecuta de nuevo 'install.sh' para instalarlas.")
         sys.exit(1)
 
-def get_image_files(folder_path_str: str) -> list[Path]:
-    """Encuentra todos los archivos de imagen en una carpeta específica."""
+def get_image_files(folder_path_str: str, recursive: bool = False) -> list[Path]:
+    """
+    Encuentra todos los archivos de imagen en una carpeta específica (y sus
+    subcarpetas si recursive=True), usando el índice persistente de library.py.
+    """
     folder_path = Path(folder_path_str).expanduser()
     
     if not folder_path.is_dir():
@@ -80,81 +205,378 @@ def get_image_files(folder_path_str: str) -> list[Path]:
         logging.error(f"La carpeta de fondos '{folder_path}' no existe.")
         return []
 
-    image_files = [p for ext in SUPPORTED_EXTENSIONS for p in folder_path.glob(ext)]
+    with profiling.span('scan', folder=str(folder_path), recursive=recursive) as span:
+        images = _list_images(folder_path, recursive)
+        span['images'] = len(images)
+    return images
+
+def _list_images(folder_path: Path, recursive: bool) -> list[Path]:
+    try:
+        conn = library.connect()
+        try:
+            library.refresh(conn, folder_path, IMAGE_SUFFIXES, recursive)
+            return library.list_images(conn, folder_path, recursive)
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        logging.warning(f"No se pudo usar el índice de la biblioteca ({e}). Escaneando la carpeta.")
+
+    pattern = '**/*' if recursive else '*'
+    image_files = [p for p in folder_path.glob(pattern) if p.suffix.lower() in IMAGE_SUFFIXES and p.is_file()]
     
-    return sorted(image_files, key=lambda p: p.name)
+    return sorted(image_files, key=lambda p: (p.name, str(p)))
+
+def validate_image_path(image_path: Path) -> str | None:
+    """Devuelve un mensaje de error si la ruta no es una imagen utilizable, o None si lo es."""
+    if not image_path.is_file():
+        return f"El archivo '{image_path}' no existe."
+    if image_path.suffix.lower() not in IMAGE_SUFFIXES:
+        return f"Tipo de archivo no soportado: '{image_path.suffix}'. Use un formato de imagen válido."
+    return None
+
+def warm_page_cache(path: Path) -> None:
+    """Pide al kernel que cargue el archivo en la caché de página por adelantado."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+    except (OSError, AttributeError):
+        pass
+    finally:
+        os.close(fd)
+
+def _index_connection() -> sqlite3.Connection:
+    """Conexión al índice propia de cada hilo: sqlite3 no las comparte entre hilos."""
+    conn = getattr(_thread_local, 'index', None)
+    if conn is None:
+        conn = _thread_local.index = library.connect()
+    return conn
+
+def thumbnail_path(image_hash: str, suffix: str) -> Path:
+    """
+    Ruta de la miniatura de un contenido. Se reparten en subcarpetas por
+    los dos primeros caracteres del hash para que ningún directorio
+    acumule decenas de miles de archivos.
+    """
+    return THUMBNAIL_CACHE_DIR / image_hash[:2] / f"{image_hash}{suffix}"
+
+def _get_thumbnail(image_path: Path) -> tuple[Path, str, int]:
+    """Como get_thumbnail, pero devuelve también el hash y el tamaño de la miniatura."""
+    # La clave es el contenido: renombrar o mover un fondo no la invalida.
+    try:
+        image_hash = library.content_hash(_index_connection(), image_path)
+    except (OSError, sqlite3.Error) as e:
+        logging.warning(f"No se pudo calcular el hash de '{image_path.name}': {e}")
+        image_hash = hashlib.md5(str(image_path).encode()).hexdigest()
+    thumbnail = thumbnail_path(image_hash, image_path.suffix.lower())
+
+    if not thumbnail.exists():
+        logging.info(f"Generando miniatura para: {image_path.name}")
+        with profiling.span('thumbnail', image=image_path.name):
+            thumbnail.parent.mkdir(parents=True, exist_ok=True)
+            # Se escribe en un archivo temporal y se renombra al final, así
+            # nunca se sirve una miniatura a medio escribir.
+            tmp_path = thumbnail.with_name(f".tmp-{os.getpid()}-{threading.get_ident()}-{thumbnail.name}")
+            generated = _thumbnail_with_pillow(image_path, tmp_path) or run_command([
+                'convert', str(image_path),
+                '-thumbnail', THUMBNAIL_SIZE + '^',
+                '-gravity', 'center',
+                '-extent', THUMBNAIL_SIZE,
+                str(tmp_path)
+            ]) is not None
+            if generated and tmp_path.exists():
+                os.replace(tmp_path, thumbnail)
+            else:
+                tmp_path.unlink(missing_ok=True)
+
+    try:
+        size = thumbnail.stat().st_size
+    except OSError:
+        size = 0
+    return thumbnail, image_hash, size
 
 def get_thumbnail(image_path: Path) -> Path:
     """Genera (si es necesario) y devuelve la ruta a una miniatura cacheada."""
-    THUMBNAIL_CACHE_DIR.mkdir(parents=True, exist_ok=True)
-    
-    hash_name = hashlib.md5(str(image_path).encode()).hexdigest()
-    thumbnail_path = THUMBNAIL_CACHE_DIR / f"{hash_name}_{image_path.name}"
+    return _get_thumbnail(image_path)[0]
 
-    if not thumbnail_path.exists() or image_path.stat().st_mtime > thumbnail_path.stat().st_mtime:
-        logging.info(f"Generando miniatura para: {image_path.name}")
-        run_command([
-            'convert', str(image_path),
-            '-thumbnail', THUMBNAIL_SIZE + '^',
-            '-gravity', 'center',
-            '-extent', THUMBNAIL_SIZE,
-            str(thumbnail_path)
-        ])
-    
-    return thumbnail_path
+def _thumbnail_with_pillow(image_path: Path, output_path: Path) -> bool:
+    """
+    Genera la miniatura dentro del proceso con Pillow. Devuelve False si el
+    formato no está soportado o Pillow no está instalado.
+    """
+    pillow = load_pillow()
+    if pillow is None or image_path.suffix.lower() in CONVERT_ONLY_EXTENSIONS:
+        return False
+    Image, ImageOps = pillow
 
-def run_command(command: list[str], background: bool = False, **kwargs):
-    """Ejecuta un comando en el sistema. Si background=True, no espera a que termine."""
+    width, height = (int(n) for n in THUMBNAIL_SIZE.split('x'))
+    try:
+        with Image.open(image_path) as img:
+            # En JPEG, draft() decodifica a escala reducida (1/2, 1/4, 1/8)
+            # sin bajar del tamaño pedido, evitando cargar la imagen completa.
+            img.draft('RGB', (width, height))
+            img = ImageOps.exif_transpose(img)
+            # Equivale a '-thumbnail WxH^ -gravity center -extent WxH': se
+            # recorta al centro con la proporción final y se reduce en un paso.
+            scale = max(width / img.width, height / img.height)
+            crop_w, crop_h = width / scale, height / scale
+            left, top = (img.width - crop_w) / 2, (img.height - crop_h) / 2
+            thumb = img.resize(
+                (width, height), Image.Resampling.LANCZOS,
+                box=(left, top, left + crop_w, top + crop_h), reducing_gap=2.0
+            )
+            if thumb.mode not in ('RGB', 'RGBA', 'L', 'P'):
+                thumb = thumb.convert('RGBA')
+            save_format = Image.registered_extensions().get(image_path.suffix.lower())
+            if save_format == 'JPEG' and thumb.mode != 'RGB':
+                thumb = thumb.convert('RGB')
+            thumb.save(output_path, format=save_format)
+        return True
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        logging.warning(f"Pillow no pudo generar la miniatura de '{image_path.name}': {e}")
+        output_path.unlink(missing_ok=True)
+        return False
+
+def get_thumbnail_workers(config) -> int:
+    """Devuelve el número de hilos para generar miniaturas (0 = todos los núcleos)."""
     try:
-        if background:
-            return subprocess.Popen(command, **kwargs)
+        workers = int(config.get('thumbnail_workers', 0))
+    except ValueError:
+        logging.warning("Valor no válido para 'thumbnail_workers'. Se usarán todos los núcleos.")
+        workers = 0
+    if workers < 1:
+        workers = os.cpu_count() or 1
+    return workers
+
+def get_thumbnail_cache_bytes(config) -> int:
+    """Tamaño máximo de la caché de miniaturas en bytes (0 = sin límite)."""
+    try:
+        megabytes = int(config.get('thumbnail_cache_mb', THUMBNAIL_CACHE_MB))
+    except ValueError:
+        logging.warning(f"Valor no válido para 'thumbnail_cache_mb'. Se usarán {THUMBNAIL_CACHE_MB} MB.")
+        megabytes = THUMBNAIL_CACHE_MB
+    return max(0, megabytes) * 1024 * 1024
+
+def get_thumbnails(
+    images: list[Path], max_workers: int, max_cache_bytes: int = 0, started: float | None = None
+) -> list[Path]:
+    """
+    Genera las miniaturas en paralelo y las devuelve en el mismo orden que
+    'images'. Si la caché supera 'max_cache_bytes', borra las que hace más
+    tiempo que no se usan (nunca las usadas desde 'started', que por
+    defecto es el momento de la llamada).
+    """
+    started = time.time() if started is None else started
+    with profiling.span('thumbnails', images=len(images)):
+        if max_workers <= 1 or len(images) <= 1:
+            results = [_get_thumbnail(img) for img in images]
         else:
-            return subprocess.run(command, check=True, **kwargs)
-    except FileNotFoundError:
-        logging.error(f"El comando '{command[0]}' no se encontró.")
-        return None
-    except subprocess.CalledProcessError as e:
-        logging.error(f"Error al ejecutar '{' '.join(command)}': {e}")
-        return None
+            # Cada tarea espera a disco o a un proceso 'convert', por lo que los hilos bastan.
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                results = list(executor.map(_get_thumbnail, images))
+    _record_thumbnail_use(results, started, max_cache_bytes)
+    return [thumbnail for thumbnail, _, _ in results]
+
+def cached_thumbnails(images: list[Path], now: float | None = None) -> dict[Path, Path]:
+    """
+    Devuelve las miniaturas de 'images' que ya están en caché, sin calcular
+    hashes nuevos ni generar nada, y las marca como usadas en 'now'. Para
+    que la generación de las que faltan no las expulse, se le pasa el mismo
+    momento como 'started'.
+    """
+    try:
+        conn = _index_connection()
+        with profiling.span('thumbnails.cached', images=len(images)):
+            hashes = library.known_hashes(conn, images)
+    except sqlite3.Error as e:
+        logging.warning(f"No se pudo consultar el índice de miniaturas: {e}")
+        return {}
+    found = {}
+    entries = []
+    for image_path, image_hash in hashes.items():
+        thumbnail = thumbnail_path(image_hash, image_path.suffix.lower())
+        try:
+            size = thumbnail.stat().st_size
+        except OSError:
+            continue
+        found[image_path] = thumbnail
+        entries.append((image_hash, str(thumbnail), size))
+    try:
+        library.touch_thumbnails(conn, entries, time.time() if now is None else now)
+    except sqlite3.Error as e:
+        logging.warning(f"No se pudo actualizar el registro de miniaturas: {e}")
+    return found
 
-def kill_previous_swaybg():
-    """Busca y termina cualquier proceso 'swaybg' existente."""
-    subprocess.run(['pkill', '-f', 'swaybg'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+def touch_thumbnails(thumbnails: Iterable[Path], now: float) -> None:
+    """Marca como usadas en 'now' miniaturas que ya se conocían (p. ej. las que guarda el daemon)."""
+    try:
+        library.touch_thumbnail_paths(_index_connection(), [str(t) for t in thumbnails], now)
+    except sqlite3.Error as e:
+        logging.warning(f"No se pudo actualizar el registro de miniaturas: {e}")
 
-def send_notification(title: str, message: str, icon: str = "dialog-information") -> None:
-    """Envía una notificación de escritorio."""
+def iter_thumbnails(
+    images: list[Path], max_workers: int, max_cache_bytes: int = 0, started: float | None = None
+) -> Iterator[tuple[Path, Path]]:
+    """
+    Genera las miniaturas en paralelo y las entrega como (imagen, miniatura)
+    a medida que terminan, no en el orden de 'images'. Si se deja de
+    consumir (close()), se cancelan las que aún no habían empezado. Como en
+    get_thumbnails, nunca se expulsan las usadas desde 'started'.
+    """
+    started = time.time() if started is None else started
+    results = []
+    executor = ThreadPoolExecutor(max_workers=max(1, max_workers))
+    try:
+        futures = {executor.submit(_get_thumbnail, img): img for img in images}
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            yield futures[future], result[0]
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        _record_thumbnail_use(results, started, max_cache_bytes)
+
+def _record_thumbnail_use(results: list[tuple[Path, str, int]], now: float, max_cache_bytes: int) -> None:
+    """Actualiza el orden LRU de la caché de miniaturas y aplica el límite de tamaño."""
+    evicted = []
     try:
-        subprocess.Popen(['notify-send', title, message, '-i', icon])
-    except FileNotFoundError:
-        logging.warning(f"El comando 'notify-send' no se encontró. Notificación: {title} - {message}")
+        conn = _index_connection()
+        library.touch_thumbnails(conn, [(h, str(p), size) for p, h, size in results if size], now)
+        if max_cache_bytes:
+            evicted = library.evict_thumbnails(conn, max_cache_bytes, now)
+    except sqlite3.Error as e:
+        logging.warning(f"No se pudo actualizar el registro de miniaturas: {e}")
+    for thumbnail in evicted:
+        thumbnail.unlink(missing_ok=True)
+    if evicted:
+        logging.info(f"Caché de miniaturas llena: se eliminaron {len(evicted)} miniaturas antiguas.")
+
+def gc_thumbnails(conn: sqlite3.Connection, live_hashes: set[str]) -> int:
+    """
+    Borra las miniaturas de contenidos que ya no están en la biblioteca y
+    las del formato antiguo (md5 de la ruta, sin subcarpetas).
+    Devuelve cuántas se eliminaron.
+    """
+    if not THUMBNAIL_CACHE_DIR.is_dir():
+        return 0
+    removed = []
+    legacy = 0
+    for entry in THUMBNAIL_CACHE_DIR.iterdir():
+        if entry.is_file():
+            entry.unlink(missing_ok=True)
+            legacy += 1
+            continue
+        for thumbnail in entry.iterdir():
+            if thumbnail.name.startswith('.') or thumbnail.stem in live_hashes:
+                continue
+            thumbnail.unlink(missing_ok=True)
+            removed.append(thumbnail.stem)
+        try:
+            entry.rmdir()  # Solo si ha quedado vacía
+        except OSError:
+            pass
+    library.forget_thumbnails(conn, removed)
+    return len(removed) + legacy
+
+def run_command(command: list[str], background: bool = False, **kwargs):
+    """
+    Ejecuta un comando en el sistema. Si background=True, no espera a que
+    termine. Con --profile se registra su duración y su código de salida
+    (en segundo plano, solo lo que tarda en arrancar).
+    """
+    with profiling.span(f"cmd:{os.path.basename(command[0])}", background=background) as span:
+        try:
+            if background:
+                process = subprocess.Popen(command, **kwargs)
+                span['pid'] = process.pid
+                return process
+            else:
+                result = subprocess.run(command, check=True, **kwargs)
+                span['exit'] = result.returncode
+                return result
+        except FileNotFoundError:
+            span['exit'] = 127
+            logging.error(f"El comando '{command[0]}' no se encontró.")
+            return None
+        except subprocess.CalledProcessError as e:
+            span['exit'] = e.returncode
+            logging.error(f"Error al ejecutar '{' '.join(command)}': {e}")
+            return None
+
+def send_notification(title: str, message: str, icon: str = "dialog-information") -> None:
+    """
+    Envía una notificación de escritorio por D-Bus (ver notify.py), que
+    sustituye a la anterior. Sin bus de sesión se usa 'notify-send'.
+    """
+    notify.send_notification(title, message, icon)
+
+def _pgrep_pattern(output: str) -> str:
+    """Expresión de 'pgrep -f' para los swaybg de 'output' (los lanzados por el gestor o por restore.sh)."""
+    escaped = ''.join('\\' + c if c in '.[]()*+?{}|^$\\' else c for c in output)
+    # swaybg puede haberse lanzado por su ruta completa.
+    return f"(^|/)swaybg -o {escaped} "
 
 def manage_persistence() -> None:
-    """Genera un script restore.sh que lee la ruta del fondo dinámicamente y usa la config actual."""
+    """
+    Genera un script restore.sh con un swaybg por salida configurada. Cada
+    uno lee al arrancar el último fondo de su salida (o, si aún no tiene,
+    el de la principal) y usa el modo de esa salida. Los swaybg anteriores
+    de cada salida se terminan cuando el nuevo ya está en marcha; los de
+    otras salidas no se tocan.
+    """
     SWAY_WM_CONFIG_DIR.mkdir(parents=True, exist_ok=True)
 
     # Leer la configuración actual para swaybg
     config = configparser.ConfigParser()
     config.read(CONFIG_FILE)
-    settings = config['Settings']
-    swaybg_output = settings.get('swaybg_output', '*')
-    swaybg_mode = settings.get('swaybg_mode', 'fill')
+    output_configs = get_output_configs(config['Settings'])
+    outputs = [c['swaybg_output'] for c in output_configs]
+
+    lines = []
+    for output_config in output_configs:
+        output = output_config['swaybg_output']
+        lines.append(' '.join(shlex.quote(arg) for arg in (
+            'restore_output', output, _pgrep_pattern(output),
+            output_config.get('swaybg_mode', 'fill'), str(last_wallpaper_file(output))
+        )) + ' &')
+    lines.append('wait')
+    if '*' not in outputs:
+        # Un swaybg de todas las salidas de una configuración anterior
+        # quedaría debajo de los nuevos.
+        lines.append(f"pkill -u \"$(id -u)\" -f {shlex.quote(_pgrep_pattern('*'))} || :")
 
     try:
         restore_script = f'''#!/bin/bash
+# Generado por sway-wallpaper-manager (--persist).
 
-WALLPAPER_FILE="{LAST_WALLPAPER_FILE}"
-if [ -f "$WALLPAPER_FILE" ]; then
-    WALLPAPER_PATH=$(cat "$WALLPAPER_FILE")
-    pkill -f swaybg
-    sleep 1
+FALLBACK_FILE={shlex.quote(str(LAST_WALLPAPER_FILE))}
+
+restore_output() {{
+    local output="$1" pattern="$2" mode="$3" file="$4"
+    [ -f "$file" ] || file="$FALLBACK_FILE"
+    if [ ! -f "$file" ]; then
+        echo "No se encontró el fondo guardado de '$output' en $file" >&2
+        return 1
+    fi
+    local wallpaper old
+    wallpaper=$(cat "$file")
+    old=$(pgrep -u "$(id -u)" -f "$pattern")
     # Reintento hasta 3 veces si swaybg falla
     for i in 1 2 3; do
-        swaybg -o "{swaybg_output}" -i "$WALLPAPER_PATH" -m {swaybg_mode} && break
+        swaybg -o "$output" -i "$wallpaper" -m "$mode" &
         sleep 1
+        if kill -0 $! 2>/dev/null; then
+            [ -n "$old" ] && kill $old 2>/dev/null
+            return 0
+        fi
     done
-else
-    echo "No se encontró el fondo guardado en $WALLPAPER_FILE" >&2
-fi
+    echo "swaybg no pudo mostrar el fondo en '$output'" >&2
+    return 1
+}}
+
+{chr(10).join(lines)}
 '''
         with open(RESTORE_SCRIPT_PATH, 'w') as f:
             f.write(restore_script)
@@ -234,13 +656,31 @@ def disable_persistence() -> None:
         send_notification("Error al Deshabilitar", "No se pudo modificar el archivo de configuración de Sway.", "dialog-error")
 LAST_WALLPAPER_FILE = SWAY_WM_CONFIG_DIR / 'last_wallpaper.txt'
 
-def save_last_wallpaper(image_path: Path) -> None:
-    """Guarda la ruta del último fondo de pantalla usado."""
+def last_wallpaper_file(output: str = '*') -> Path:
+    """Archivo con el último fondo de 'output'. El de '*' es el de la salida principal."""
+    if output == '*':
+        return LAST_WALLPAPER_FILE
+    return SWAY_WM_CONFIG_DIR / f"last_wallpaper-{output.replace('/', '_')}.txt"
+
+def get_last_wallpaper() -> Path | None:
+    """Devuelve el último fondo guardado, o None si no hay ninguno."""
+    try:
+        content = LAST_WALLPAPER_FILE.read_text().strip()
+    except OSError:
+        return None
+    return Path(content) if content else None
+
+def save_last_wallpaper(image_path: Path, output: str = '*') -> None:
+    """
+    Guarda la ruta del último fondo de pantalla usado. Con 'output' se
+    guarda el de esa salida, que es el que restaura restore.sh.
+    """
     SWAY_WM_CONFIG_DIR.mkdir(parents=True, exist_ok=True)
+    wallpaper_file = last_wallpaper_file(output)
     try:
-        with open(LAST_WALLPAPER_FILE, 'w') as f:
+        with open(wallpaper_file, 'w') as f:
             f.write(str(image_path))
-        logging.info(f"Ruta del fondo guardada en '{LAST_WALLPAPER_FILE}'")
+        logging.info(f"Ruta del fondo guardada en '{wallpaper_file}'")
     except IOError as e:
         logging.error(f"No se pudo guardar la ruta del fondo: {e}")
         send_notification("Error", "No se pudo guardar el fondo actual.", "dialog-error")
@@ -0,0 +1,296 @@
+# -------------------------------------------------------------------
+# watcher.py - Vigilancia de la Carpeta de Fondos
+# -------------------------------------------------------------------
+# Mantiene en memoria la lista de imágenes de la carpeta de fondos y
+# la actualiza con eventos de inotify. Si inotify no está disponible
+# se recurre a un sondeo periódico en segundo plano.
+#
+# Si la carpeta no existe (al arrancar, o porque se ha borrado o movido)
+# se intenta vigilar de nuevo cada ROOT_RETRY_SECONDS, y al aparecer se
+# vuelve a leer entera.
+# -------------------------------------------------------------------
+
+import os
+import errno
+import ctypes
+import ctypes.util
+import select
+import struct
+import bisect
+import logging
+import threading
+from pathlib import Path
+from typing import Callable
+
+# Constantes de <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o4000
+
+WATCH_MASK = (
+    IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+)
+_EVENT_HEADER = struct.Struct('iIII')
+
+# Segundos entre sondeos cuando no hay inotify.
+POLL_INTERVAL_SECONDS = 30
+# Segundos entre intentos de vigilar la carpeta mientras no existe.
+ROOT_RETRY_SECONDS = 2
+
+def _sort_key(path: Path) -> tuple[str, str]:
+    """Mismo orden que get_image_files: por nombre y, en caso de empate, por ruta."""
+    return (path.name, str(path))
+
+class _Inotify:
+    """Envoltorio mínimo de inotify mediante ctypes."""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._rm_watch = libc.inotify_rm_watch
+        self._rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        self.fd = libc.inotify_init1(IN_CLOEXEC | IN_NONBLOCK)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+
+    def add_watch(self, path: Path) -> int:
+        wd = self._add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), str(path))
+        return wd
+
+    def rm_watch(self, wd: int) -> None:
+        self._rm_watch(self.fd, wd)
+
+    def read_events(self):
+        """Devuelve los eventos pendientes como tuplas (wd, mask, nombre)."""
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            events.append((wd, mask, os.fsdecode(name)))
+        return events
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+class FolderWatcher:
+    """
+    Lista de imágenes de una carpeta que se mantiene al día sola.
+    images() no hace ninguna operación de disco.
+    """
+
+    def __init__(
+        self,
+        folder_path_str: str,
+        get_images_func: Callable[[str], list[Path]],
+        extensions: set[str],
+        recursive: bool = False,
+    ):
+        self.folder_path_str = folder_path_str
+        self.folder = Path(folder_path_str).expanduser()
+        self.get_images_func = get_images_func
+        self.extensions = extensions
+        self.recursive = recursive
+        self._images: list[Path] = []
+        self._condition = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+        self._inotify = None
+        self._watches: dict[int, Path] = {}
+        self._stop_r, self._stop_w = os.pipe()
+
+    def start(self) -> None:
+        """Carga la lista inicial y arranca la vigilancia en segundo plano."""
+        try:
+            self._inotify = _Inotify()
+            self._watch_tree(self.folder)
+            target = self._run_inotify
+        except (OSError, AttributeError) as e:
+            logging.warning(f"inotify no disponible ({e}). Se sondeará la carpeta cada {POLL_INTERVAL_SECONDS}s.")
+            if self._inotify is not None:
+                self._inotify.close()
+                self._inotify = None
+            target = self._run_polling
+        # La lista se carga después de registrar los watches para no perder
+        # cambios que ocurran entre ambos pasos.
+        self._resync()
+        self._thread = threading.Thread(target=target, name='folder-watcher', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Detiene la vigilancia y libera el descriptor de inotify. Se puede llamar varias veces."""
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        os.write(self._stop_w, b'x')
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+        os.close(self._stop_r)
+        os.close(self._stop_w)
+
+    def images(self) -> list[Path]:
+        """Devuelve una copia de la lista actual de imágenes."""
+        with self._condition:
+            return list(self._images)
+
+    def contains(self, path: Path) -> bool:
+        """Indica si 'path' está en la lista actual (sin tocar el disco)."""
+        with self._condition:
+            index = bisect.bisect_left(self._images, _sort_key(path), key=_sort_key)
+            return index < len(self._images) and self._images[index] == path
+
+    def wait_for_images(self, timeout: float | None = None) -> bool:
+        """Bloquea hasta que haya al menos una imagen o venza el timeout."""
+        with self._condition:
+            return self._condition.wait_for(lambda: bool(self._images), timeout=timeout)
+
+    def _resync(self) -> None:
+        images = self.get_images_func(self.folder_path_str)
+        with self._condition:
+            self._images = sorted(images, key=_sort_key)
+            self._condition.notify_all()
+
+    def _add(self, path: Path) -> None:
+        with self._condition:
+            index = bisect.bisect_left(self._images, _sort_key(path), key=_sort_key)
+            if index < len(self._images) and self._images[index] == path:
+                return
+            self._images.insert(index, path)
+            self._condition.notify_all()
+
+    def _remove(self, path: Path) -> None:
+        with self._condition:
+            index = bisect.bisect_left(self._images, _sort_key(path), key=_sort_key)
+            if index < len(self._images) and self._images[index] == path:
+                del self._images[index]
+
+    def _remove_tree(self, directory: Path) -> None:
+        with self._condition:
+            self._images = [p for p in self._images if directory not in p.parents]
+
+    def _watch_tree(self, directory: Path) -> None:
+        """Registra un watch para 'directory' y, si es recursivo, todas sus subcarpetas."""
+        self._watch(directory)
+        if self.recursive:
+            for dirpath, dirnames, _ in os.walk(directory):
+                dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+                for d in dirnames:
+                    self._watch(Path(dirpath) / d)
+
+    def _watching_root(self) -> bool:
+        return self.folder in self._watches.values()
+
+    def _forget_watches(self) -> None:
+        """Quita todos los watches (la carpeta se ha movido y sus rutas ya no valen)."""
+        for wd in list(self._watches):
+            self._inotify.rm_watch(wd)
+        self._watches.clear()
+
+    def _rewatch_root(self) -> bool:
+        """Vuelve a vigilar la carpeta si ha reaparecido. Devuelve True si lo consigue."""
+        if not self.folder.is_dir():
+            return False
+        try:
+            self._watch_tree(self.folder)
+        except OSError as e:
+            logging.warning(f"No se pudo volver a vigilar '{self.folder}': {e}")
+            return False
+        return self._watching_root()
+
+    def _watch(self, directory: Path) -> None:
+        try:
+            wd = self._inotify.add_watch(directory)
+        except OSError as e:
+            if e.errno == errno.ENOSPC:
+                raise
+            logging.warning(f"No se pudo vigilar '{directory}': {e}")
+            return
+        self._watches[wd] = directory
+
+    def _run_inotify(self) -> None:
+        while not self._stop.is_set():
+            # Sin watch en la carpeta no llegará ningún evento suyo: se
+            # reintenta cada ROOT_RETRY_SECONDS hasta que vuelva a existir.
+            timeout = None if self._watching_root() else ROOT_RETRY_SECONDS
+            ready, _, _ = select.select([self._inotify.fd, self._stop_r], [], [], timeout)
+            if self._stop_r in ready:
+                return
+            if not ready:
+                if self._rewatch_root():
+                    logging.info(f"La carpeta '{self.folder}' vuelve a estar disponible.")
+                    self._resync()
+                continue
+            needs_resync = False
+            for wd, mask, name in self._inotify.read_events():
+                if mask & IN_Q_OVERFLOW:
+                    needs_resync = True
+                    continue
+                directory = self._watches.get(wd)
+                if directory is None:
+                    continue
+                if mask & IN_IGNORED:
+                    del self._watches[wd]
+                    continue
+                if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                    if directory == self.folder:
+                        if mask & IN_MOVE_SELF:
+                            # Los watches siguen a la carpeta movida, no a su ruta.
+                            self._forget_watches()
+                        needs_resync = True
+                    continue
+
+                path = directory / name
+                if mask & IN_ISDIR:
+                    if not self.recursive or name.startswith('.'):
+                        continue
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        # Una carpeta que llega movida (o creada con 'mkdir -p')
+                        # puede traer subcarpetas e imágenes.
+                        self._watch_tree(path)
+                        needs_resync = True
+                    elif mask & (IN_DELETE | IN_MOVED_FROM):
+                        self._remove_tree(path)
+                    continue
+
+                if path.suffix.lower() not in self.extensions:
+                    continue
+                # IN_CREATE se ignora a propósito: el archivo puede estar
+                # copiándose todavía; se añade al cerrarse (IN_CLOSE_WRITE).
+                if mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                    self._add(path)
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    self._remove(path)
+
+            if needs_resync:
+                if not self._watching_root():
+                    self._rewatch_root()
+                self._resync()
+
+    def _run_polling(self) -> None:
+        while not self._stop.wait(POLL_INTERVAL_SECONDS):
+            self._resync()